@@ -20,6 +20,7 @@ import uvicorn
 
 from outpaint_generator import OutpaintGenerator, OutpaintResult
 from outpaint_config import OutpaintConfig
+from output_writer import ENCODER_PROFILES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -107,7 +108,11 @@ async def health_check():
                 "available": backend_ok,
                 "message": backend_msg,
             },
-            "auto_fallback": "enabled" if generator.config.backend == "comfyui" else "not_needed",
+            "auto_fallback": "enabled" if len(generator.backend_stats()) > 1 else "not_needed",
+            "routing": generator.backend_stats(),
+            "memory": generator.memory_stats(),
+            "model_timing": generator.timing_stats(),
+            "rate_limit": generator.rate_limit_stats(),
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -128,7 +133,7 @@ async def get_config():
 
         return {
             "config": config_dict,
-            "auto_fallback": getattr(generator, "_fallback_attempted", False),
+            "routing": generator.backend_stats(),
         }
     except Exception as e:
         logger.error(f"Failed to get config: {e}")
@@ -164,6 +169,7 @@ async def outpaint(
     num_images: int = Form(1, description="Number of images to generate"),
     prompt: str = Form("", description="Text prompt for generation"),
     output_format: str = Form("png", description="Output format (png, jpeg, webp)"),
+    encoder_profile: str = Form("balanced", description="Encoder profile (fast, balanced, archive)"),
     return_file: bool = Form(True, description="Return file directly or JSON with URL"),
 ):
     """
@@ -175,6 +181,7 @@ async def outpaint(
     - **num_images**: Number of variations (default: 1)
     - **prompt**: Text prompt for AI generation
     - **output_format**: png, jpeg, or webp (default: png)
+    - **encoder_profile**: fast, balanced, or archive (default: balanced)
     - **return_file**: If true, returns image file; if false, returns JSON with path
     """
     temp_dir = None
@@ -187,6 +194,9 @@ async def outpaint(
         if not image.content_type or not image.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Invalid image file")
 
+        if encoder_profile not in ENCODER_PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown encoder_profile: {encoder_profile}")
+
         # Create temp directory for processing
         temp_dir = Path(tempfile.mkdtemp(prefix="outpaint_api_"))
         temp_input = temp_dir / f"input_{uuid.uuid4().hex}.png"
@@ -207,18 +217,19 @@ async def outpaint(
             "num_images": num_images,
             "prompt": prompt,
             "output_format": output_format,
+            "encoder_profile": encoder_profile,
             "output_folder": str(temp_dir),
             "use_source_folder": False,
         })
 
         # Create request-scoped generator to avoid race conditions
-        request_generator = OutpaintGenerator(request_config)
+        request_generator = OutpaintGenerator(request_config, backend=generator.backend)
         request_generator.set_progress_callback(lambda msg, lvl="info": logger.info(f"Generator: {msg}"))
 
         # Generate outpaint
         logger.info(f"Processing with backend: {request_config.backend}")
         result: OutpaintResult = request_generator.generate(str(temp_input))
-        backend_used = request_config.backend
+        backend_used = result.backend or request_config.backend
 
         if not result.output_paths:
             raise HTTPException(status_code=500, detail="No outputs generated")
@@ -238,7 +249,7 @@ async def outpaint(
             return JSONResponse({
                 "success": True,
                 "backend_used": backend_used,
-                "fallback_triggered": getattr(request_generator, "_fallback_attempted", False),
+                "fallback_triggered": backend_used != request_config.backend,
                 "output_path": str(output_path),
                 "num_outputs": len(result.output_paths),
                 "message": "Outpaint completed successfully",
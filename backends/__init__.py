@@ -4,12 +4,66 @@ from abc import ABC, abstractmethod
 import threading
 from typing import Callable, Optional
 
+import requests
+from requests.adapters import HTTPAdapter
+
+from memory_budget import shared_byte_budget
 from outpaint_config import OutpaintConfig
+from prepared_image import PreparedImage
 
 
 ProgressCallback = Callable[[str, str], None]
 
 
+def http_session(pool_size: int = 32) -> requests.Session:
+    """Keep-alive session for one backend, shared by its worker threads.
+
+    Uploads, submits, status polls and downloads to the same host reuse warm
+    connections instead of paying a TCP/TLS handshake per request.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class JobHandle:
+    """Identity of a submitted remote job, so an interrupted run can pick it up again.
+
+    Backends call :meth:`submitted` as soon as the remote side accepts a job. When
+    :meth:`resume` returns data on entry, they poll that job instead of uploading
+    and submitting a new one.
+
+    :meth:`upload` keeps what a backend uploaded for the job, so a retry after a
+    failed submit doesn't send the image again. Uploads are not persisted.
+    """
+
+    def __init__(self, data: Optional[dict] = None, on_submitted: Optional[Callable[[dict], None]] = None):
+        self.data = dict(data) if data else None
+        self._on_submitted = on_submitted
+        self._uploads: dict[str, str] = {}
+
+    def upload(self, key: str, upload: Callable[[], str]) -> str:
+        """The result of ``upload()``, run only the first time ``key`` is asked for."""
+        if key not in self._uploads:
+            self._uploads[key] = upload()
+        return self._uploads[key]
+
+    def resume(self, backend: str) -> Optional[dict]:
+        if self.data and self.data.get("backend") == backend:
+            return self.data
+        return None
+
+    def submitted(self, backend: str, **data) -> None:
+        self.data = {"backend": backend, **data}
+        if self._on_submitted is not None:
+            self._on_submitted(self.data)
+
+    def clear(self) -> None:
+        self.data = None
+
+
 class OutpaintBackend(ABC):
     @abstractmethod
     def outpaint(
@@ -27,22 +81,89 @@ class OutpaintBackend(ABC):
         enable_safety_checker: bool,
         progress_callback: Optional[ProgressCallback] = None,
         cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
     ) -> list[bytes]:
-        """Return raw image bytes for each generated output."""
+        """Return raw image bytes for each generated output.
 
+        ``prepared_image``, when given, is the already-probed/decoded source for
+        ``image_path``; backends should use its cached payloads instead of reopening the file.
+        ``job``, when given, records the remote job once submitted and may name one to resume.
+        """
 
-def get_backend(config: OutpaintConfig) -> OutpaintBackend:
-    if config.backend == "falai":
+
+def _build_backend(name: str, config: OutpaintConfig) -> OutpaintBackend:
+    budget = shared_byte_budget(config.memory.max_inflight_mb)
+    warmup_idle = config.warmup.idle_seconds if config.warmup.enabled else None
+
+    if name == "falai":
         from .falai_backend import FalAIOutpaintBackend
+        from .rate_limiter import shared_rate_limiter
+
+        limits = config.rate_limit
+        limiter = shared_rate_limiter(
+            {
+                "upload": limits.upload_per_second,
+                "submit": limits.submit_per_second,
+                "status": limits.status_per_second,
+                "download": limits.download_per_second,
+            },
+            burst=limits.burst,
+        )
+        return FalAIOutpaintBackend(api_key=config.falai_api_key, budget=budget, limiter=limiter)
 
-        return FalAIOutpaintBackend(api_key=config.falai_api_key)
+    if name == "comfyui" and config.comfyui_urls:
+        from .comfyui_pool import ComfyUIPoolBackend
 
-    if config.backend == "comfyui":
+        return ComfyUIPoolBackend(config.comfyui_urls, config.comfyui_workflow_path, budget=budget, warmup_idle=warmup_idle)
+
+    if name == "comfyui":
         from .comfyui_backend import ComfyUIOutpaintBackend
 
         return ComfyUIOutpaintBackend(
             base_url=config.comfyui_url,
             workflow_path=config.comfyui_workflow_path,
+            budget=budget,
+            warmup_idle=warmup_idle,
         )
 
-    raise ValueError(f"Unknown backend: {config.backend}")
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def _routing_candidates(config: OutpaintConfig) -> list[str]:
+    names = [config.backend, *config.routing.backends]
+    if not config.routing.backends and config.backend == "comfyui" and config.falai_api_key.strip():
+        names.append("falai")
+    if not config.falai_api_key.strip():
+        names = [n for n in names if n != "falai" or n == config.backend]
+    return list(dict.fromkeys(names))
+
+
+def get_backend(config: OutpaintConfig) -> OutpaintBackend:
+    names = _routing_candidates(config) if config.routing.enabled else [config.backend]
+    if len(names) == 1:
+        return _build_backend(names[0], config)
+
+    from .circuit_breaker import CircuitBreaker
+    from .router import BackendRouter, BackendStats, RouteCandidate
+
+    routing = config.routing
+    candidates: list[RouteCandidate] = []
+    for name in names:
+        candidates.append(
+            RouteCandidate(
+                name=name,
+                backend=_build_backend(name, config),
+                cost_per_image=routing.falai_cost_per_image if name == "falai" else routing.comfyui_cost_per_image,
+                parallelism=config.workers.falai if name == "falai" else max(1, len(config.comfyui_urls)),
+                stats=BackendStats(window=routing.latency_window),
+                breaker=CircuitBreaker(failure_threshold=routing.failure_threshold, reset_timeout=routing.reset_timeout),
+            )
+        )
+    return BackendRouter(
+        candidates,
+        max_cost_per_image=routing.max_cost_per_image,
+        allow_paid_failover=routing.allow_paid_failover,
+        probe_interval=routing.probe_interval,
+        budget=shared_byte_budget(config.memory.max_inflight_mb),
+    )
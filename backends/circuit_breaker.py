@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one backend.
+
+    ``failure_threshold`` consecutive failures open the circuit. An open circuit rejects traffic
+    until either a health probe succeeds (``probe_succeeded``) or ``reset_timeout`` elapses, after
+    which it is half-open and lets a single trial job through. The trial's outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, *, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        """Return True if a job may be sent now (claims the trial slot when half-open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a claimed trial slot without recording an outcome (e.g. cancelled job)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def probe_due(self) -> bool:
+        with self._lock:
+            return self._state == OPEN
+
+    def probe_succeeded(self) -> None:
+        with self._lock:
+            if self._state == OPEN:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+
+    def probe_failed(self) -> None:
+        with self._lock:
+            if self._state == OPEN:
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict[str, Optional[object]]:
+        with self._lock:
+            self._maybe_half_open()
+            return {"state": self._state, "consecutive_failures": self._consecutive_failures}
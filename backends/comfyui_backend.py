@@ -1,18 +1,32 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import statistics
 import time
 import threading
 import uuid
+from collections import deque
 from concurrent.futures import CancelledError
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 
 import requests
+from PIL import Image
 
+from memory_budget import ByteBudget, download
 from path_utils import detect_comfyui_path
+from prepared_image import PreparedImage
+from retry_policy import stage
 
-from . import OutpaintBackend, ProgressCallback
+from . import JobHandle, OutpaintBackend, ProgressCallback, http_session
+
+
+def _content_name(filename: str, hexdigest: str) -> str:
+    """``photo.png`` -> ``photo-<16 hex of the content hash>.png``."""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{hexdigest[:16]}{ext}"
 
 
 def _progress(cb: Optional[ProgressCallback], message: str, level: str = "info"):
@@ -54,6 +68,47 @@ def _resolve_node_ref(ref: Any) -> Optional[str]:
     return None
 
 
+def _next_node_id(prompt: dict[str, Any]) -> str:
+    numeric = [int(k) for k in prompt if str(k).isdigit()]
+    return str(max(numeric, default=0) + 1)
+
+
+def stack_load_images(prompt: dict[str, Any], image_names: list[str], *, repeat: int = 1) -> None:
+    """Turn the workflow's LoadImage into a batch: the original image followed by ``image_names``.
+
+    Each extra name gets a cloned LoadImage node. The clones are chained with
+    ImageBatch, optionally repeated ``repeat`` times with RepeatImageBatch (giving
+    ``[a, b, c, a, b, c]``), and everything that read the original IMAGE output
+    now reads the batch. The MASK output is left alone.
+    """
+    load = find_node_by_class(prompt, {"LoadImage"})
+    if load is None:
+        raise RuntimeError("Workflow has no LoadImage node to batch")
+    load_id, load_node = load
+    consumers = [
+        (node, key)
+        for node in prompt.values()
+        if isinstance(node, dict)
+        for key, ref in (node.get("inputs") or {}).items()
+        if isinstance(ref, list) and len(ref) == 2 and str(ref[0]) == str(load_id) and ref[1] == 0
+    ]
+
+    head: list[Any] = [load_id, 0]
+    for name in image_names:
+        clone_id = _next_node_id(prompt)
+        prompt[clone_id] = {"class_type": "LoadImage", "inputs": {**load_node.get("inputs", {}), "image": name}}
+        batch_id = _next_node_id(prompt)
+        prompt[batch_id] = {"class_type": "ImageBatch", "inputs": {"image1": head, "image2": [clone_id, 0]}}
+        head = [batch_id, 0]
+    if repeat > 1:
+        repeat_id = _next_node_id(prompt)
+        prompt[repeat_id] = {"class_type": "RepeatImageBatch", "inputs": {"image": head, "amount": repeat}}
+        head = [repeat_id, 0]
+
+    for node, key in consumers:
+        node["inputs"][key] = list(head)
+
+
 def _extract_history_error(job: dict[str, Any], prompt: dict[str, Any]) -> Optional[str]:
     """Best-effort extraction of an execution error from /history/{prompt_id}."""
     status = job.get("status")
@@ -111,13 +166,125 @@ def _extract_history_error(job: dict[str, Any], prompt: dict[str, Any]) -> Optio
     return None
 
 
+# Nodes whose outputs are model weights; a run that did not take them from cache loaded models.
+_LOADER_CLASSES = {
+    "UNETLoader",
+    "CheckpointLoaderSimple",
+    "DualCLIPLoader",
+    "CLIPLoader",
+    "TripleCLIPLoader",
+    "VAELoader",
+    "FluxModelLoader",
+    "DiffusionModelLoader",
+}
+
+
+def execution_timing(job: dict[str, Any], prompt: dict[str, Any]) -> Optional[tuple[float, bool]]:
+    """``(seconds executing, loaded models)`` for a finished /history entry, or None.
+
+    History keeps the execution_start / execution_cached / execution_success
+    messages (millisecond timestamps). Loader nodes missing from the cached list
+    mean the run had to load their weights first.
+    """
+    status = job.get("status")
+    messages = status.get("messages") if isinstance(status, dict) else None
+    if not isinstance(messages, list):
+        return None
+    start = end = None
+    cached: set[str] = set()
+    for m in messages:
+        if not (isinstance(m, list) and len(m) == 2 and isinstance(m[1], dict)):
+            continue
+        kind, data = m
+        if kind == "execution_start":
+            start = data.get("timestamp")
+        elif kind == "execution_cached":
+            cached.update(str(n) for n in data.get("nodes") or [])
+        elif kind == "execution_success":
+            end = data.get("timestamp")
+    if not isinstance(start, (int, float)) or not isinstance(end, (int, float)):
+        return None
+    loaders = {str(k) for k, n in prompt.items() if isinstance(n, dict) and n.get("class_type") in _LOADER_CLASSES}
+    return max(0.0, (end - start) / 1000.0), bool(loaders - cached)
+
+
+class ExecutionTimes:
+    """Splits ComfyUI run time into model loading and sampling.
+
+    Runs are grouped by kind ("job", "warmup"). A warm run is all sampling; a cold
+    run's sampling is taken as the median warm run of its kind and the remainder
+    counted as model loading. Warm-up prompts sample almost nothing, so a cold
+    warm-up is all load time even before any warm baseline exists.
+    """
+
+    def __init__(self, window: int = 50):
+        self._lock = threading.Lock()
+        self._window = window
+        self._warm: dict[str, deque[float]] = {}
+        self.runs = 0
+        self.cold_starts = 0
+        self.load_seconds = 0.0
+
+    def record(self, kind: str, seconds: float, cold: bool) -> Optional[float]:
+        """Add a run; returns the estimated model-load seconds of a cold one (None if unknown)."""
+        with self._lock:
+            self.runs += 1
+            warm = self._warm.setdefault(kind, deque(maxlen=self._window))
+            if not cold:
+                warm.append(seconds)
+                return None
+            self.cold_starts += 1
+            baseline = statistics.median(warm) if warm else (0.0 if kind == "warmup" else None)
+            if baseline is None:
+                return None
+            load = max(0.0, seconds - baseline)
+            self.load_seconds += load
+            return load
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            jobs = list(self._warm.get("job", ()))
+            return {
+                "runs": self.runs,
+                "cold_starts": self.cold_starts,
+                "model_load_seconds": round(self.load_seconds, 3),
+                "sampling_p50_seconds": round(statistics.median(jobs), 3) if jobs else None,
+            }
+
+
+def merge_timing_stats(stats: list[dict[str, Any]]) -> dict[str, Any]:
+    """Combine :meth:`ExecutionTimes.stats` of several servers."""
+    p50s = [s["sampling_p50_seconds"] for s in stats if s.get("sampling_p50_seconds") is not None]
+    return {
+        "runs": sum(s.get("runs", 0) for s in stats),
+        "cold_starts": sum(s.get("cold_starts", 0) for s in stats),
+        "model_load_seconds": round(sum(s.get("model_load_seconds", 0.0) for s in stats), 3),
+        "sampling_p50_seconds": statistics.median(p50s) if p50s else None,
+    }
+
+
 class ComfyUIOutpaintBackend(OutpaintBackend):
-    def __init__(self, base_url: str, workflow_path: str):
+    def __init__(
+        self,
+        base_url: str,
+        workflow_path: str,
+        budget: Optional[ByteBudget] = None,
+        *,
+        warmup_idle: Optional[float] = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.workflow_path = workflow_path
+        # Downloaded outputs are charged here; the caller releases them once written.
+        self.budget = budget
+        self.session = http_session()
+        # Run a tiny prompt before the next job once the server has been idle this long (None = never).
+        self.warmup_idle = warmup_idle
+        self._warm_lock = threading.Lock()
+        self._last_run = float("-inf")
+        self.timing = ExecutionTimes()
 
     def _get_object_info(self) -> dict[str, Any]:
-        resp = requests.get(f"{self.base_url}/object_info", timeout=5)
+        resp = self.session.get(f"{self.base_url}/object_info", timeout=5)
         resp.raise_for_status()
         info = resp.json()
         if not isinstance(info, dict):
@@ -140,6 +307,18 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
             return list(spec[0])
         return []
 
+    def queue_depth(self) -> Optional[int]:
+        """Running + pending prompts on the server, or None when /queue is unreadable."""
+        resp = self.session.get(f"{self.base_url}/queue", timeout=2)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+        if not isinstance(data, dict):
+            return None
+        running = data.get("queue_running") or []
+        pending = data.get("queue_pending") or []
+        return len(running) + len(pending)
+
     def check_available(self) -> tuple[bool, str]:
         def _bytes_to_gb(v: Any) -> Optional[float]:
             if v is None:
@@ -156,7 +335,7 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
             return x
 
         try:
-            stats_resp = requests.get(f"{self.base_url}/system_stats", timeout=5)
+            stats_resp = self.session.get(f"{self.base_url}/system_stats", timeout=5)
             if stats_resp.status_code != 200:
                 return False, f"ComfyUI not responding: HTTP {stats_resp.status_code}"
             stats = stats_resp.json()
@@ -290,15 +469,37 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
 
         return True, "ComfyUI ready"
 
-    def _upload_image(self, image_path: str, cb: Optional[ProgressCallback]) -> str:
-        _progress(cb, f"Uploading to ComfyUI: {Path(image_path).name}", "upload")
-        with open(image_path, "rb") as f:
-            resp = requests.post(
+    def _upload_image(
+        self, image_path: str, cb: Optional[ProgressCallback], prepared: Optional[PreparedImage] = None
+    ) -> str:
+        # Uploads overwrite same-named server inputs, and names like "{stem}_tile0x0.png" or a
+        # plain "photo.png" repeat across folders, runs and clients. A content hash in the name
+        # keeps each job on its own pixels; equal names now mean equal bytes.
+        if prepared is not None and prepared.in_memory:
+            # Derived image (proxy/tile/stage): upload the in-memory PNG, nothing on disk to stream.
+            filename, payload = prepared.upload_file()
+            filename = _content_name(filename, hashlib.sha1(payload).hexdigest())
+            _progress(cb, f"Uploading to ComfyUI: {filename}", "upload")
+            resp = self.session.post(
                 f"{self.base_url}/upload/image",
-                files={"image": f},
+                files={"image": (filename, payload)},
                 data={"type": "input", "overwrite": "true"},
                 timeout=60,
             )
+        else:
+            with open(image_path, "rb") as f:
+                digest = hashlib.sha1()
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+                f.seek(0)
+                filename = _content_name(Path(image_path).name, digest.hexdigest())
+                _progress(cb, f"Uploading to ComfyUI: {filename}", "upload")
+                resp = self.session.post(
+                    f"{self.base_url}/upload/image",
+                    files={"image": (filename, f)},
+                    data={"type": "input", "overwrite": "true"},
+                    timeout=60,
+                )
         resp.raise_for_status()
         data = resp.json()
         name = data.get("name")
@@ -517,6 +718,8 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
         enable_safety_checker: bool,
         progress_callback: Optional[ProgressCallback] = None,
         cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
     ) -> list[bytes]:
         _ = output_format
         _ = enable_safety_checker
@@ -524,11 +727,149 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
         if cancel_event is not None and cancel_event.is_set():
             raise CancelledError()
 
-        ok, msg = self.check_available()
-        if not ok:
-            raise RuntimeError(msg)
+        resumed = job.resume("comfyui") if job is not None else None
+        if resumed is not None and resumed.get("base_url") == self.base_url and self._prompt_known(resumed["prompt_id"]):
+            _progress(progress_callback, f"Resuming ComfyUI prompt {resumed['prompt_id']}", "task")
+            return self._await_history(resumed["prompt_id"], {}, cancel_event, progress_callback)
+
+        job = job or JobHandle()
+        wf = self._queue_prompt(
+            image_path,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            progress_callback=progress_callback,
+            prepared_image=prepared_image,
+            job=job,
+        )
+        return self._await_history(job.data["prompt_id"], wf, cancel_event, progress_callback)  # type: ignore[index]
+
+    def submit(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> None:
+        """Upload and queue the prompt without waiting; ``outpaint(..., job=job)`` collects it later."""
+        _ = (output_format, enable_safety_checker)
+        if cancel_event is not None and cancel_event.is_set():
+            raise CancelledError()
+        if job is None:
+            raise ValueError("submit() needs a JobHandle to record the queued prompt")
+        self._queue_prompt(
+            image_path,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            progress_callback=progress_callback,
+            prepared_image=prepared_image,
+            job=job,
+        )
 
-        uploaded_name = self._upload_image(image_path, progress_callback)
+    def outpaint_batch(
+        self,
+        image_paths: list[str],
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_images: Optional[list[Optional[PreparedImage]]] = None,
+    ) -> list[list[bytes]]:
+        """Outpaint several same-size images in one prompt; returns one output list per input, in order.
+
+        The model is loaded once and all images are sampled as one batch.
+        """
+        _ = (output_format, enable_safety_checker)
+        if not image_paths:
+            return []
+        if cancel_event is not None and cancel_event.is_set():
+            raise CancelledError()
+
+        prepared = list(prepared_images) if prepared_images is not None else [None] * len(image_paths)
+        job = JobHandle()
+        wf = self._queue_prompt(
+            image_paths[0],
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            progress_callback=progress_callback,
+            prepared_image=prepared[0],
+            job=job,
+            extra_images=list(zip(image_paths[1:], prepared[1:])),
+        )
+        flat = self._await_history(job.data["prompt_id"], wf, cancel_event, progress_callback)  # type: ignore[index]
+
+        count = len(image_paths)
+        if len(flat) != count * num_images:
+            if self.budget is not None:
+                self.budget.release(sum(len(b) for b in flat))
+            raise RuntimeError(f"Batch prompt returned {len(flat)} images for {count} inputs x {num_images}")
+        # Outputs come back as [a, b, c] repeated num_images times.
+        return [flat[i::count] for i in range(count)]
+
+    def _queue_prompt(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        progress_callback: Optional[ProgressCallback],
+        prepared_image: Optional[PreparedImage],
+        job: JobHandle,
+        extra_images: Sequence[tuple[str, Optional[PreparedImage]]] = (),
+    ) -> dict[str, Any]:
+        """Upload the image and POST the prompt; records it on ``job`` and returns the workflow sent.
+
+        ``extra_images`` are stacked after the first into one batch (see :func:`stack_load_images`).
+        """
+        with stage("submit"):
+            ok, msg = self.check_available()
+            if not ok:
+                raise RuntimeError(msg)
+            self._ensure_warm(progress_callback)
+
+        with stage("upload"):
+            uploaded_name = job.upload(
+                f"{self.base_url}:{image_path}", lambda: self._upload_image(image_path, progress_callback, prepared_image)
+            )
+            extra_names = [self._upload_image(p, progress_callback, prep) for p, prep in extra_images]
         wf = _load_workflow(self.workflow_path)
         wf = json.loads(json.dumps(wf))  # deep copy
 
@@ -542,14 +883,23 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
             expand_right=expand_right,
             expand_top=expand_top,
             expand_bottom=expand_bottom,
-            num_images=num_images,
+            # A stacked batch gets its variants from RepeatImageBatch, not from the latent batch size.
+            num_images=1 if extra_names else num_images,
             prompt_text=prompt or "",
             object_info=self._get_object_info(),
         )
+        if extra_names:
+            stack_load_images(wf, extra_names, repeat=num_images)
+
+        with stage("submit"):
+            prompt_id = self._post_prompt(wf, progress_callback)
+        job.submitted("comfyui", prompt_id=prompt_id, base_url=self.base_url)
+        return wf
 
+    def _post_prompt(self, wf: dict[str, Any], progress_callback: Optional[ProgressCallback]) -> str:
         client_id = f"outpaint-{uuid.uuid4().hex[:8]}"
         _progress(progress_callback, "Submitting ComfyUI prompt…", "api")
-        submit = requests.post(
+        submit = self.session.post(
             f"{self.base_url}/prompt",
             json={"prompt": wf, "client_id": client_id},
             timeout=30,
@@ -559,19 +909,167 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
         prompt_id = submit.json().get("prompt_id")
         if not prompt_id:
             raise RuntimeError(f"Unexpected /prompt response: {submit.text}")
+        # A server with work queued keeps its models resident; that counts as activity too.
+        self._last_run = time.monotonic()
+        return str(prompt_id)
+
+    def warm_up(
+        self, progress_callback: Optional[ProgressCallback] = None, cancel_event: Optional[threading.Event] = None
+    ) -> None:
+        """Run the workflow once on a 64px image with one sampling step so the server loads its models.
+
+        Its time is recorded as a "warmup" run, so a cold start is reported as load
+        time here instead of showing up as a latency spike on the next real job.
+        """
+        prepared = PreparedImage.from_image(Image.new("RGB", (64, 64), (128, 128, 128)), name="outpaint-warmup.png")
+        try:
+            name = self._upload_image("outpaint-warmup.png", None, prepared)
+        finally:
+            prepared.close()
+        wf = json.loads(json.dumps(_load_workflow(self.workflow_path)))
+        wf = self._inject_params(
+            wf,
+            image_name=name,
+            zoom_out_percentage=0,
+            expand_left=0,
+            expand_right=16,
+            expand_top=0,
+            expand_bottom=0,
+            num_images=1,
+            prompt_text="",
+            object_info=self._get_object_info(),
+        )
+        for _node_id, node in find_all_nodes_by_class(wf, {"KSampler", "KSamplerAdvanced"}):
+            if "steps" in node.get("inputs", {}):
+                node["inputs"]["steps"] = 1
+        prompt_id = self._post_prompt(wf, None)
+        out = self._await_history(prompt_id, wf, cancel_event, progress_callback, kind="warmup")
+        if self.budget is not None:
+            self.budget.release(sum(len(b) for b in out))
+
+    def _ensure_warm(self, progress_callback: Optional[ProgressCallback]) -> None:
+        """Warm up first if the server has not run anything for ``warmup_idle`` seconds."""
+        if self.warmup_idle is None:
+            return
+        # Concurrent jobs wait here for one warm-up rather than each sending their own.
+        with self._warm_lock:
+            if time.monotonic() - self._last_run < self.warmup_idle:
+                return
+            _progress(progress_callback, "Warming up ComfyUI models…", "info")
+            try:
+                self.warm_up(progress_callback)
+            except Exception as e:
+                # The real job still runs (and loads the models itself).
+                _progress(progress_callback, f"ComfyUI warm-up failed: {e}", "warning")
+            self._last_run = time.monotonic()
+
+    def timing_stats(self) -> dict[str, Any]:
+        """Runs, cold starts, estimated model-load seconds and median warm sampling time."""
+        return self.timing.stats()
+
+    def _note_execution(
+        self, job: dict[str, Any], wf: dict[str, Any], kind: str, progress_callback: Optional[ProgressCallback]
+    ) -> None:
+        self._last_run = time.monotonic()
+        timing = execution_timing(job, wf)
+        if timing is None:
+            return
+        seconds, cold = timing
+        load = self.timing.record(kind, seconds, cold)
+        if cold:
+            split = f"~{load:.1f}s loading models, " if load is not None else "models loaded, "
+            _progress(progress_callback, f"ComfyUI cold start: {split}{seconds:.1f}s executing", "warning" if kind == "job" else "info")
+
+    def _prompt_known(self, prompt_id: str) -> bool:
+        """True while the server still has ``prompt_id`` queued, running or in history."""
+        try:
+            hist = self.session.get(f"{self.base_url}/history/{prompt_id}", timeout=10)
+            if hist.status_code == 200 and str(prompt_id) in (hist.json() or {}):
+                return True
+            resp = self.session.get(f"{self.base_url}/queue", timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+        except (requests.RequestException, ValueError):
+            return False
+        for item in [*(data.get("queue_running") or []), *(data.get("queue_pending") or [])]:
+            # Queue entries are [number, prompt_id, prompt, extra_data, outputs].
+            if isinstance(item, list) and len(item) > 1 and str(item[1]) == str(prompt_id):
+                return True
+        return False
+
+    def cancel(self, job: JobHandle) -> bool:
+        """Drop the prompt recorded in ``job`` from this server; True if it was still queued or running."""
+        data = job.resume("comfyui")
+        if data is None or data.get("base_url") != self.base_url:
+            return False
+        return self._cancel_prompt(str(data["prompt_id"]))
+
+    def _cancel_prompt(self, prompt_id: str) -> bool:
+        """Delete ``prompt_id`` from the queue, or interrupt it if it is the one running."""
+        try:
+            resp = self.session.get(f"{self.base_url}/queue", timeout=5)
+            resp.raise_for_status()
+            data = resp.json()
+
+            def ids(key: str) -> set[str]:
+                return {str(item[1]) for item in data.get(key) or [] if isinstance(item, list) and len(item) > 1}
+
+            if prompt_id in ids("queue_pending"):
+                resp = self.session.post(f"{self.base_url}/queue", json={"delete": [prompt_id]}, timeout=5)
+                return resp.status_code == 200
+            if prompt_id in ids("queue_running"):
+                # Recent servers interrupt only the named prompt; older ones interrupt whatever
+                # is running, which we just saw is ours.
+                resp = self.session.post(f"{self.base_url}/interrupt", json={"prompt_id": prompt_id}, timeout=5)
+                return resp.status_code == 200
+        except (requests.RequestException, ValueError):
+            pass
+        return False
 
+    def _await_history(
+        self,
+        prompt_id: str,
+        wf: dict[str, Any],
+        cancel_event: Optional[threading.Event],
+        progress_callback: Optional[ProgressCallback] = None,
+        *,
+        kind: str = "job",
+    ) -> list[bytes]:
+        try:
+            return self._poll_history(prompt_id, wf, cancel_event, progress_callback, kind)
+        except CancelledError:
+            # Free the GPU too; a prompt that already finished is simply no longer queued.
+            if self._cancel_prompt(str(prompt_id)):
+                _progress(progress_callback, f"Cancelled ComfyUI prompt {prompt_id}", "warning")
+            raise
+
+    def _poll_history(
+        self,
+        prompt_id: str,
+        wf: dict[str, Any],
+        cancel_event: Optional[threading.Event],
+        progress_callback: Optional[ProgressCallback],
+        kind: str,
+    ) -> list[bytes]:
+        timed = False
         # Poll history
         for _i in range(600):
             if cancel_event is not None and cancel_event.is_set():
                 raise CancelledError()
             time.sleep(1)
-            hist = requests.get(f"{self.base_url}/history/{prompt_id}", timeout=30)
-            if hist.status_code != 200:
-                continue
-            data = hist.json()
+            with stage("poll"):
+                hist = self.session.get(f"{self.base_url}/history/{prompt_id}", timeout=30)
+                if hist.status_code != 200:
+                    continue
+                data = hist.json()
             if str(prompt_id) not in data:
                 continue
             job = data[str(prompt_id)]
+            if not wf:
+                # Collected from an earlier submit: the history entry carries the prompt it ran.
+                queued = job.get("prompt")
+                if isinstance(queued, list) and len(queued) > 2 and isinstance(queued[2], dict):
+                    wf = queued[2]
 
             err = _extract_history_error(job, wf)
             if err:
@@ -584,23 +1082,35 @@ class ComfyUIOutpaintBackend(OutpaintBackend):
                     images.extend(out.get("images") or [])
             if not images:
                 continue
+            if not timed:
+                self._note_execution(job, wf, kind, progress_callback)
+                timed = True
 
             results: list[bytes] = []
-            for im in images:
-                if cancel_event is not None and cancel_event.is_set():
-                    raise CancelledError()
-                filename = im.get("filename")
-                subfolder = im.get("subfolder", "")
-                ftype = im.get("type", "output")
-                if not filename:
-                    continue
-                view = requests.get(
-                    f"{self.base_url}/view",
-                    params={"filename": filename, "subfolder": subfolder, "type": ftype},
-                    timeout=120,
-                )
-                view.raise_for_status()
-                results.append(view.content)
+            try:
+                for im in images:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise CancelledError()
+                    filename = im.get("filename")
+                    subfolder = im.get("subfolder", "")
+                    ftype = im.get("type", "output")
+                    if not filename:
+                        continue
+                    with stage("download"):
+                        results.append(
+                            download(
+                                f"{self.base_url}/view",
+                                self.budget,
+                                cancel_event=cancel_event,
+                                session=self.session,
+                                params={"filename": filename, "subfolder": subfolder, "type": ftype},
+                                timeout=120,
+                            )
+                        )
+            except BaseException:
+                if self.budget is not None:
+                    self.budget.release(sum(len(b) for b in results))
+                raise
 
             if results:
                 return results
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import requests
+
+from memory_budget import ByteBudget
+from prepared_image import PreparedImage
+
+from . import JobHandle, OutpaintBackend, ProgressCallback
+from .comfyui_backend import ComfyUIOutpaintBackend, merge_timing_stats
+
+
+def _free_vram(stats: Any) -> Optional[float]:
+    devices = stats.get("devices") if isinstance(stats, dict) else None
+    if not isinstance(devices, list):
+        return None
+    free = [float(d["vram_free"]) for d in devices if isinstance(d, dict) and isinstance(d.get("vram_free"), (int, float))]
+    return max(free) if free else None
+
+
+@dataclass
+class _Instance:
+    backend: ComfyUIOutpaintBackend
+    assigned: int = 0  # jobs this process is running on the instance
+    depth: Optional[int] = None  # running + pending on the server at last probe
+    assigned_at_probe: int = 0
+    free_vram: Optional[float] = None
+    probed_at: float = float("-inf")
+    reachable: bool = True
+    probing: bool = False
+
+    @property
+    def url(self) -> str:
+        return self.backend.base_url
+
+
+class ComfyUIPoolBackend(OutpaintBackend):
+    """Several ComfyUI servers behind one backend.
+
+    Each job goes to the instance with the shortest queue (``/queue``), ties broken
+    by free VRAM (``/system_stats``), and runs there end to end, so the upload, the
+    prompt and the result download all hit the same server.
+    """
+
+    STATS_TTL = 2.0
+
+    def __init__(
+        self,
+        base_urls: list[str],
+        workflow_path: str,
+        budget: Optional[ByteBudget] = None,
+        *,
+        warmup_idle: Optional[float] = None,
+    ):
+        if not base_urls:
+            raise ValueError("ComfyUI pool needs at least one URL")
+        self.budget = budget
+        self._instances = [
+            _Instance(ComfyUIOutpaintBackend(u, workflow_path, budget=budget, warmup_idle=warmup_idle)) for u in base_urls
+        ]
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> list[str]:
+        return [i.url for i in self._instances]
+
+    def _probe(self, inst: _Instance) -> None:
+        now = time.monotonic()
+        with self._lock:
+            # One thread probes an instance at a time; the others use the last result.
+            if inst.probing or now - inst.probed_at < self.STATS_TTL:
+                return
+            inst.probing = True
+            assigned = inst.assigned
+        depth: Optional[int] = None
+        free_vram: Optional[float] = None
+        try:
+            depth = inst.backend.queue_depth()
+            resp = inst.backend.session.get(f"{inst.url}/system_stats", timeout=2)
+            free_vram = _free_vram(resp.json()) if resp.status_code == 200 else None
+            reachable = True
+        except (requests.RequestException, ValueError):
+            depth, free_vram, reachable = None, None, False
+        finally:
+            with self._lock:
+                inst.probing = False
+        with self._lock:
+            inst.depth, inst.free_vram, inst.reachable = depth, free_vram, reachable
+            inst.assigned_at_probe = assigned
+            inst.probed_at = now
+
+    def _load(self, inst: _Instance) -> int:
+        # The probed queue already counts our submitted jobs; add what we dispatched since then.
+        since_probe = max(0, inst.assigned - inst.assigned_at_probe)
+        return max((inst.depth or 0) + since_probe, inst.assigned)
+
+    def _pick(self, job: Optional[JobHandle]) -> _Instance:
+        resumed = job.resume("comfyui") if job is not None else None
+        if resumed is not None:
+            for inst in self._instances:
+                if inst.url == resumed.get("base_url"):
+                    with self._lock:
+                        inst.assigned += 1
+                    return inst
+
+        for inst in self._instances:
+            self._probe(inst)
+        with self._lock:
+            live = [i for i in self._instances if i.reachable] or self._instances
+            best = min(live, key=lambda i: (self._load(i), -(i.free_vram or 0.0)))
+            best.assigned += 1
+            return best
+
+    def queue_depth(self) -> Optional[int]:
+        """Jobs running or queued across all reachable instances.
+
+        This is the total, not a per-server average: the router already divides by
+        the candidate's parallelism (the number of instances).
+        """
+        for inst in self._instances:
+            self._probe(inst)
+        with self._lock:
+            live = [i for i in self._instances if i.reachable]
+            if not live:
+                return None
+            return sum(self._load(i) for i in live)
+
+    def check_available(self) -> tuple[bool, str]:
+        results = [(inst.url, *inst.backend.check_available()) for inst in self._instances]
+        ready = [url for url, ok, _msg in results if ok]
+        if ready:
+            down = [f"{url}: {msg}" for url, ok, msg in results if not ok]
+            note = f" ({len(down)} down: {'; '.join(down)})" if down else ""
+            return True, f"ComfyUI pool ready: {len(ready)}/{len(results)} instances{note}"
+        return False, "No ComfyUI instance available:\n" + "\n".join(f"{url}: {msg}" for url, _ok, msg in results)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Per-instance load and timing, keyed by URL."""
+        with self._lock:
+            return {
+                i.url: {
+                    "assigned": i.assigned,
+                    "queue_depth": i.depth,
+                    "free_vram": i.free_vram,
+                    "reachable": i.reachable,
+                    "timing": i.backend.timing_stats(),
+                }
+                for i in self._instances
+            }
+
+    def timing_stats(self) -> dict[str, Any]:
+        """Model-load and sampling timing summed over the servers."""
+        return merge_timing_stats([i.backend.timing_stats() for i in self._instances])
+
+    def cancel(self, job: JobHandle) -> bool:
+        """Cancel ``job`` on the server it was queued on."""
+        data = job.resume("comfyui")
+        for inst in self._instances:
+            if data is not None and inst.url == data.get("base_url"):
+                return inst.backend.cancel(job)
+        return False
+
+    def _run(self, method: str, first: Any, **kwargs: Any) -> Any:
+        """Call ``method(first, **kwargs)`` on the server that owns ``kwargs["job"]``, else the least loaded."""
+        inst = self._pick(kwargs.get("job"))
+        cb = kwargs.get("progress_callback")
+        if cb is not None and len(self._instances) > 1:
+            cb(f"Dispatching to {inst.url}", "debug")
+        try:
+            return getattr(inst.backend, method)(first, **kwargs)
+        except requests.RequestException:
+            # Steer the next pick away from this server until it answers a probe again.
+            with self._lock:
+                inst.reachable = False
+                inst.probed_at = time.monotonic()
+            raise
+        finally:
+            with self._lock:
+                inst.assigned -= 1
+
+    def outpaint(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> list[bytes]:
+        return self._run(
+            "outpaint",
+            image_path,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            output_format=output_format,
+            enable_safety_checker=enable_safety_checker,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            prepared_image=prepared_image,
+            job=job,
+        )
+
+    def submit(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> None:
+        """Queue on the least-loaded server; ``job`` then pins collection to it."""
+        self._run(
+            "submit",
+            image_path,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            output_format=output_format,
+            enable_safety_checker=enable_safety_checker,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            prepared_image=prepared_image,
+            job=job,
+        )
+
+    def outpaint_batch(
+        self,
+        image_paths: list[str],
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_images: Optional[list[Optional[PreparedImage]]] = None,
+    ) -> list[list[bytes]]:
+        return self._run(
+            "outpaint_batch",
+            image_paths,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            output_format=output_format,
+            enable_safety_checker=enable_safety_checker,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            prepared_images=prepared_images,
+        )
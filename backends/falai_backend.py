@@ -1,24 +1,36 @@
 from __future__ import annotations
 
 import base64
-import io
 import os
 import time
 import threading
 from concurrent.futures import CancelledError
-from pathlib import Path
 from typing import Optional
 
 import requests
-from PIL import Image
 
-from . import OutpaintBackend, ProgressCallback
+from memory_budget import ByteBudget, download
+from prepared_image import PreparedImage
+from retry_policy import stage
+
+from . import JobHandle, OutpaintBackend, ProgressCallback, http_session
+from .rate_limiter import RateLimiter
+
+
+class _JobExpired(RuntimeError):
+    """The queue no longer knows the request (404 on its status URL)."""
 
 
 class FalAIOutpaintBackend(OutpaintBackend):
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, budget: Optional[ByteBudget] = None, limiter: Optional[RateLimiter] = None):
         self.api_key = api_key
+        # Downloaded outputs are charged here; the caller releases them once written.
+        self.budget = budget
         self.queue_url = "https://queue.fal.run/fal-ai/image-apps-v2/outpaint"
+        self.session = http_session()
+        # Shared with the other workers (and backends) so a 429 slows everyone down;
+        # unlimited by default, apart from honouring 429 pauses.
+        self.limiter = limiter if limiter is not None else RateLimiter({})
 
         # Freeimage.host API key - required for image upload
         # Default public guest key available in .env.example if needed
@@ -28,45 +40,60 @@ class FalAIOutpaintBackend(OutpaintBackend):
         if cb:
             cb(message, level)
 
-    def _upload_to_freeimage(self, image_path: str, cb: Optional[ProgressCallback]) -> str:
-        p = Path(image_path)
+    def _request(
+        self, endpoint: str, method: str, url: str, cancel_event: Optional[threading.Event] = None, **kwargs
+    ) -> requests.Response:
+        """``session.<method>(url, **kwargs)`` once ``endpoint``'s rate limit allows it."""
+        self.limiter.wait(endpoint, cancel_event)
+        resp = getattr(self.session, method)(url, **kwargs)
+        self.limiter.observe(endpoint, resp)
+        return resp
 
-        buffer = io.BytesIO()
-        with Image.open(p) as opened:
-            img = opened
+    def _download(self, url: str, cancel_event: Optional[threading.Event]) -> bytes:
+        self.limiter.wait("download", cancel_event)
+        try:
+            data = download(url, self.budget, cancel_event=cancel_event, session=self.session, timeout=120)
+        except requests.HTTPError as e:
+            self.limiter.observe("download", e.response)
+            raise
+        self.limiter.observe("download", None)
+        return data
+
+    def rate_limit_stats(self) -> dict:
+        """Per endpoint class: current rate, waits, seconds waited and 429s seen."""
+        return self.limiter.stats()
+
+    def _upload_to_freeimage(
+        self,
+        image_path: str,
+        cb: Optional[ProgressCallback],
+        prepared: Optional[PreparedImage] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> str:
+        owned = prepared is None
+        if prepared is None:
+            prepared = PreparedImage.from_path(image_path)
 
+        try:
             # Only resize if image is unreasonably large (>4096px) to avoid upload issues
             max_size = 4096
-            if img.width > max_size or img.height > max_size:
-                self._progress(cb, f"⚠ Image too large ({img.width}x{img.height}), resizing to fit {max_size}px", "resize")
-                img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-            converted: Image.Image | None = None
-            if img.mode in ("RGBA", "LA", "P"):
-                background = Image.new("RGB", img.size, (255, 255, 255))
-                if img.mode == "P":
-                    src = img.convert("RGBA")
-                    try:
-                        background.paste(src, mask=src.split()[-1])
-                    finally:
-                        src.close()
-                else:
-                    background.paste(img, mask=img.split()[-1] if img.mode in ("RGBA", "LA") else None)
-                converted = background
-                img = converted
+            width, height = prepared.size
+            if width > max_size or height > max_size:
+                self._progress(cb, f"⚠ Image too large ({width}x{height}), resizing to fit {max_size}px", "resize")
+            # Cached on the PreparedImage, so retries and failover don't decode/encode again.
+            payload = prepared.upload_jpeg(max_side=max_size, quality=95)
+        finally:
+            if owned:
+                prepared.close()
 
-            try:
-                img.save(buffer, format="JPEG", quality=95, optimize=True)
-            finally:
-                if converted is not None:
-                    converted.close()
-
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode("utf-8")
+        image_base64 = base64.b64encode(payload).decode("utf-8")
 
-        self._progress(cb, f"Uploading {p.name}…", "upload")
-        resp = requests.post(
+        self._progress(cb, f"Uploading {prepared.name}…", "upload")
+        resp = self._request(
+            "upload",
+            "post",
             "https://freeimage.host/api/1/upload",
+            cancel_event,
             data={"key": self.freeimage_key, "action": "upload", "source": image_base64, "format": "json"},
             timeout=30,
         )
@@ -93,14 +120,71 @@ class FalAIOutpaintBackend(OutpaintBackend):
         enable_safety_checker: bool,
         progress_callback: Optional[ProgressCallback] = None,
         cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
     ) -> list[bytes]:
         if cancel_event is not None and cancel_event.is_set():
             raise CancelledError()
 
-        image_url = self._upload_to_freeimage(image_path, progress_callback)
+        resumed = job.resume("falai") if job is not None else None
+        if resumed is not None:
+            self._progress(progress_callback, f"Resuming fal.ai job {resumed.get('request_id')}", "task")
+            try:
+                return self._await_result(resumed["status_url"], progress_callback, cancel_event)
+            except _JobExpired:
+                self._progress(progress_callback, "Previous job expired; submitting again", "warning")
+                job.clear()
+
+        job = job or JobHandle()
+        self.submit(
+            image_path,
+            zoom_out_percentage=zoom_out_percentage,
+            expand_left=expand_left,
+            expand_right=expand_right,
+            expand_top=expand_top,
+            expand_bottom=expand_bottom,
+            num_images=num_images,
+            prompt=prompt,
+            output_format=output_format,
+            enable_safety_checker=enable_safety_checker,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+            prepared_image=prepared_image,
+            job=job,
+        )
+        return self._await_result(job.data["status_url"], progress_callback, cancel_event)  # type: ignore[index]
+
+    def submit(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> None:
+        """Upload and enqueue the request without waiting; ``outpaint(..., job=job)`` collects it later."""
+        if cancel_event is not None and cancel_event.is_set():
+            raise CancelledError()
+        if job is None:
+            raise ValueError("submit() needs a JobHandle to record the queued request")
+
+        with stage("upload"):
+            image_url = job.upload(
+                f"freeimage:{image_path}",
+                lambda: self._upload_to_freeimage(image_path, progress_callback, prepared_image, cancel_event),
+            )
 
         headers = {"Authorization": f"Key {self.api_key}", "Content-Type": "application/json"}
-        status_headers = {"Authorization": f"Key {self.api_key}"}
 
         payload = {
             "image_url": image_url,
@@ -116,16 +200,41 @@ class FalAIOutpaintBackend(OutpaintBackend):
         }
 
         self._progress(progress_callback, "Submitting outpaint job…", "api")
-        submit = requests.post(self.queue_url, headers=headers, json=payload, timeout=30)
-        if submit.status_code == 402:
-            raise RuntimeError("Payment required (insufficient credits)")
-        submit.raise_for_status()
-        submit_data = submit.json()
+        with stage("submit"):
+            submit = self._request("submit", "post", self.queue_url, cancel_event, headers=headers, json=payload, timeout=30)
+            if submit.status_code == 402:
+                raise RuntimeError("Payment required (insufficient credits)")
+            submit.raise_for_status()
+            submit_data = submit.json()
         status_url = submit_data.get("status_url")
         request_id = submit_data.get("request_id")
         if not status_url or not request_id:
             raise RuntimeError(f"Unexpected submit response: {submit_data}")
         self._progress(progress_callback, f"✓ Task created: {request_id}", "task")
+        job.submitted("falai", request_id=request_id, status_url=status_url)
+
+    def cancel(self, job: JobHandle) -> bool:
+        """Ask fal.ai to drop the request recorded in ``job``; True if it accepted."""
+        data = job.resume("falai")
+        return data is not None and self._cancel_request(data["status_url"])
+
+    def _cancel_request(self, status_url: str) -> bool:
+        # .../requests/{id}/status -> PUT .../requests/{id}/cancel
+        cancel_url = status_url.rsplit("/status", 1)[0] + "/cancel"
+        try:
+            resp = self._request("status", "put", cancel_url, headers={"Authorization": f"Key {self.api_key}"}, timeout=10)
+        except requests.RequestException:
+            return False
+        # 202 = cancelled, or cancellation requested while running; 400 = already completed.
+        return resp.status_code in (200, 202)
+
+    def _await_result(
+        self,
+        status_url: str,
+        progress_callback: Optional[ProgressCallback],
+        cancel_event: Optional[threading.Event],
+    ) -> list[bytes]:
+        status_headers = {"Authorization": f"Key {self.api_key}"}
 
         def sleep_with_cancel(seconds: float) -> None:
             if cancel_event is None:
@@ -137,62 +246,81 @@ class FalAIOutpaintBackend(OutpaintBackend):
                     raise CancelledError()
                 time.sleep(min(0.2, end - time.time()))
 
-        # Poll
-        attempt = 0
-        max_attempts = 240
-        while attempt < max_attempts:
-            sleep_with_cancel(5 if attempt < 24 else 10 if attempt < 60 else 15)
-            attempt += 1
-
-            if cancel_event is not None and cancel_event.is_set():
-                raise CancelledError()
-
-            resp = requests.get(status_url, headers=status_headers, timeout=30)
-            if resp.status_code == 404:
-                raise RuntimeError("Job not found (expired)")
-            if resp.status_code == 429:
-                time.sleep(30)
-                continue
-            resp.raise_for_status()
-
-            status_data = resp.json()
-            status = status_data.get("status")
-            if status in ("IN_QUEUE", "IN_PROGRESS"):
-                continue
-            if status == "COMPLETED":
-                output = status_data.get("output")
-                images = None
-                if isinstance(output, dict):
-                    images = output.get("images")
-                if images is None:
-                    images = status_data.get("images")
-
-                if images is None and status_data.get("response_url"):
-                    r = requests.get(status_data["response_url"], headers=status_headers, timeout=30)
-                    r.raise_for_status()
-                    images = r.json().get("images")
-
-                if not images:
-                    raise RuntimeError(f"No images in response: {status_data}")
-
-                results: list[bytes] = []
-                for img in images:
-                    if cancel_event is not None and cancel_event.is_set():
-                        raise CancelledError()
-
-                    url = img.get("url") if isinstance(img, dict) else (img if isinstance(img, str) else None)
-                    if not url:
+        # Set once the job is done, so a cancel during the download doesn't go to fal.ai.
+        completed = False
+        try:
+            attempt = 0
+            max_attempts = 240
+            while attempt < max_attempts:
+                sleep_with_cancel(5 if attempt < 24 else 10 if attempt < 60 else 15)
+                attempt += 1
+
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CancelledError()
+
+                with stage("poll"):
+                    resp = self._request("status", "get", status_url, cancel_event, headers=status_headers, timeout=30)
+                    if resp.status_code == 404:
+                        raise _JobExpired("Job not found (expired)")
+                    if resp.status_code == 429:
+                        # The limiter now holds every worker's polls until the Retry-After.
+                        self._progress(progress_callback, "fal.ai rate limit hit; slowing down", "warning")
                         continue
-                    self._progress(progress_callback, f"Downloading {url}", "download")
-                    out = requests.get(url, timeout=120)
-                    out.raise_for_status()
-                    results.append(out.content)
+                    resp.raise_for_status()
+                    status_data = resp.json()
+
+                status = status_data.get("status")
+                if status in ("IN_QUEUE", "IN_PROGRESS"):
+                    continue
+                if status == "COMPLETED":
+                    completed = True
+                    output = status_data.get("output")
+                    images = None
+                    if isinstance(output, dict):
+                        images = output.get("images")
+                    if images is None:
+                        images = status_data.get("images")
+
+                    if images is None and status_data.get("response_url"):
+                        with stage("poll"):
+                            r = self._request(
+                                "status", "get", status_data["response_url"], cancel_event, headers=status_headers, timeout=30
+                            )
+                            r.raise_for_status()
+                            images = r.json().get("images")
+
+                    if not images:
+                        raise RuntimeError(f"No images in response: {status_data}")
+
+                    results: list[bytes] = []
+                    try:
+                        for img in images:
+                            if cancel_event is not None and cancel_event.is_set():
+                                raise CancelledError()
+
+                            url = img.get("url") if isinstance(img, dict) else (img if isinstance(img, str) else None)
+                            if not url:
+                                continue
+                            self._progress(progress_callback, f"Downloading {url}", "download")
+                            with stage("download"):
+                                results.append(self._download(url, cancel_event))
+                    except BaseException:
+                        if self.budget is not None:
+                            self.budget.release(sum(len(b) for b in results))
+                        raise
 
-                if not results:
-                    raise RuntimeError("No downloadable images returned")
-                return results
+                    if not results:
+                        raise RuntimeError("No downloadable images returned")
+                    return results
 
-            if status in ("FAILED", "ERROR", "CANCELLED"):
-                raise RuntimeError(status_data.get("error") or f"Job {status}")
+                if status == "CANCELLED":
+                    # Dropped remotely (e.g. by a Stop); a resumed job is submitted again.
+                    raise _JobExpired("Job was cancelled")
+                if status in ("FAILED", "ERROR"):
+                    raise RuntimeError(status_data.get("error") or f"Job {status}")
+        except CancelledError:
+            if not completed and self._cancel_request(status_url):
+                self._progress(progress_callback, "Cancelled fal.ai request", "warning")
+            raise
 
         raise TimeoutError("Timeout waiting for fal.ai outpaint job")
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import CancelledError
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+import requests
+
+ENDPOINTS = ("upload", "submit", "status", "download")
+
+# Pause after a 429 that names no Retry-After, and the longest Retry-After honoured.
+DEFAULT_PAUSE = 5.0
+MAX_PAUSE = 300.0
+
+
+def retry_after_seconds(resp: Optional[requests.Response]) -> Optional[float]:
+    """The response's Retry-After, in seconds (delta-seconds or HTTP-date form)."""
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return min(MAX_PAUSE, max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        return min(MAX_PAUSE, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+class _Bucket:
+    """Token bucket for one endpoint class, with an AIMD rate.
+
+    A 429 halves the rate (down to a tenth of the configured one) and pauses the
+    endpoint for the Retry-After; each success gives back a twentieth of the
+    configured rate. ``rate`` 0 means unlimited: only 429 pauses apply.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def reserve(self, now: float) -> float:
+        """Take a token; returns how long the caller must wait before using it."""
+        delay = max(0.0, self._paused_until - now)
+        if self.rate <= 0:
+            return delay
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            delay = max(delay, -self._tokens / self.rate)
+        return delay
+
+    def paused_for(self, now: float) -> float:
+        return max(0.0, self._paused_until - now)
+
+    def throttle(self, now: float, retry_after: Optional[float]) -> None:
+        self.throttled += 1
+        if self.max_rate > 0:
+            self.rate = max(self.max_rate / 10, self.rate / 2)
+        self._paused_until = max(self._paused_until, now + (DEFAULT_PAUSE if retry_after is None else retry_after))
+
+    def recover(self) -> None:
+        if self.max_rate > 0:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter:
+    """Client-side request rate per endpoint class, shared by every worker thread.
+
+    Call :meth:`wait` before a request and :meth:`observe` with its response, so
+    a 429 slows down and pauses that endpoint for all workers instead of only
+    the one that hit it.
+    """
+
+    def __init__(self, rates: dict[str, float], *, burst: int = 5):
+        self._lock = threading.Lock()
+        self._buckets = {name: _Bucket(rates.get(name, 0.0), burst) for name in ENDPOINTS}
+
+    def configure(self, rates: dict[str, float], *, burst: int = 5) -> None:
+        with self._lock:
+            for name, bucket in self._buckets.items():
+                # Keep a rate adapted to recent 429s unless its limit changed.
+                if bucket.max_rate != rates.get(name, 0.0):
+                    bucket.max_rate = bucket.rate = rates.get(name, 0.0)
+                bucket.burst = max(1, burst)
+
+    def wait(self, endpoint: str, cancel_event: Optional[threading.Event] = None) -> float:
+        """Block until a request to ``endpoint`` may go out; returns the seconds waited."""
+        bucket = self._buckets[endpoint]
+        started = time.monotonic()
+        with self._lock:
+            delay = bucket.reserve(started)
+        if delay <= 0:
+            return 0.0
+        while delay > 0:
+            if cancel_event is None:
+                time.sleep(delay)
+            elif cancel_event.wait(delay):
+                raise CancelledError()
+            # A 429 seen meanwhile may have pushed the pause further out.
+            with self._lock:
+                delay = bucket.paused_for(time.monotonic())
+        waited = time.monotonic() - started
+        with self._lock:
+            bucket.waits += 1
+            bucket.wait_seconds += waited
+        return waited
+
+    def observe(self, endpoint: str, resp: Optional[requests.Response]) -> None:
+        """Adapt ``endpoint``'s rate to a response (None: succeeded without one to inspect)."""
+        bucket = self._buckets[endpoint]
+        with self._lock:
+            if resp is not None and resp.status_code == 429:
+                bucket.throttle(time.monotonic(), retry_after_seconds(resp))
+            elif resp is None or resp.status_code < 400:
+                bucket.recover()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "rate": round(b.rate, 3) if b.rate > 0 else None,
+                    "waits": b.waits,
+                    "wait_seconds": round(b.wait_seconds, 3),
+                    "throttled": b.throttled,
+                }
+                for name, b in self._buckets.items()
+            }
+
+
+_shared: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_rate_limiter(rates: dict[str, float], *, burst: int = 5) -> RateLimiter:
+    """The process-wide limiter for fal.ai and freeimage.host calls."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter(rates, burst=burst)
+        else:
+            _shared.configure(rates, burst=burst)
+        return _shared
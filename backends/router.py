@@ -0,0 +1,501 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from memory_budget import ByteBudget
+from prepared_image import PreparedImage
+
+from . import JobHandle, OutpaintBackend, ProgressCallback
+from .circuit_breaker import OPEN, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+def _progress(cb: Optional[ProgressCallback], message: str, level: str = "info"):
+    if cb:
+        cb(message, level)
+
+
+def _percentile(sorted_values: list[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class BackendStats:
+    """Rolling latency/failure window for one backend (thread-safe)."""
+
+    def __init__(self, window: int = 50):
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self.in_flight = 0
+
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def record_success(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+            self._outcomes.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._outcomes.append(False)
+
+    def clear_failures(self) -> None:
+        """Forget past failures once a backend is known healthy again."""
+        with self._lock:
+            self._outcomes = deque((ok for ok in self._outcomes if ok), maxlen=self._outcomes.maxlen)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._latencies)
+        return _percentile(values, pct)
+
+    @property
+    def failure_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            values = sorted(self._latencies)
+            samples = len(self._outcomes)
+            failures = sum(1 for ok in self._outcomes if not ok)
+            in_flight = self.in_flight
+        return {
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "samples": samples,
+            "failure_rate": (failures / samples) if samples else 0.0,
+            "in_flight": in_flight,
+        }
+
+
+@dataclass
+class RouteCandidate:
+    name: str
+    backend: OutpaintBackend
+    cost_per_image: float = 0.0
+    # Jobs the backend runs side by side before queueing (a local GPU is ~1, a hosted API is wide).
+    parallelism: int = 1
+    # Latency assumed until real samples exist.
+    prior_latency: float = 60.0
+    stats: BackendStats = field(default_factory=BackendStats)
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+
+
+class BackendRouter(OutpaintBackend):
+    """Picks a backend per job from live queue depth, rolling latency and a per-image cost budget.
+
+    Candidates within ``max_cost_per_image`` are ranked by expected completion time. The rest are
+    never used unless ``allow_paid_failover`` is set, and then only as failover when every affordable
+    candidate failed for this job (logged as a warning each time). Each candidate has a
+    circuit breaker; while any candidate is unhealthy a background thread probes it through
+    ``check_available`` so traffic returns to it as soon as it recovers.
+    """
+
+    QUEUE_DEPTH_TTL = 2.0
+
+    def __init__(
+        self,
+        candidates: list[RouteCandidate],
+        *,
+        max_cost_per_image: Optional[float] = None,
+        allow_paid_failover: bool = False,
+        probe_interval: float = 10.0,
+        budget: Optional[ByteBudget] = None,
+    ):
+        if not candidates:
+            raise ValueError("BackendRouter needs at least one candidate")
+        self.candidates = candidates
+        self.max_cost_per_image = max_cost_per_image
+        self.allow_paid_failover = allow_paid_failover
+        self.probe_interval = probe_interval
+        # Same budget the candidates charge; exposed so the generator can release it.
+        self.budget = budget
+        self._depth_lock = threading.Lock()
+        self._depth_cache: dict[str, tuple[float, Optional[int]]] = {}
+        self._local = threading.local()
+
+        self._probe_lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_wake = threading.Event()
+        self._closed = threading.Event()
+
+    @property
+    def last_backend_name(self) -> Optional[str]:
+        """Name of the backend that served the last job on the calling thread."""
+        return getattr(self._local, "last", None)
+
+    def _queue_depth(self, cand: RouteCandidate) -> int:
+        probe = getattr(cand.backend, "queue_depth", None)
+        if probe is None:
+            return cand.stats.in_flight
+
+        now = time.monotonic()
+        with self._depth_lock:
+            cached = self._depth_cache.get(cand.name)
+        if cached is not None and now - cached[0] < self.QUEUE_DEPTH_TTL:
+            depth = cached[1]
+        else:
+            try:
+                depth = probe()
+            except Exception:
+                depth = None
+            with self._depth_lock:
+                self._depth_cache[cand.name] = (now, depth)
+
+        if depth is None:
+            return cand.stats.in_flight
+        # Remote queue already includes our own submitted jobs.
+        return max(depth, cand.stats.in_flight)
+
+    def _score(self, cand: RouteCandidate) -> float:
+        p50 = cand.stats.percentile(0.5) or cand.prior_latency
+        p95 = cand.stats.percentile(0.95) or p50
+        depth = self._queue_depth(cand)
+        expected = p50 * (1.0 + depth / max(1, cand.parallelism)) + (p95 - p50)
+        return expected / max(0.05, 1.0 - cand.stats.failure_rate)
+
+    def _within_budget(self, cand: RouteCandidate) -> bool:
+        return self.max_cost_per_image is None or cand.cost_per_image <= self.max_cost_per_image
+
+    def rank(self) -> list[RouteCandidate]:
+        """Candidates in the order they would be tried for the next job (open circuits excluded)."""
+        primary = self.candidates[0]
+        order = {id(c): i for i, c in enumerate(self.candidates)}
+
+        healthy = [c for c in self.candidates if c.breaker.state != OPEN]
+        routed = [c for c in healthy if c is primary or self._within_budget(c)]
+        failover = [c for c in healthy if not (c is primary or self._within_budget(c))] if self.allow_paid_failover else []
+
+        routed.sort(key=lambda c: (self._score(c), c.cost_per_image, order[id(c)]))
+        failover.sort(key=lambda c: (c.cost_per_image, order[id(c)]))
+        return routed + failover
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {c.name: {**c.stats.snapshot(), "circuit": c.breaker.state} for c in self.candidates}
+
+    def timing_stats(self) -> Optional[dict[str, Any]]:
+        """Model-load/sampling timing of the candidates that report it (ComfyUI), or None."""
+        from .comfyui_backend import merge_timing_stats
+
+        stats = []
+        for c in self.candidates:
+            timing = getattr(c.backend, "timing_stats", None)
+            if callable(timing):
+                stats.append(timing())
+        return merge_timing_stats(stats) if stats else None
+
+    def rate_limit_stats(self) -> Optional[dict[str, Any]]:
+        """Client-side rate limiting of the candidate that has it (fal.ai), or None."""
+        for c in self.candidates:
+            stats = getattr(c.backend, "rate_limit_stats", None)
+            if callable(stats):
+                return stats()
+        return None
+
+    def _needs_probe(self, cand: RouteCandidate) -> bool:
+        if getattr(cand.backend, "check_available", None) is None:
+            return False
+        return cand.breaker.probe_due() or cand.stats.failure_rate > 0
+
+    def _ensure_prober(self) -> None:
+        with self._probe_lock:
+            if self._closed.is_set():
+                return
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="backend-health-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while not self._closed.is_set():
+            self._probe_wake.wait(self.probe_interval)
+            self._probe_wake.clear()
+            if self._closed.is_set():
+                return
+            self.probe_once()
+            with self._probe_lock:
+                if not any(self._needs_probe(c) for c in self.candidates):
+                    self._probe_thread = None
+                    return
+
+    def probe_once(self) -> None:
+        """Health-check every unhealthy candidate once."""
+        for cand in self.candidates:
+            if not self._needs_probe(cand):
+                continue
+            try:
+                ok, _msg = cand.backend.check_available()  # type: ignore[attr-defined]
+            except Exception:
+                ok = False
+            if ok:
+                cand.breaker.probe_succeeded()
+                cand.stats.clear_failures()
+            else:
+                cand.breaker.probe_failed()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._probe_wake.set()
+
+    def check_available(self) -> tuple[bool, str]:
+        messages: list[str] = []
+        any_ok = False
+        for cand in self.candidates:
+            check = getattr(cand.backend, "check_available", None)
+            ok, msg = check() if check else (True, "OK")
+            any_ok = any_ok or ok
+            messages.append(f"{cand.name}: {msg}")
+        return any_ok, "\n".join(messages)
+
+    def _announce(self, cand: RouteCandidate, last_err: Optional[Exception], cb: Optional[ProgressCallback]) -> None:
+        if cand is self.candidates[0] and last_err is None:
+            return
+        if cand is not self.candidates[0] and not self._within_budget(cand):
+            reason = f" after {type(last_err).__name__}: {last_err}" if last_err is not None else ""
+            logger.warning("Paid failover to %s (%.3f/image)%s", cand.name, cand.cost_per_image, reason)
+            _progress(cb, f"Paid failover to {cand.name} ({cand.cost_per_image:.3f}/image){reason}", "warning")
+            return
+        reason = f" after {type(last_err).__name__}" if last_err is not None else ""
+        _progress(cb, f"Routing to {cand.name}{reason}", "warning" if last_err else "debug")
+
+    def cancel(self, job: JobHandle) -> bool:
+        """Cancel ``job`` on the backend that accepted it."""
+        owner = job.data.get("backend") if job.data else None
+        for cand in self.candidates:
+            cancel = getattr(cand.backend, "cancel", None)
+            if cand.name == owner and cancel is not None:
+                return cancel(job)
+        return False
+
+    def submit(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> None:
+        """Queue on the best-ranked candidate that can queue.
+
+        The candidate records itself in ``job``, so :meth:`outpaint` later collects
+        from the same backend (and only fails over if that one breaks).
+        """
+        last_err: Exception | None = None
+        for cand in self.rank():
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+            submit = getattr(cand.backend, "submit", None)
+            if submit is None or not cand.breaker.allow_request():
+                continue
+            self._announce(cand, last_err, progress_callback)
+            try:
+                submit(
+                    image_path,
+                    zoom_out_percentage=zoom_out_percentage,
+                    expand_left=expand_left,
+                    expand_right=expand_right,
+                    expand_top=expand_top,
+                    expand_bottom=expand_bottom,
+                    num_images=num_images,
+                    prompt=prompt,
+                    output_format=output_format,
+                    enable_safety_checker=enable_safety_checker,
+                    progress_callback=progress_callback,
+                    cancel_event=cancel_event,
+                    prepared_image=prepared_image,
+                    job=job,
+                )
+            except (CancelledError, ValueError):
+                cand.breaker.release()
+                raise
+            except Exception as e:
+                cand.stats.record_failure()
+                cand.breaker.record_failure()
+                self._ensure_prober()
+                last_err = e
+                continue
+            # Health is judged when the job is collected; leave any half-open trial slot for that.
+            cand.breaker.release()
+            return
+
+        if last_err is not None:
+            raise last_err
+        states = ", ".join(f"{c.name}={c.breaker.state}" for c in self.candidates)
+        raise RuntimeError(f"No backend can queue this job ({states})")
+
+    def outpaint_batch(
+        self,
+        image_paths: list[str],
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_images: Optional[list[Optional[PreparedImage]]] = None,
+    ) -> list[list[bytes]]:
+        """Run the batch on the best-ranked candidate that can batch.
+
+        Raises when none can; the caller then falls back to :meth:`outpaint` per
+        image, which gets the usual failover.
+        """
+        last_err: Exception | None = None
+        for cand in self.rank():
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+            batch = getattr(cand.backend, "outpaint_batch", None)
+            if batch is None or not cand.breaker.allow_request():
+                continue
+            self._announce(cand, last_err, progress_callback)
+
+            cand.stats.begin()
+            started = time.perf_counter()
+            try:
+                out = batch(
+                    image_paths,
+                    zoom_out_percentage=zoom_out_percentage,
+                    expand_left=expand_left,
+                    expand_right=expand_right,
+                    expand_top=expand_top,
+                    expand_bottom=expand_bottom,
+                    num_images=num_images,
+                    prompt=prompt,
+                    output_format=output_format,
+                    enable_safety_checker=enable_safety_checker,
+                    progress_callback=progress_callback,
+                    cancel_event=cancel_event,
+                    prepared_images=prepared_images,
+                )
+            except (CancelledError, ValueError):
+                cand.breaker.release()
+                raise
+            except Exception as e:
+                cand.stats.record_failure()
+                cand.breaker.record_failure()
+                self._ensure_prober()
+                last_err = e
+                continue
+            finally:
+                cand.stats.end()
+
+            # Latency is ranked per image, so a batch counts as its per-image share.
+            cand.stats.record_success((time.perf_counter() - started) / max(1, len(image_paths)))
+            cand.breaker.record_success()
+            self._local.last = cand.name
+            return out
+
+        if last_err is not None:
+            raise last_err
+        states = ", ".join(f"{c.name}={c.breaker.state}" for c in self.candidates)
+        raise RuntimeError(f"No backend can batch this job ({states})")
+
+    def outpaint(
+        self,
+        image_path: str,
+        *,
+        zoom_out_percentage: int,
+        expand_left: int,
+        expand_right: int,
+        expand_top: int,
+        expand_bottom: int,
+        num_images: int,
+        prompt: str,
+        output_format: str,
+        enable_safety_checker: bool,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancel_event: Optional[threading.Event] = None,
+        prepared_image: Optional[PreparedImage] = None,
+        job: Optional[JobHandle] = None,
+    ) -> list[bytes]:
+        ranked = self.rank()
+        if job is not None and job.data:
+            # A resumable job lives on the backend that accepted it; try that one first.
+            owner = job.data.get("backend")
+            ranked.sort(key=lambda c: c.name != owner)
+        last_err: Exception | None = None
+
+        for cand in ranked:
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+            if not cand.breaker.allow_request():
+                continue
+            self._announce(cand, last_err, progress_callback)
+
+            cand.stats.begin()
+            started = time.perf_counter()
+            try:
+                out = cand.backend.outpaint(
+                    image_path,
+                    zoom_out_percentage=zoom_out_percentage,
+                    expand_left=expand_left,
+                    expand_right=expand_right,
+                    expand_top=expand_top,
+                    expand_bottom=expand_bottom,
+                    num_images=num_images,
+                    prompt=prompt,
+                    output_format=output_format,
+                    enable_safety_checker=enable_safety_checker,
+                    progress_callback=progress_callback,
+                    cancel_event=cancel_event,
+                    prepared_image=prepared_image,
+                    job=job,
+                )
+            except (CancelledError, ValueError):
+                # Cancellation and bad input say nothing about backend health.
+                cand.breaker.release()
+                raise
+            except Exception as e:
+                cand.stats.record_failure()
+                cand.breaker.record_failure()
+                self._ensure_prober()
+                last_err = e
+                continue
+            finally:
+                cand.stats.end()
+
+            cand.stats.record_success(time.perf_counter() - started)
+            cand.breaker.record_success()
+            self._local.last = cand.name
+            return out
+
+        if last_err is not None:
+            raise last_err
+        states = ", ".join(f"{c.name}={c.breaker.state}" for c in self.candidates)
+        raise RuntimeError(f"No backend available ({states}); waiting for health probes to recover")
@@ -0,0 +1,85 @@
+"""
+Output encode benchmark: re-encoding on worker threads vs. the EncodePool.
+
+Synthesizes a batch of large outputs as JPEG bytes (what a backend might
+return) and re-encodes them to PNG/WebP with N concurrent writer threads,
+first inline (GIL-bound) and then through EncodePool processes.
+
+Usage:
+    python benchmarks/bench_encode_pool.py --count 8 --size 7680x4320 --workers 4
+    python benchmarks/bench_encode_pool.py --format webp --size 3840x2160
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image  # noqa: E402
+
+from output_writer import EncodePool, write_output  # noqa: E402
+
+
+def make_output(width: int, height: int, seed: int) -> bytes:
+    # Gradient + noise so PNG/WebP have real work to do (flat fills compress trivially).
+    noise = Image.effect_noise((width, height), 40 + seed).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    img = Image.blend(noise, gradient, 0.5)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def run(label: str, write, payloads: list[bytes], out_dir: Path, fmt: str, threads: int, mp_each: float) -> float:
+    for p in out_dir.iterdir():
+        p.unlink()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        list(ex.map(lambda i: write(payloads[i], out_dir / f"out_{i}.{fmt}", fmt), range(len(payloads))))
+    elapsed = time.perf_counter() - t0
+    mp = len(payloads) * mp_each
+    print(f"{label:<28} {elapsed:8.2f}s  {len(payloads) / elapsed:6.2f} img/s  {mp / elapsed:8.1f} MP/s")
+    return elapsed
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--size", default="7680x4320", help="WIDTHxHEIGHT of each output")
+    parser.add_argument("--format", choices=["png", "webp"], default="png")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Encode processes")
+    parser.add_argument("--threads", type=int, default=5, help="Concurrent writer threads (generator workers)")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    mp_each = width * height / 1_000_000
+
+    print(f"Synthesizing {args.count} outputs at {width}x{height} …")
+    payloads = [make_output(width, height, i) for i in range(args.count)]
+
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_encode_"))
+    pool = EncodePool(args.workers)
+    try:
+        # Warm the pool so process start-up isn't billed to the first batch.
+        pool.write(payloads[0], out_dir / f"warm.{args.format}", args.format)
+
+        inline = run(f"inline, {args.threads} threads", write_output, payloads, out_dir, args.format, args.threads, mp_each)
+        pooled = run(f"EncodePool, {args.workers} procs", pool.write, payloads, out_dir, args.format, args.threads, mp_each)
+        print(f"speedup: {inline / pooled:.2f}x")
+    finally:
+        pool.shutdown()
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,72 @@
+"""
+Encoder profile micro-benchmark: encode time and output size per profile.
+
+Encodes every image in tests/fixtures/valid (or --images) to each output
+format with each encoder profile and reports the mean encode time and the
+total bytes written.
+
+Usage:
+    python benchmarks/bench_encoder_profiles.py
+    python benchmarks/bench_encoder_profiles.py --images D:/outputs --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from PIL import Image  # noqa: E402
+
+from output_writer import ENCODER_PROFILES, encode_image  # noqa: E402
+
+
+def load_images(folder: Path) -> list[Image.Image]:
+    images: list[Image.Image] = []
+    for p in sorted(folder.iterdir()):
+        if p.suffix.lower() not in {".png", ".jpg", ".jpeg", ".webp"}:
+            continue
+        with Image.open(p) as img:
+            img.load()
+            images.append(img.copy())
+    return images
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=str(ROOT / "tests" / "fixtures" / "valid"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    images = load_images(Path(args.images))
+    if not images:
+        print(f"No images in {args.images}")
+        return 1
+    megapixels = sum(i.width * i.height for i in images) / 1_000_000
+    print(f"{len(images)} images, {megapixels:.1f} MP total, best of {args.repeat}\n")
+    print(f"{'format':<6} {'profile':<9} {'time':>9} {'MP/s':>8} {'bytes':>12}")
+
+    for fmt in ("png", "jpeg", "webp"):
+        for profile in ENCODER_PROFILES:
+            best = float("inf")
+            size = 0
+            for _ in range(args.repeat):
+                size = 0
+                t0 = time.perf_counter()
+                for img in images:
+                    buf = io.BytesIO()
+                    encode_image(img, buf, fmt, profile)
+                    size += buf.tell()
+                best = min(best, time.perf_counter() - t0)
+            print(f"{fmt:<6} {profile:<9} {best * 1000:7.1f}ms {megapixels / best:8.1f} {size:>12,}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
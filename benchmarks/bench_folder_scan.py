@@ -0,0 +1,90 @@
+"""
+Folder scan benchmark: legacy os.walk + Path suffix vs. the parallel scandir walker.
+
+Builds a synthetic tree of empty files (100k by default) under a temp folder,
+then times a full scan with each implementation.
+
+Usage:
+    python benchmarks/bench_folder_scan.py --files 100000 --dirs 500 --workers 8
+    python benchmarks/bench_folder_scan.py --root D:/photos   # scan an existing tree
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from folder_scan import scan_image_files  # noqa: E402
+from outpaint_config import SUPPORTED_INPUT_FORMATS  # noqa: E402
+
+
+def legacy_scan(folder: str):
+    for root, _dirs, files in os.walk(Path(folder)):
+        for fn in files:
+            if Path(fn).suffix.lower() in SUPPORTED_INPUT_FORMATS:
+                yield str(Path(root) / fn)
+
+
+def build_tree(root: Path, files: int, dirs: int) -> None:
+    exts = [".png", ".jpg", ".webp", ".txt"]
+    per_dir = max(1, files // dirs)
+    made = 0
+    d = 0
+    while made < files:
+        sub = root / f"d{d // 20:03d}" / f"s{d:05d}"
+        sub.mkdir(parents=True, exist_ok=True)
+        for i in range(min(per_dir, files - made)):
+            (sub / f"img_{i:05d}{exts[i % len(exts)]}").touch()
+        made += per_dir
+        d += 1
+
+
+def timed(label: str, fn, repeat: int) -> float:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = sum(1 for _ in fn())
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<28} {best:8.3f}s  {count:>8} files  {count / best:>12,.0f} files/s")
+    return best
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", help="Existing folder to scan instead of a synthetic tree")
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--dirs", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    tmp: Path | None = None
+    if args.root:
+        root = args.root
+    else:
+        tmp = Path(tempfile.mkdtemp(prefix="bench_scan_"))
+        print(f"Building {args.files} files in {args.dirs} folders under {tmp} …")
+        build_tree(tmp, args.files, args.dirs)
+        root = str(tmp)
+
+    try:
+        legacy = timed("os.walk + Path.suffix", lambda: legacy_scan(root), args.repeat)
+        timed("scandir, 1 worker", lambda: scan_image_files(root, workers=1), args.repeat)
+        fast = timed(f"scandir, {args.workers} workers", lambda: scan_image_files(root, workers=args.workers), args.repeat)
+        print(f"speedup: {legacy / fast:.2f}x")
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
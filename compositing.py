@@ -0,0 +1,86 @@
+"""
+Pixel helpers for proxy-resolution outpainting.
+
+The backend works on a downscaled copy of the input; its result is upscaled
+to the full-resolution canvas and the original pixels are pasted back over
+the centre with a feathered edge so the seam into the generated border is soft.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+from typing import Optional
+
+from PIL import Image, ImageChops
+
+from prepared_image import PreparedImage
+
+Expand = tuple[int, int, int, int]  # left, right, top, bottom
+
+
+def proxy_scale(size: tuple[int, int], max_side: int) -> Optional[float]:
+    """Downscale factor that fits ``size`` into ``max_side``, or None if it already fits."""
+    longest = max(size)
+    if longest <= max_side:
+        return None
+    return max_side / longest
+
+
+def scale_expand(expand: Expand, scale: float) -> Expand:
+    return tuple(int(round(v * scale)) for v in expand)  # type: ignore[return-value]
+
+
+def make_proxy(prepared: PreparedImage, scale: float) -> PreparedImage:
+    """Downscaled in-memory copy of ``prepared`` (JPEG sources decode via draft mode)."""
+    width, height = prepared.size
+    target = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    proxy = prepared.reduced(max(target)).resize(target, Image.Resampling.LANCZOS)
+    stem = os.path.splitext(prepared.name)[0]
+    return PreparedImage.from_image(proxy, name=f"{stem}_proxy.png")
+
+
+def feather_mask(size: tuple[int, int], feather: int, *, sides: Expand) -> Image.Image:
+    """L-mode mask, opaque inside and ramping to 0 over ``feather`` px on each side with a non-zero entry."""
+    width, height = size
+    mask = Image.new("L", size, 255)
+    fw = min(feather, width // 2)
+    fh = min(feather, height // 2)
+    ramp = Image.linear_gradient("L")  # 0 at the top row -> 255 at the bottom
+    left, right, top, bottom = sides
+
+    def fade(box: tuple[int, int, int, int], gradient: Image.Image) -> None:
+        region = mask.crop(box)
+        mask.paste(ImageChops.multiply(region, gradient.resize(region.size)), box[:2])
+
+    if top and fh:
+        fade((0, 0, width, fh), ramp)
+    if bottom and fh:
+        fade((0, height - fh, width, height), ramp.transpose(Image.Transpose.FLIP_TOP_BOTTOM))
+    if left and fw:
+        fade((0, 0, fw, height), ramp.transpose(Image.Transpose.ROTATE_90))
+    if right and fw:
+        fade((width - fw, 0, width, height), ramp.transpose(Image.Transpose.ROTATE_270))
+    return mask
+
+
+def composite_original(
+    output: bytes,
+    prepared: PreparedImage,
+    expand: Expand,
+    *,
+    feather: int,
+) -> Image.Image:
+    """Upscale a proxy-resolution backend output to the full canvas and restore the original centre."""
+    left, right, top, bottom = expand
+    width, height = prepared.size
+    canvas_size = (width + left + right, height + top + bottom)
+
+    with Image.open(io.BytesIO(output)) as generated:
+        canvas = generated.convert("RGB").resize(canvas_size, Image.Resampling.LANCZOS)
+
+    original = prepared.image()
+    if original.mode != "RGB":
+        original = original.convert("RGB")
+    canvas.paste(original, (left, top), feather_mask(original.size, feather, sides=expand))
+    return canvas
@@ -0,0 +1,385 @@
+"""
+Coordinator/worker mode: several machines draining one batch.
+
+The coordinator owns the list of inputs and hands them out over a small JSON
+HTTP API as time-limited leases. Workers (one per GPU box, each with its own
+local backend) lease an item, run ``OutpaintGenerator.generate`` on it,
+heartbeat while it runs, and report the outputs. A lease that is not renewed
+in time is reclaimed and handed to someone else, so work held by a dead node
+is not lost. Input paths are passed through as-is: every node must see the
+inputs (and the output folder) at the same path, e.g. on a shared mount.
+
+    POST /lease      {"worker"}                          -> 200 item | 204 wait | 410 finished
+    POST /heartbeat  {"worker", "id"}                     -> 200 | 409 lease lost
+    POST /complete   {"worker", "id", "ok", "outputs", "error"} -> 200 | 409 lease lost
+    GET  /status                                          -> counters
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Lease:
+    path: str
+    worker: str
+    expires: float
+    attempts: int
+
+
+class LeaseQueue:
+    """Thread-safe work list with leases. Paths are pulled from ``paths`` lazily."""
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        *,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._source: Iterator[str] = iter(paths)
+        self._exhausted = False
+        self._next_id = 0
+        self._ready: deque[tuple[str, str, int]] = deque()  # id, path, attempts so far
+        self._leased: dict[str, _Lease] = {}
+        self._lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+        self.reclaimed = 0
+
+    def _reclaim_expired(self) -> None:
+        now = self._clock()
+        for item_id, lease in list(self._leased.items()):
+            if lease.expires <= now:
+                del self._leased[item_id]
+                self.reclaimed += 1
+                logger.warning("Lease %s on %s expired (worker %s); requeueing", item_id, lease.path, lease.worker)
+                self._requeue(item_id, lease)
+
+    def _requeue(self, item_id: str, lease: _Lease) -> bool:
+        """Put a failed or expired lease back; False once it has used up ``max_attempts``."""
+        if lease.attempts >= self.max_attempts:
+            self.failed += 1
+            return False
+        self._ready.append((item_id, lease.path, lease.attempts))
+        return True
+
+    def _take(self) -> Optional[tuple[str, str, int]]:
+        if self._ready:
+            return self._ready.popleft()
+        if self._exhausted:
+            return None
+        try:
+            path = next(self._source)
+        except StopIteration:
+            self._exhausted = True
+            return None
+        self._next_id += 1
+        return str(self._next_id), path, 0
+
+    def lease(self, worker: str) -> Optional[dict[str, Any]]:
+        """Next item for ``worker``, or None when nothing is available right now."""
+        with self._lock:
+            self._reclaim_expired()
+            item = self._take()
+            if item is None:
+                return None
+            item_id, path, attempts = item
+            self._leased[item_id] = _Lease(path, worker, self._clock() + self.lease_seconds, attempts + 1)
+            return {"id": item_id, "path": path, "lease_seconds": self.lease_seconds}
+
+    def _held(self, item_id: str, worker: str) -> Optional[_Lease]:
+        lease = self._leased.get(item_id)
+        return lease if lease is not None and lease.worker == worker else None
+
+    def heartbeat(self, item_id: str, worker: str) -> bool:
+        with self._lock:
+            lease = self._held(item_id, worker)
+            if lease is None:
+                return False
+            lease.expires = self._clock() + self.lease_seconds
+            return True
+
+    def complete(self, item_id: str, worker: str, ok: bool) -> Optional[str]:
+        """Settle a lease; returns its path, or None if the lease was already lost."""
+        settled = self.settle(item_id, worker, ok)
+        return settled[0] if settled is not None else None
+
+    def settle(self, item_id: str, worker: str, ok: bool) -> Optional[tuple[str, bool]]:
+        """Like :meth:`complete`, but returns ``(path, final)``.
+
+        ``final`` is False for a failure that was put back for another attempt.
+        """
+        with self._lock:
+            lease = self._held(item_id, worker)
+            if lease is None:
+                return None
+            del self._leased[item_id]
+            if ok:
+                self.done += 1
+                return lease.path, True
+            return lease.path, not self._requeue(item_id, lease)
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            self._reclaim_expired()
+            if not self._exhausted and not self._ready:
+                # Peek so an empty source is noticed without a lease request.
+                item = self._take()
+                if item is not None:
+                    self._ready.appendleft(item)
+            return self._exhausted and not self._ready and not self._leased
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "done": self.done,
+                "failed": self.failed,
+                "leased": len(self._leased),
+                "ready": len(self._ready),
+                "reclaimed": self.reclaimed,
+                "source_exhausted": self._exhausted,
+            }
+
+
+CompleteCallback = Callable[[str, bool, list[str], str], None]
+
+
+class CoordinatorServer:
+    """Serves a :class:`LeaseQueue` over HTTP on a background thread.
+
+    ``on_complete`` runs once per item when it is settled: when it succeeds, or
+    when its last attempt fails. Failures that are retried are only logged.
+    """
+
+    def __init__(
+        self,
+        queue: LeaseQueue,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        on_complete: Optional[CompleteCallback] = None,
+    ):
+        self.queue = queue
+        self.on_complete = on_complete
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+                logger.debug("coordinator: " + format, *args)
+
+            def _reply(self, status: int, body: Optional[dict] = None) -> None:
+                payload = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                if self.path == "/status":
+                    self._reply(200, {**coordinator.queue.stats(), "finished": coordinator.queue.finished})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self) -> None:
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    worker = str(body["worker"])
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400, {"error": "expected a JSON body with 'worker'"})
+                    return
+                coordinator._dispatch(self, self.path, worker, body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        if host in ("0.0.0.0", "::"):
+            host = socket.gethostname()
+        return f"http://{host}:{port}"
+
+    def _dispatch(self, handler: Any, path: str, worker: str, body: dict) -> None:
+        q = self.queue
+        if path == "/lease":
+            item = q.lease(worker)
+            if item is not None:
+                handler._reply(200, item)
+            else:
+                handler._reply(410 if q.finished else 204)
+        elif path == "/heartbeat":
+            handler._reply(200 if q.heartbeat(str(body.get("id")), worker) else 409, {})
+        elif path == "/complete":
+            ok = bool(body.get("ok"))
+            settled = q.settle(str(body.get("id")), worker, ok)
+            if settled is None:
+                handler._reply(409, {})
+                return
+            src, final = settled
+            if not final:
+                logger.warning("%s failed on %s (%s); queued for another attempt", src, worker, body.get("error") or "")
+            elif self.on_complete is not None:
+                try:
+                    self.on_complete(src, ok, list(body.get("outputs") or []), str(body.get("error") or ""))
+                except Exception:
+                    logger.exception("on_complete failed for %s", src)
+            handler._reply(200, {})
+        else:
+            handler._reply(404, {"error": "not found"})
+
+    def start(self) -> "CoordinatorServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="coordinator", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_finished(self, poll_interval: float = 1.0, linger: float = 5.0) -> None:
+        """Block until every item is settled, then keep answering 410 briefly so workers exit cleanly."""
+        while not self.queue.finished:
+            time.sleep(poll_interval)
+        time.sleep(linger)
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class CoordinatorClient:
+    def __init__(self, base_url: str, worker: Optional[str] = None, timeout: float = 30.0):
+        self.base_url = base_url.rstrip("/")
+        self.worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.timeout = timeout
+
+    def _post(self, path: str, **body: Any) -> requests.Response:
+        return requests.post(f"{self.base_url}{path}", json={"worker": self.worker, **body}, timeout=self.timeout)
+
+    def lease(self) -> tuple[str, Optional[dict]]:
+        """("item", item) | ("wait", None) | ("finished", None)."""
+        resp = self._post("/lease")
+        if resp.status_code == 410:
+            return "finished", None
+        if resp.status_code == 204:
+            return "wait", None
+        resp.raise_for_status()
+        return "item", resp.json()
+
+    def heartbeat(self, item_id: str) -> bool:
+        return self._post("/heartbeat", id=item_id).status_code == 200
+
+    def complete(self, item_id: str, *, ok: bool, outputs: list[str], error: str = "") -> bool:
+        return self._post("/complete", id=item_id, ok=ok, outputs=outputs, error=error).status_code == 200
+
+
+def run_worker(
+    client: CoordinatorClient,
+    generate: Callable[[str], Any],
+    *,
+    threads: int = 1,
+    poll_interval: float = 2.0,
+    stop_event: Optional[threading.Event] = None,
+    on_result: Optional[Callable[[str, bool, str], None]] = None,
+) -> dict[str, int]:
+    """Lease and process items until the coordinator reports the batch finished.
+
+    ``generate`` is normally ``OutpaintGenerator.generate``; it must return an
+    object with ``output_paths``. Leases are renewed every third of their length
+    while ``generate`` runs.
+    """
+    stop = stop_event or threading.Event()
+    beat_stop = threading.Event()
+    active: dict[str, tuple[float, float]] = {}  # item id -> (lease length, last renewal)
+    active_lock = threading.Lock()
+    counts = {"done": 0, "failed": 0, "lost": 0}
+    counts_lock = threading.Lock()
+
+    def heartbeats() -> None:
+        while not beat_stop.wait(1.0):
+            with active_lock:
+                items = list(active.items())
+            now = time.monotonic()
+            for item_id, (length, last) in items:
+                if now - last < length / 3:
+                    continue
+                try:
+                    client.heartbeat(item_id)
+                except requests.RequestException as e:
+                    logger.warning("Heartbeat for %s failed: %s", item_id, e)
+                with active_lock:
+                    if item_id in active:
+                        active[item_id] = (length, now)
+
+    def loop() -> None:
+        failures = 0
+        while not stop.is_set():
+            try:
+                kind, item = client.lease()
+                failures = 0
+            except requests.RequestException as e:
+                failures += 1
+                if failures >= 5:
+                    logger.error("Coordinator unreachable, stopping: %s", e)
+                    return
+                stop.wait(poll_interval)
+                continue
+            if kind == "finished":
+                return
+            if item is None:
+                stop.wait(poll_interval)
+                continue
+
+            item_id, path = item["id"], item["path"]
+            with active_lock:
+                active[item_id] = (float(item.get("lease_seconds") or 600), time.monotonic())
+            try:
+                outputs = list(generate(path).output_paths)
+                ok, error = True, ""
+            except Exception as e:
+                outputs, ok, error = [], False, str(e)
+            finally:
+                with active_lock:
+                    active.pop(item_id, None)
+
+            try:
+                accepted = client.complete(item_id, ok=ok, outputs=outputs, error=error)
+            except requests.RequestException:
+                accepted = False
+            with counts_lock:
+                counts["lost" if not accepted else "done" if ok else "failed"] += 1
+            if on_result is not None:
+                on_result(path, ok, error)
+
+    beat = threading.Thread(target=heartbeats, name="worker-heartbeat", daemon=True)
+    beat.start()
+    pool = [threading.Thread(target=loop, name=f"worker-{i}") for i in range(max(1, threads))]
+    for t in pool:
+        t.start()
+    try:
+        for t in pool:
+            t.join()
+    finally:
+        beat_stop.set()
+        beat.join()
+    return counts
@@ -0,0 +1,182 @@
+"""
+Parallel folder scanner for image inputs.
+
+Walks a directory tree with os.scandir on a small thread pool (one task per
+directory) and yields matching file paths as soon as each directory is read.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import os
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Sequence
+
+from outpaint_config import SUPPORTED_INPUT_FORMATS
+
+
+def _matches_any(name: str, rel_path: str, patterns: Sequence[str]) -> bool:
+    return any(fnmatch.fnmatch(name, pat) or fnmatch.fnmatch(rel_path, pat) for pat in patterns)
+
+
+def _folder_matches(parts: Sequence[str], pattern: str, mode: str) -> bool:
+    needle = pattern.lower()
+    if mode == "exact":
+        return any(part.lower() == needle for part in parts)
+    return any(needle in part.lower() for part in parts)
+
+
+def _scan_dir(
+    path: str,
+    rel: str,
+    *,
+    extensions: frozenset[str],
+    include: Sequence[str],
+    exclude: Sequence[str],
+    follow_symlinks: bool,
+) -> tuple[list[str], list[tuple[str, str, Optional[tuple[int, int]]]]]:
+    """Read one directory: matching files, and subdirectories as (path, rel, (dev, inode)).
+
+    The (dev, inode) key is only needed to break symlink loops, so it is None
+    unless ``follow_symlinks`` is set.
+    """
+    files: list[str] = []
+    subdirs: list[tuple[str, str, Optional[tuple[int, int]]]] = []
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return files, subdirs
+
+    with it:
+        for entry in it:
+            name = entry.name
+            child_rel = f"{rel}/{name}" if rel else name
+            try:
+                if entry.is_dir(follow_symlinks=follow_symlinks):
+                    if exclude and _matches_any(name, child_rel, exclude):
+                        continue
+                    key = None
+                    if follow_symlinks:
+                        # os.stat (not DirEntry.stat) fills st_dev/st_ino on Windows too.
+                        st = os.stat(entry.path)
+                        key = (st.st_dev, st.st_ino)
+                    subdirs.append((entry.path, child_rel, key))
+                    continue
+                # Symlinked files are always taken (as os.walk did); the flag only governs recursion.
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+
+            dot = name.rfind(".")
+            if dot <= 0 or name[dot:].lower() not in extensions:
+                continue
+            if include and not _matches_any(name, child_rel, include):
+                continue
+            if exclude and _matches_any(name, child_rel, exclude):
+                continue
+            files.append(entry.path)
+
+    files.sort()
+    return files, subdirs
+
+
+def scan_image_files(
+    folder: str,
+    *,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    folder_filter_pattern: str = "",
+    folder_match_mode: str = "partial",
+    max_depth: Optional[int] = None,
+    follow_symlinks: bool = False,
+    workers: int = 8,
+    extensions: Iterable[str] = SUPPORTED_INPUT_FORMATS,
+) -> Iterator[str]:
+    """
+    Yield image files under ``folder`` as directories are read.
+
+    Args:
+        include: Glob patterns a file name or relative path must match (any).
+        exclude: Glob patterns that skip files and prune directories.
+        folder_filter_pattern: Only yield files inside a folder whose name matches
+            (``folder_match_mode`` "partial" = substring, "exact" = whole name,
+            both case-insensitive).
+        max_depth: 0 = only ``folder`` itself, None = unlimited.
+        follow_symlinks: Descend into symlinked directories (loops are detected
+            by device/inode and skipped).
+        workers: Threads reading directories concurrently.
+    """
+    if not os.path.isdir(folder):
+        return
+
+    exts = frozenset(e.lower() for e in extensions)
+    include = tuple(include)
+    exclude = tuple(exclude)
+    pattern = (folder_filter_pattern or "").strip()
+    root_name = os.path.basename(os.path.normpath(folder))
+
+    seen: set[tuple[int, int]] = set()
+    if follow_symlinks:
+        root_stat = os.stat(folder)
+        seen.add((root_stat.st_dev, root_stat.st_ino))
+
+    def wanted(rel: str) -> bool:
+        if not pattern:
+            return True
+        parts = [root_name, *rel.split("/")] if rel else [root_name]
+        return _folder_matches(parts, pattern, folder_match_mode)
+
+    ex = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scan")
+    pending: dict[Future, tuple[str, int]] = {}
+    # Futures land here as they finish, so picking the next one is O(1).
+    completed: queue.SimpleQueue[Future] = queue.SimpleQueue()
+
+    def submit(path: str, rel: str, depth: int) -> None:
+        fut = ex.submit(
+            _scan_dir,
+            path,
+            rel,
+            extensions=exts,
+            include=include,
+            exclude=exclude,
+            follow_symlinks=follow_symlinks,
+        )
+        pending[fut] = (rel, depth)
+        fut.add_done_callback(completed.put)
+
+    try:
+        submit(folder, "", 0)
+        while pending:
+            fut = completed.get()
+            rel, depth = pending.pop(fut)
+            files, subdirs = fut.result()
+
+            if max_depth is None or depth < max_depth:
+                for sub_path, sub_rel, key in subdirs:
+                    if key is not None:
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    submit(sub_path, sub_rel, depth + 1)
+
+            if files and wanted(rel):
+                yield from files
+    finally:
+        for fut in pending:
+            fut.cancel()
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+def folder_scan_options(cfg: dict) -> dict:
+    """``scan_image_files`` keyword arguments from a config dict."""
+    depth = cfg.get("folder_max_depth")
+    return {
+        "include": list(cfg.get("folder_include_globs") or []),
+        "exclude": list(cfg.get("folder_exclude_globs") or []),
+        "folder_filter_pattern": str(cfg.get("folder_filter_pattern") or ""),
+        "folder_match_mode": str(cfg.get("folder_match_mode") or "partial"),
+        "max_depth": int(depth) if depth is not None else None,
+        "follow_symlinks": bool(cfg.get("folder_follow_symlinks")),
+    }
@@ -0,0 +1,188 @@
+"""
+Header-only image probing.
+
+Reads just enough of a file to get its container format and pixel size for
+PNG, JPEG, WebP, BMP and TIFF, without handing the file to PIL. Results are
+memoized by (path, mtime, size) so repeated validation of the same file is a
+stat call plus a dict lookup.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO, Optional
+
+
+HEAD_BYTES = 4096
+
+# JPEG start-of-frame markers that carry the image size (not DHT/JPG/DAC).
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    format: str  # "png" | "jpeg" | "webp" | "bmp" | "tiff"
+    width: int
+    height: int
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.width, self.height
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """Container format from the first bytes of a file/buffer, or None if unknown."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def _png_size(head: bytes) -> Optional[tuple[int, int]]:
+    if len(head) < 24 or head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
+
+
+def _jpeg_size(f: BinaryIO) -> Optional[tuple[int, int]]:
+    f.seek(2)
+    while True:
+        b = f.read(1)
+        while b == b"\xff":
+            b = f.read(1)
+        if not b:
+            return None
+        marker = b[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers, no length
+        if marker == 0xD9 or marker == 0xDA:
+            return None  # EOI / start of scan before any SOF
+        seg = f.read(2)
+        if len(seg) < 2:
+            return None
+        length = struct.unpack(">H", seg)[0]
+        if length < 2:
+            return None
+        if marker in _JPEG_SOF:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            h, w = struct.unpack(">HH", data[1:5])
+            return w, h
+        f.seek(length - 2, os.SEEK_CUR)
+        # Keep scanning; large EXIF/ICC segments are skipped by seeking, not reading.
+        if f.read(1) != b"\xff":
+            return None
+        f.seek(-1, os.SEEK_CUR)
+
+
+def _webp_size(head: bytes) -> Optional[tuple[int, int]]:
+    if len(head) < 30:
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        # Lossy: frame tag (3) + start code (3) then 14-bit width/height.
+        if head[23:26] != b"\x9d\x01\x2a":
+            return None
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L":
+        if head[20] != 0x2F:
+            return None
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        w = int.from_bytes(head[24:27], "little") + 1
+        h = int.from_bytes(head[27:30], "little") + 1
+        return w, h
+    return None
+
+
+def _bmp_size(head: bytes) -> Optional[tuple[int, int]]:
+    if len(head) < 26:
+        return None
+    dib = struct.unpack("<I", head[14:18])[0]
+    if dib == 12:
+        w, h = struct.unpack("<HH", head[18:22])
+        return w, h
+    if dib >= 40:
+        w, h = struct.unpack("<ii", head[18:26])
+        return abs(w), abs(h)
+    return None
+
+
+def _tiff_size(f: BinaryIO, head: bytes) -> Optional[tuple[int, int]]:
+    endian = "<" if head[:2] == b"II" else ">"
+    ifd = struct.unpack(endian + "I", head[4:8])[0]
+    f.seek(ifd)
+    raw = f.read(2)
+    if len(raw) < 2:
+        return None
+    count = struct.unpack(endian + "H", raw)[0]
+    entries = f.read(12 * count)
+    width = height = None
+    for i in range(0, len(entries) - 11, 12):
+        tag, typ = struct.unpack(endian + "HH", entries[i : i + 4])
+        if tag not in (256, 257):
+            continue
+        if typ == 3:
+            value = struct.unpack(endian + "H", entries[i + 8 : i + 10])[0]
+        elif typ == 4:
+            value = struct.unpack(endian + "I", entries[i + 8 : i + 12])[0]
+        else:
+            return None
+        if tag == 256:
+            width = value
+        else:
+            height = value
+    if width is None or height is None:
+        return None
+    return width, height
+
+
+def read_header(f: BinaryIO) -> Optional[ImageHeader]:
+    """Parse format and size from an open binary file (seeks as needed)."""
+    head = f.read(HEAD_BYTES)
+    fmt = sniff_format(head)
+    size: Optional[tuple[int, int]] = None
+    try:
+        if fmt == "png":
+            size = _png_size(head)
+        elif fmt == "jpeg":
+            size = _jpeg_size(f)
+        elif fmt == "webp":
+            size = _webp_size(head)
+        elif fmt == "bmp":
+            size = _bmp_size(head)
+        elif fmt == "tiff":
+            size = _tiff_size(f, head)
+    except (struct.error, OSError, ValueError):
+        size = None
+    if fmt is None or size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return ImageHeader(format=fmt, width=size[0], height=size[1])
+
+
+@lru_cache(maxsize=8192)
+def _probe_cached(path: str, _mtime_ns: int, _size: int) -> Optional[ImageHeader]:
+    with open(path, "rb") as f:
+        return read_header(f)
+
+
+def probe_image(path: str) -> Optional[ImageHeader]:
+    """Header-only format/size for ``path``; None when the header can't be parsed.
+
+    Raises OSError if the file can't be stat'ed or opened.
+    """
+    st = os.stat(path)
+    return _probe_cached(os.fspath(path), st.st_mtime_ns, st.st_size)
@@ -0,0 +1,155 @@
+"""
+Append-only run manifest for resumable batch runs.
+
+Each line is a JSON record for one input: its path, size, mtime and content
+hash, a digest of the parameters that shape the output, and a status of
+``submitted`` (with the backend's job handle), ``done`` (with output paths) or
+``failed``. The file is replayed into a dict on open, so checking whether an
+input is already done is a lookup plus a stat. A rerun skips finished inputs
+and resumes remote jobs that were still in flight when the last run stopped.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+# Config fields that change what gets generated or where it is written; anything else
+# (workers, logging, ...) may differ on resume.
+OUTPUT_FIELDS = (
+    "backend",
+    "comfyui_workflow_path",
+    "expand_mode",
+    "zoom_out_percentage",
+    "expand_left",
+    "expand_right",
+    "expand_top",
+    "expand_bottom",
+    "expand_percentage",
+    "num_images",
+    "prompt",
+    "output_format",
+    "encoder_profile",
+    "enable_safety_checker",
+    "proxy",
+    "tiling",
+    "progressive",
+    "output_folder",
+    "use_source_folder",
+    "output_suffix",
+)
+
+
+def output_params(config_dict: dict) -> dict:
+    return {k: config_dict[k] for k in OUTPUT_FIELDS if k in config_dict}
+
+
+def file_sha1(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RunManifest:
+    def __init__(self, path: str, params: dict):
+        self.path = Path(path)
+        self.params = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # a torn last line from a crash
+                    if isinstance(rec, dict) and "source" in rec:
+                        self._entries[rec["source"]] = rec
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _key(source: str) -> str:
+        return os.path.abspath(source)
+
+    def _current(self, source: str) -> Optional[dict[str, Any]]:
+        """The latest record for ``source`` if it still describes the same file and parameters."""
+        rec = self._entries.get(self._key(source))
+        if rec is None or rec.get("params") != self.params:
+            return None
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        if rec.get("size") != st.st_size:
+            return None
+        if rec.get("mtime_ns") != st.st_mtime_ns:
+            # Touched or copied: only trust the record if the content is unchanged.
+            if not rec.get("sha1") or file_sha1(source) != rec["sha1"]:
+                return None
+        return rec
+
+    def completed(self, source: str) -> Optional[list[str]]:
+        """Outputs from a finished run of ``source``, or None if it needs processing."""
+        rec = self._current(source)
+        if rec is None or rec.get("status") != "done":
+            return None
+        outputs = rec.get("outputs") or []
+        if not all(os.path.exists(p) for p in outputs):
+            return None
+        return outputs
+
+    def pending_job(self, source: str) -> Optional[dict]:
+        """Job handle of a remote job submitted for ``source`` that never finished."""
+        rec = self._current(source)
+        if rec is None or rec.get("status") != "submitted":
+            return None
+        return rec.get("job")
+
+    def _append(self, source: str, status: str, **fields: Any) -> None:
+        st = os.stat(source)
+        rec = {
+            "source": self._key(source),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "params": self.params,
+            "status": status,
+            "ts": round(time.time(), 3),
+            **fields,
+        }
+        line = json.dumps(rec, ensure_ascii=False)
+        with self._lock:
+            self._entries[rec["source"]] = rec
+            self._fh.write(line + "\n")
+            self._fh.flush()
+
+    def record_submitted(self, source: str, job: dict) -> None:
+        self._append(source, "submitted", job=job)
+
+    def record_done(self, source: str, outputs: list[str]) -> None:
+        self._append(source, "done", sha1=file_sha1(source), outputs=outputs)
+
+    def record_failed(self, source: str, error: str) -> None:
+        self._append(source, "failed", error=error)
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+    def __enter__(self) -> "RunManifest":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
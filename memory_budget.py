@@ -0,0 +1,205 @@
+"""
+Process-wide budget for image bytes held in memory.
+
+Backends charge each downloaded output to the budget and the generator
+releases the charge once the bytes are on disk. New work waits while the
+budget is exhausted (:meth:`ByteBudget.wait_for_room`), so with many workers
+and num_images=4 the total held in RAM stays near the limit instead of
+growing with the worker count.
+
+Downloads themselves never wait: a job that is already running keeps the
+outputs it has fetched until it finishes, so blocking it halfway could leave
+several workers each holding part of the budget and waiting on the others.
+The limit can therefore be overshot by the outputs of jobs already running.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from concurrent.futures import CancelledError
+from typing import Optional
+
+import requests
+
+# Charged for a download whose response has no Content-Length.
+DEFAULT_ESTIMATE = 16 * 1024 * 1024
+
+
+class ByteBudget:
+    def __init__(self, limit_bytes: int):
+        self.limit = limit_bytes
+        self._used = 0
+        self._peak = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._cond = threading.Condition()
+
+    def set_limit(self, limit_bytes: int) -> None:
+        with self._cond:
+            self.limit = limit_bytes
+            self._cond.notify_all()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def _wait(self, fits, cancel_event: Optional[threading.Event]) -> None:
+        if fits():
+            return
+        started = time.perf_counter()
+        self._waits += 1
+        try:
+            while not fits():
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CancelledError()
+                self._cond.wait(0.2)
+        finally:
+            self._wait_seconds += time.perf_counter() - started
+
+    def acquire(self, n: int, cancel_event: Optional[threading.Event] = None) -> None:
+        """Block until ``n`` bytes fit. A single request larger than the limit is let
+        through once nothing else is held, so oversized outputs can't deadlock."""
+        with self._cond:
+            self._wait(lambda: self._used == 0 or self._used + n <= self.limit, cancel_event)
+            self._used += n
+            self._peak = max(self._peak, self._used)
+
+    def charge(self, n: int) -> None:
+        """Count ``n`` bytes of a running job's output without blocking."""
+        self.adjust(n)
+
+    def adjust(self, delta: int) -> None:
+        """Correct a charge (e.g. estimate -> actual size) without blocking."""
+        with self._cond:
+            self._used = max(0, self._used + delta)
+            self._peak = max(self._peak, self._used)
+            if delta < 0:
+                self._cond.notify_all()
+
+    def release(self, n: int) -> None:
+        self.adjust(-n)
+
+    def wait_for_room(self, cancel_event: Optional[threading.Event] = None) -> None:
+        """Back-pressure for new work: block while the budget is exhausted."""
+        with self._cond:
+            self._wait(lambda: self._used < self.limit, cancel_event)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit_bytes": self.limit,
+                "in_flight_bytes": self._used,
+                "peak_in_flight_bytes": self._peak,
+                "waits": self._waits,
+                "wait_seconds": round(self._wait_seconds, 3),
+            }
+
+
+def download(
+    url: str,
+    budget: Optional[ByteBudget],
+    *,
+    cancel_event: Optional[threading.Event] = None,
+    session: Optional[requests.Session] = None,
+    **kwargs,
+) -> bytes:
+    """GET ``url`` (through ``session`` when given) and return its body, charged to ``budget``
+    (caller releases len(result)). The charge never blocks; see the module docstring."""
+    get = session.get if session is not None else requests.get
+    if budget is None:
+        resp = get(url, **kwargs)
+        resp.raise_for_status()
+        return resp.content
+
+    resp = get(url, stream=True, **kwargs)
+    try:
+        resp.raise_for_status()
+        if cancel_event is not None and cancel_event.is_set():
+            raise CancelledError()
+        try:
+            expected = int(resp.headers.get("Content-Length") or 0) or DEFAULT_ESTIMATE
+        except ValueError:
+            expected = DEFAULT_ESTIMATE
+        # Charged before reading, so new work already sees the bytes coming in.
+        budget.charge(expected)
+        try:
+            data = resp.content
+        except BaseException:
+            budget.release(expected)
+            raise
+        budget.adjust(len(data) - expected)
+        return data
+    finally:
+        resp.close()
+
+
+_shared: Optional[ByteBudget] = None
+_shared_lock = threading.Lock()
+
+
+def shared_byte_budget(limit_mb: int) -> Optional[ByteBudget]:
+    """The process-wide budget (None when ``limit_mb`` is 0 = unlimited)."""
+    global _shared
+    if limit_mb <= 0:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = ByteBudget(limit_mb * 1024 * 1024)
+        else:
+            _shared.set_limit(limit_mb * 1024 * 1024)
+        return _shared
+
+
+def format_memory_stats(stats: dict) -> str:
+    """One-line summary of :meth:`ByteBudget.stats` plus ``peak_rss_bytes``."""
+    mb = 1024 * 1024
+    parts = []
+    if "peak_in_flight_bytes" in stats:
+        parts.append(f"peak in-flight {stats['peak_in_flight_bytes'] / mb:.1f}/{stats['limit_bytes'] / mb:.0f} MB")
+        if stats["waits"]:
+            parts.append(f"{stats['waits']} waits ({stats['wait_seconds']:.1f}s)")
+    if stats.get("peak_rss_bytes"):
+        parts.append(f"peak RSS {stats['peak_rss_bytes'] / mb:.0f} MB")
+    return "Memory: " + (" • ".join(parts) if parts else "n/a")
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process, or None if the platform doesn't say."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+    except ImportError:
+        pass
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return int(counters.PeakWorkingSetSize)
+        except Exception:
+            return None
+    return None
@@ -4,10 +4,11 @@ import os
 from pathlib import Path
 from typing import Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 OutputFormat = Literal["png", "jpeg", "webp"]
+EncoderProfile = Literal["fast", "balanced", "archive"]
 BackendName = Literal["falai", "comfyui"]
 
 
@@ -20,6 +21,285 @@ class WorkerConfig(BaseModel):
 
     falai: int = 5
     comfyui: int = 2
+    # Processes for re-encoding outputs off the worker threads; 0 = encode inline.
+    encode: int = 0
+
+    @field_validator("encode")
+    @classmethod
+    def _encode_non_negative(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("workers.encode must be >= 0")
+        return v
+
+
+class RoutingConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    enabled: bool = True
+    # Candidate backends in preference order; empty = configured backend plus fal.ai when a key is set.
+    backends: list[BackendName] = Field(default_factory=list)
+    falai_cost_per_image: float = 0.035
+    comfyui_cost_per_image: float = 0.0
+    # Alternates costing more than this per image are never routed to (None = no cap)...
+    max_cost_per_image: Optional[float] = 0.0
+    # ...unless this is set, in which case they take jobs every affordable backend failed.
+    allow_paid_failover: bool = False
+    latency_window: int = 50
+    # Circuit breaker: consecutive failures that open a backend, and health-probe timing.
+    failure_threshold: int = 3
+    reset_timeout: float = 30.0
+    probe_interval: float = 10.0
+
+    @field_validator("falai_cost_per_image", "comfyui_cost_per_image")
+    @classmethod
+    def _cost_non_negative(cls, v: float) -> float:
+        if v < 0:
+            raise ValueError("backend cost must be >= 0")
+        return v
+
+    @field_validator("failure_threshold")
+    @classmethod
+    def _threshold_range(cls, v: int) -> int:
+        if not (1 <= v <= 100):
+            raise ValueError("failure_threshold must be in range 1-100")
+        return v
+
+    @field_validator("reset_timeout", "probe_interval")
+    @classmethod
+    def _interval_positive(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("reset_timeout/probe_interval must be > 0")
+        return v
+
+    @field_validator("latency_window")
+    @classmethod
+    def _window_range(cls, v: int) -> int:
+        if not (1 <= v <= 10_000):
+            raise ValueError("latency_window must be in range 1-10000")
+        return v
+
+
+class ProxyConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Send a downscaled input to the backend, then upscale the result and paste the
+    # full-resolution original back over the centre. Not used with zoom_out_percentage.
+    enabled: bool = False
+    max_side: int = 1536
+    # Width (full-resolution px) of the blend between the original and the generated border.
+    feather: int = 16
+
+    @field_validator("max_side")
+    @classmethod
+    def _max_side_range(cls, v: int) -> int:
+        if not (256 <= v <= 4096):
+            raise ValueError("proxy.max_side must be in range 256-4096")
+        return v
+
+    @field_validator("feather")
+    @classmethod
+    def _feather_non_negative(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("proxy.feather must be >= 0")
+        return v
+
+
+class TilingConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Outpaint the border as overlapping tiles when the input exceeds 4096x4096 or the
+    # output would exceed that in a single job. Raises the input/output limits below.
+    enabled: bool = False
+    tile_size: int = 1024
+    overlap: int = 64
+    # Pixels of already-filled canvas included with each tile so the model sees what it continues.
+    context: int = 256
+    workers: int = 4
+    max_input_megapixels: int = 64
+    max_output_megapixels: int = 250
+
+    @field_validator("tile_size")
+    @classmethod
+    def _tile_size_range(cls, v: int) -> int:
+        if not (256 <= v <= 4096):
+            raise ValueError("tiling.tile_size must be in range 256-4096")
+        return v
+
+    @field_validator("overlap", "context")
+    @classmethod
+    def _non_negative(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("tiling.overlap/context must be >= 0")
+        return v
+
+    @field_validator("workers")
+    @classmethod
+    def _workers_range(cls, v: int) -> int:
+        if not (1 <= v <= 32):
+            raise ValueError("tiling.workers must be in range 1-32")
+        return v
+
+    @field_validator("max_input_megapixels")
+    @classmethod
+    def _input_mp_range(cls, v: int) -> int:
+        # PIL refuses to open images above ~178MP as decompression bombs.
+        if not (1 <= v <= 170):
+            raise ValueError("tiling.max_input_megapixels must be in range 1-170")
+        return v
+
+    @field_validator("max_output_megapixels")
+    @classmethod
+    def _output_mp_range(cls, v: int) -> int:
+        if not (1 <= v <= 1000):
+            raise ValueError("tiling.max_output_megapixels must be in range 1-1000")
+        return v
+
+    @model_validator(mode="after")
+    def _overlap_fits(self) -> "TilingConfig":
+        if self.overlap * 2 >= self.tile_size:
+            raise ValueError("tiling.overlap must be less than half of tiling.tile_size")
+        return self
+
+
+class ProgressiveConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Expand in N smaller rings, feeding each stage's output into the next.
+    enabled: bool = False
+    stages: int = 3
+    # Finished stages are kept here so a retry resumes after the last good one ("" = system temp).
+    cache_dir: str = ""
+
+    @field_validator("stages")
+    @classmethod
+    def _stages_range(cls, v: int) -> int:
+        if not (2 <= v <= 8):
+            raise ValueError("progressive.stages must be in range 2-8")
+        return v
+
+
+class MemoryConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Cap on downloaded image bytes held in RAM across all workers (0 = unlimited).
+    # Downloads and new submissions wait while the cap is reached.
+    max_inflight_mb: int = 1024
+
+    @field_validator("max_inflight_mb")
+    @classmethod
+    def _inflight_non_negative(cls, v: int) -> int:
+        if v < 0:
+            raise ValueError("memory.max_inflight_mb must be >= 0")
+        return v
+
+
+class WarmupConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # ComfyUI: run a tiny prompt before the first job, and again once the server has
+    # been idle ``idle_seconds``, so model (re)loads don't land on a real image.
+    enabled: bool = False
+    idle_seconds: float = 300.0
+
+    @field_validator("idle_seconds")
+    @classmethod
+    def _idle_positive(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("warmup.idle_seconds must be > 0")
+        return v
+
+
+class PipelineConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Split jobs into submit (upload + queue) and collect (wait + download + write) so the
+    # backend queue stays ``depth`` jobs ahead instead of one job per busy worker thread.
+    enabled: bool = False
+    depth: int = 4
+    collectors: int = 2
+
+    @field_validator("depth")
+    @classmethod
+    def _depth_range(cls, v: int) -> int:
+        if not (1 <= v <= 64):
+            raise ValueError("pipeline.depth must be in range 1-64")
+        return v
+
+    @field_validator("collectors")
+    @classmethod
+    def _collectors_range(cls, v: int) -> int:
+        if not (1 <= v <= 32):
+            raise ValueError("pipeline.collectors must be in range 1-32")
+        return v
+
+
+class RetryConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Transient backend errors are retried up to ``max_attempts`` times per stage
+    # (upload, submit, poll, download) with jittered delays between ``base_delay``
+    # and ``max_delay`` seconds. Every retry takes a token from a bucket of
+    # ``budget`` shared by all workers, refilled at ``budget_per_second``
+    # (budget 0 = unlimited), so an outage can't turn into a retry storm.
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    budget: float = 20.0
+    budget_per_second: float = 0.5
+
+    @field_validator("max_attempts")
+    @classmethod
+    def _attempts_range(cls, v: int) -> int:
+        if not (1 <= v <= 10):
+            raise ValueError("retry.max_attempts must be in range 1-10")
+        return v
+
+    @field_validator("base_delay", "max_delay")
+    @classmethod
+    def _delay_positive(cls, v: float) -> float:
+        if v <= 0:
+            raise ValueError("retry delays must be > 0")
+        return v
+
+    @field_validator("budget", "budget_per_second")
+    @classmethod
+    def _budget_non_negative(cls, v: float) -> float:
+        if v < 0:
+            raise ValueError("retry.budget and retry.budget_per_second must be >= 0")
+        return v
+
+    @model_validator(mode="after")
+    def _delays_ordered(self) -> "RetryConfig":
+        if self.max_delay < self.base_delay:
+            raise ValueError("retry.max_delay must be >= retry.base_delay")
+        return self
+
+
+class RateLimitConfig(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    # Requests per second to fal.ai and freeimage.host by endpoint class, shared by all
+    # workers (0 = unlimited). A 429 halves the rate and pauses the endpoint for its
+    # Retry-After; successes bring the rate back up to these values.
+    upload_per_second: float = 2.0
+    submit_per_second: float = 2.0
+    status_per_second: float = 10.0
+    download_per_second: float = 10.0
+    burst: int = 5
+
+    @field_validator("upload_per_second", "submit_per_second", "status_per_second", "download_per_second")
+    @classmethod
+    def _rate_non_negative(cls, v: float) -> float:
+        if v < 0:
+            raise ValueError("rate_limit rates must be >= 0")
+        return v
+
+    @field_validator("burst")
+    @classmethod
+    def _burst_range(cls, v: int) -> int:
+        if not (1 <= v <= 100):
+            raise ValueError("rate_limit.burst must be in range 1-100")
+        return v
 
 
 class OutpaintConfig(BaseModel):
@@ -33,13 +313,21 @@ class OutpaintConfig(BaseModel):
 
     # ComfyUI
     comfyui_url: str = "http://127.0.0.1:8188"
+    # Several ComfyUI servers to balance jobs across; when set, used instead of ``comfyui_url``.
+    comfyui_urls: list[str] = Field(default_factory=list)
     comfyui_workflow_path: str = "comfyui_workflows/flux_outpaint.json"
+    # Stack up to this many consecutive same-size inputs into one ComfyUI prompt so the
+    # model loads once and samples them together (1 = one prompt per image). Plain
+    # jobs only: tiled, progressive, proxy and pipelined runs go one image at a time.
+    comfyui_batch_size: int = 1
 
     # IO
     output_folder: str = ""
     use_source_folder: bool = True
     output_suffix: str = "-expanded"
     output_format: OutputFormat = "png"
+    # Speed/size trade-off used when an output has to be (re-)encoded.
+    encoder_profile: EncoderProfile = "balanced"
 
     # Outpaint params
     zoom_out_percentage: int = 30
@@ -54,6 +342,15 @@ class OutpaintConfig(BaseModel):
 
     # Processing
     workers: WorkerConfig = Field(default_factory=WorkerConfig)
+    routing: RoutingConfig = Field(default_factory=RoutingConfig)
+    proxy: ProxyConfig = Field(default_factory=ProxyConfig)
+    tiling: TilingConfig = Field(default_factory=TilingConfig)
+    progressive: ProgressiveConfig = Field(default_factory=ProgressiveConfig)
+    memory: MemoryConfig = Field(default_factory=MemoryConfig)
+    pipeline: PipelineConfig = Field(default_factory=PipelineConfig)
+    warmup: WarmupConfig = Field(default_factory=WarmupConfig)
+    retry: RetryConfig = Field(default_factory=RetryConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
     allow_reprocess: bool = True
     reprocess_mode: Literal["overwrite", "increment"] = "increment"
     verbose_logging: bool = True
@@ -62,6 +359,10 @@ class OutpaintConfig(BaseModel):
     diagnostics_run: bool = False
     folder_filter_pattern: str = ""
     folder_match_mode: Literal["partial", "exact"] = "partial"
+    folder_include_globs: list[str] = Field(default_factory=list)
+    folder_exclude_globs: list[str] = Field(default_factory=list)
+    folder_max_depth: Optional[int] = None
+    folder_follow_symlinks: bool = False
     window_geometry: str = ""
     sash_left_right: int = 380
     sash_queue_log: int = 600
@@ -87,6 +388,19 @@ class OutpaintConfig(BaseModel):
             raise ValueError("expand values must be in range 0-700")
         return v
 
+    @field_validator("comfyui_batch_size")
+    @classmethod
+    def _batch_size_range(cls, v: int) -> int:
+        if not (1 <= v <= 16):
+            raise ValueError("comfyui_batch_size must be in range 1-16")
+        return v
+
+    @field_validator("comfyui_urls")
+    @classmethod
+    def _normalize_comfyui_urls(cls, v: list[str]) -> list[str]:
+        urls = [u.strip().rstrip("/") for u in v if u and u.strip()]
+        return list(dict.fromkeys(urls))
+
     @field_validator("num_images")
     @classmethod
     def _num_images_range(cls, v: int) -> int:
@@ -94,6 +408,13 @@ class OutpaintConfig(BaseModel):
             raise ValueError("num_images must be in range 1-4")
         return v
 
+    @field_validator("folder_max_depth")
+    @classmethod
+    def _depth_non_negative(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 0:
+            raise ValueError("folder_max_depth must be >= 0")
+        return v
+
     @field_validator("output_suffix")
     @classmethod
     def _suffix_non_empty(cls, v: str) -> str:
@@ -135,24 +456,49 @@ def validate_output_folder(path: str) -> tuple[bool, str]:
         return False, f"Cannot write to folder: {path} ({e})"
 
 
-def validate_input_image(path: str) -> tuple[bool, str, Optional[tuple[int, int]]]:
+def input_pixel_limit(cfg: dict) -> int:
+    """Largest input (in pixels) accepted for this config dict; tiling raises the 4096x4096 cap."""
+    tiling = cfg.get("tiling") or {}
+    if tiling.get("enabled"):
+        return int(tiling.get("max_input_megapixels", 64)) * 1_000_000
+    return MAX_IMAGE_PIXELS
+
+
+def validate_input_image(
+    path: str, *, max_pixels: int = MAX_IMAGE_PIXELS
+) -> tuple[bool, str, Optional[tuple[int, int]]]:
     p = Path(path)
     if not p.exists():
         return False, f"File not found: {path}", None
     if p.suffix.lower() not in SUPPORTED_INPUT_FORMATS:
         return False, f"Unsupported format: {p.suffix}", None
 
+    size: Optional[tuple[int, int]] = None
     try:
-        from PIL import Image
-
-        with Image.open(p) as img:
-            w, h = img.size
-            if w * h > MAX_IMAGE_PIXELS:
-                return False, f"Image too large: {w}x{h} (max 4096x4096)", (w, h)
-            return True, f"Valid image: {w}x{h}", (w, h)
-    except Exception as e:
+        from image_probe import probe_image
+
+        header = probe_image(str(p))
+        if header is not None:
+            size = header.size
+    except OSError as e:
         return False, f"Cannot read image: {e}", None
 
+    if size is None:
+        # Unusual/truncated headers: let PIL decide.
+        try:
+            from PIL import Image
+
+            with Image.open(p) as img:
+                size = img.size
+        except Exception as e:
+            return False, f"Cannot read image: {e}", None
+
+    w, h = size
+    if w * h > max_pixels:
+        limit = "4096x4096" if max_pixels == MAX_IMAGE_PIXELS else f"{max_pixels / 1e6:.0f}MP"
+        return False, f"Image too large: {w}x{h} (max {limit})", (w, h)
+    return True, f"Valid image: {w}x{h}", (w, h)
+
 
 def check_output_size(
     width: int,
@@ -162,6 +508,8 @@ def check_output_size(
     expand_r: int,
     expand_t: int,
     expand_b: int,
+    *,
+    max_pixels: int = 100_000_000,
 ) -> tuple[bool | str, str]:
     scale = 1.0
     if zoom_pct > 0:
@@ -171,8 +519,8 @@ def check_output_size(
 
     total_pixels = new_w * new_h
     # Increased limit for modern systems with sufficient RAM
-    if total_pixels > 100_000_000:  # 100MP limit
-        return False, f"Output {new_w}x{new_h} ({total_pixels/1e6:.1f}MP) exceeds 100MP limit"
+    if total_pixels > max_pixels:  # 100MP unless tiling raises it
+        return False, f"Output {new_w}x{new_h} ({total_pixels/1e6:.1f}MP) exceeds {max_pixels/1e6:.0f}MP limit"
     if total_pixels > 50_000_000:  # 50MP warning
         return "warning", f"Large output: {new_w}x{new_h} ({total_pixels/1e6:.1f}MP) - may be slow"
     return True, f"Output size OK: {new_w}x{new_h} ({total_pixels/1e6:.1f}MP)"
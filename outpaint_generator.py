@@ -6,30 +6,72 @@ import logging
 import os
 import threading
 import time
-from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Callable, Iterable, Optional
+from typing import Callable, Iterable, Iterator, Optional, Sized, TypeVar, Union
 
-import requests
 from PIL import Image
 
-from backends import ProgressCallback, get_backend
+from backends import JobHandle, OutpaintBackend, ProgressCallback, get_backend
 from outpaint_config import (
+    MAX_IMAGE_PIXELS,
     OutpaintConfig,
-    SUPPORTED_INPUT_FORMATS,
     check_output_size,
     collect_config_errors,
     validate_input_image,
 )
+from compositing import composite_original, make_proxy, proxy_scale, scale_expand
+from manifest import RunManifest
+from image_probe import probe_image
+from memory_budget import format_memory_stats, peak_rss_bytes
+from output_writer import encode_image, shared_encode_pool, write_output
+from prepared_image import PreparedImage
+from retry_policy import RetryPolicy, shared_retry_budget
+from progressive import StageCache, split_rings
+from tiling import Tile, TileCanvas, phases, plan_tiles
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 @dataclass(frozen=True)
 class OutpaintResult:
     source_path: str
     output_paths: list[str]
+    backend: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class BatchOutcome:
+    source_path: str
+    result: Optional[OutpaintResult] = None
+    error: Optional[Exception] = None
+    duration: float = 0.0  # seconds spent in generate(), excluding queue wait
+    from_manifest: bool = False  # finished by an earlier run; nothing was generated
+
+
+@dataclass(frozen=True)
+class _Plan:
+    image_path: str
+    size: tuple[int, int]
+    expand: tuple[int, int, int, int]
+    out_dir: Path
+    stem: str
+
+
+@dataclass(frozen=True)
+class PendingOutpaint:
+    """An image between :meth:`OutpaintGenerator.submit` and :meth:`OutpaintGenerator.collect`."""
+
+    plan: _Plan
+    job: Optional[JobHandle]
+    queued: bool  # False: nothing was sent yet, collect() runs the whole job
+
+    @property
+    def source_path(self) -> str:
+        return self.plan.image_path
 
 
 class OutpaintSkipped(Exception):
@@ -76,11 +118,14 @@ def default_config_dict() -> dict:
         "falai_api_key": "",
         "enable_safety_checker": True,
         "comfyui_url": "http://127.0.0.1:8188",
+        "comfyui_urls": [],
         "comfyui_workflow_path": "comfyui_workflows/flux_outpaint.json",
+        "comfyui_batch_size": 1,
         "output_folder": "",
         "use_source_folder": True,
         "output_suffix": "-expanded",
         "output_format": "png",
+        "encoder_profile": "balanced",
         "zoom_out_percentage": 0,
         "expand_mode": "percentage",
         "expand_percentage": 30,
@@ -90,13 +135,51 @@ def default_config_dict() -> dict:
         "expand_bottom": 0,
         "num_images": 1,
         "prompt": "",
-        "workers": {"falai": 5, "comfyui": 2},
+        "workers": {"falai": 5, "comfyui": 2, "encode": 0},
+        "routing": {
+            "enabled": True,
+            "backends": [],
+            "falai_cost_per_image": 0.035,
+            "comfyui_cost_per_image": 0.0,
+            "max_cost_per_image": 0.0,
+            "allow_paid_failover": False,
+            "latency_window": 50,
+            "failure_threshold": 3,
+            "reset_timeout": 30.0,
+            "probe_interval": 10.0,
+        },
+        "proxy": {"enabled": False, "max_side": 1536, "feather": 16},
+        "tiling": {
+            "enabled": False,
+            "tile_size": 1024,
+            "overlap": 64,
+            "context": 256,
+            "workers": 4,
+            "max_input_megapixels": 64,
+            "max_output_megapixels": 250,
+        },
+        "progressive": {"enabled": False, "stages": 3, "cache_dir": ""},
+        "memory": {"max_inflight_mb": 1024},
+        "pipeline": {"enabled": False, "depth": 4, "collectors": 2},
+        "warmup": {"enabled": False, "idle_seconds": 300.0},
+        "retry": {"max_attempts": 4, "base_delay": 1.0, "max_delay": 30.0, "budget": 20.0, "budget_per_second": 0.5},
+        "rate_limit": {
+            "upload_per_second": 2.0,
+            "submit_per_second": 2.0,
+            "status_per_second": 10.0,
+            "download_per_second": 10.0,
+            "burst": 5,
+        },
         "allow_reprocess": True,
         "reprocess_mode": "increment",
         "verbose_logging": True,
         "diagnostics_run": False,
         "folder_filter_pattern": "",
         "folder_match_mode": "partial",
+        "folder_include_globs": [],
+        "folder_exclude_globs": [],
+        "folder_max_depth": None,
+        "folder_follow_symlinks": False,
         "window_geometry": "",
         "sash_left_right": 380,
         "sash_queue_log": 600,
@@ -134,15 +217,42 @@ def load_outpaint_config(config_path: str) -> tuple[Optional[OutpaintConfig], li
     return cfg, errors, merged
 
 
-def iter_image_files_in_folder(folder: str) -> Iterable[str]:
-    p = Path(folder)
-    if not p.exists() or not p.is_dir():
-        return
-    for root, _dirs, files in os.walk(p):
-        for fn in files:
-            ext = Path(fn).suffix.lower()
-            if ext in SUPPORTED_INPUT_FORMATS:
-                yield str(Path(root) / fn)
+def iter_image_files_in_folder(folder: str, **scan_options) -> Iterable[str]:
+    """Stream supported images under ``folder``; see ``folder_scan.scan_image_files`` for options."""
+    from folder_scan import scan_image_files
+
+    return scan_image_files(folder, **scan_options)
+
+
+def _image_size(path: str) -> Optional[tuple[int, int]]:
+    try:
+        header = probe_image(path)
+    except OSError:
+        return None
+    return header.size if header is not None else None
+
+
+def group_same_size(paths: Iterable[str], limit: int) -> Iterator[list[str]]:
+    """Group consecutive inputs of the same pixel size into runs of at most ``limit``.
+
+    Sizes come from the memoized header probe, so files are not decoded or
+    reopened. Inputs whose header can't be parsed get a run of their own, so the
+    normal validation handles them.
+    """
+    run: list[str] = []
+    run_size: Optional[tuple[int, int]] = None
+    for p in paths:
+        size = _image_size(p)
+        if run and (size is None or size != run_size or len(run) >= limit):
+            yield run
+            run = []
+        run.append(p)
+        run_size = size
+        if size is None:
+            yield run
+            run = []
+    if run:
+        yield run
 
 
 def _ensure_dir(p: Path) -> None:
@@ -161,12 +271,20 @@ def _next_available_path(path: Path) -> Path:
 
 
 class OutpaintGenerator:
-    def __init__(self, config: OutpaintConfig):
+    def __init__(self, config: OutpaintConfig, *, backend: Optional[OutpaintBackend] = None):
         self.config = config
-        self._backend = get_backend(config)
+        # Sharing a backend keeps routing stats and circuit state across generators.
+        self._backend = backend if backend is not None else get_backend(config)
+        # Backend outputs are charged to this budget until written (None = unbounded).
+        self._budget = getattr(self._backend, "budget", None)
         self._progress_callback: Optional[ProgressCallback] = None
-        self._fallback_attempted = False
-        self._fallback_lock = threading.Lock()
+        retry = config.retry
+        self._retry_policy = RetryPolicy(
+            max_attempts=retry.max_attempts,
+            base_delay=retry.base_delay,
+            max_delay=retry.max_delay,
+            budget=shared_retry_budget(retry.budget, retry.budget_per_second),
+        )
 
     def set_progress_callback(self, callback: Optional[ProgressCallback]) -> None:
         self._progress_callback = callback
@@ -175,32 +293,6 @@ class OutpaintGenerator:
         if self._progress_callback:
             self._progress_callback(message, level)
 
-    def _try_fallback_to_falai(self) -> bool:
-        """Auto-fallback to falai backend if ComfyUI fails and API key is available."""
-        if self.config.backend != "comfyui":
-            return False
-
-        with self._fallback_lock:
-            if self._fallback_attempted:
-                return False
-            self._fallback_attempted = True
-
-        # Check if falai API key is configured
-        if not self.config.falai_api_key or self.config.falai_api_key.strip() == "":
-            self._progress("ComfyUI failed and no falai API key configured. Cannot auto-fallback.", "error")
-            return False
-
-        self._progress("ComfyUI backend failed. Auto-switching to falai backend...", "warning")
-
-        try:
-            from backends.falai_backend import FalAIOutpaintBackend
-            self._backend = FalAIOutpaintBackend(api_key=self.config.falai_api_key)
-            self._progress("Successfully switched to falai backend", "info")
-            return True
-        except Exception as e:
-            self._progress(f"Failed to switch to falai backend: {e}", "error")
-            return False
-
     def _calculate_expand_pixels(self, image_size: tuple[int, int]) -> tuple[int, int, int, int]:
         """Calculate pixel expansion values from percentage or use configured pixels."""
         if self.config.expand_mode == "percentage":
@@ -225,83 +317,296 @@ class OutpaintGenerator:
         *,
         expand: tuple[int, int, int, int],
         cancel_event: Optional[threading.Event] = None,
+        prepared: Optional[PreparedImage] = None,
+        num_images: Optional[int] = None,
+        job: Optional[JobHandle] = None,
+        submit_only: bool = False,
     ) -> list[bytes]:
+        """Run the backend with retries on transient errors.
+
+        ``submit_only`` calls ``backend.submit`` (queue the job, fill ``job``) and returns [].
+        Every attempt shares one ``job``, so a retry polls the job already queued, or
+        reuses its upload, instead of starting over.
+        """
         expand_left, expand_right, expand_top, expand_bottom = expand
+        job = job if job is not None else JobHandle()
+        call = self._backend.submit if submit_only else self._backend.outpaint  # type: ignore[attr-defined]
+        out = self._retry(
+            lambda: call(
+                image_path,
+                zoom_out_percentage=self.config.zoom_out_percentage,
+                expand_left=expand_left,
+                expand_right=expand_right,
+                expand_top=expand_top,
+                expand_bottom=expand_bottom,
+                num_images=num_images or self.config.num_images,
+                prompt=self.config.prompt,
+                output_format=self.config.output_format,
+                enable_safety_checker=self.config.enable_safety_checker,
+                progress_callback=self._progress_callback,
+                cancel_event=cancel_event,
+                prepared_image=prepared,
+                job=job,
+            ),
+            cancel_event,
+        )
+        return [] if submit_only else out
 
-        delays = [1, 2, 4]
-        last_err: Exception | None = None
-        for attempt, delay in enumerate([0, *delays], start=1):
-            if cancel_event is not None and cancel_event.is_set():
-                raise CancelledError()
-            if delay:
-                self._progress(f"Retrying in {delay}s…", "warning")
-                time.sleep(delay)
-            try:
+    def _retry(self, call: Callable[[], T], cancel_event: Optional[threading.Event]) -> T:
+        """Run ``call`` under the configured retry policy (see :mod:`retry_policy`)."""
+
+        def on_retry(error: BaseException, stage: str, delay: float) -> None:
+            self._progress(f"{stage.capitalize()} failed ({type(error).__name__}); retrying in {delay:.1f}s…", "warning")
+
+        return self._retry_policy.run(call, cancel_event, on_retry)
+
+    def _proxy_scale(self, size: tuple[int, int]) -> Optional[float]:
+        proxy = self.config.proxy
+        # Zoom-out shrinks the original inside the output, so it can't be pasted back 1:1.
+        if not proxy.enabled or self.config.zoom_out_percentage > 0:
+            return None
+        return proxy_scale(size, proxy.max_side)
+
+    def _outpaint_proxy(
+        self,
+        image_path: str,
+        prepared: PreparedImage,
+        expand: tuple[int, int, int, int],
+        scale: float,
+        *,
+        cancel_event: Optional[threading.Event] = None,
+        job: Optional[JobHandle] = None,
+    ) -> list[bytes]:
+        proxy = make_proxy(prepared, scale)
+        try:
+            pw, ph = proxy.size
+            self._progress(f"Proxy mode: sending {pw}x{ph} ({scale:.0%} of {prepared.size[0]}x{prepared.size[1]})", "resize")
+            raw = self._outpaint_with_retry(
+                image_path,
+                expand=scale_expand(expand, scale),
+                cancel_event=cancel_event,
+                prepared=proxy,
+                job=job,
+            )
+        finally:
+            proxy.close()
+
+        outputs: list[bytes] = []
+        try:
+            for b in raw:
                 if cancel_event is not None and cancel_event.is_set():
                     raise CancelledError()
-                return self._backend.outpaint(
-                    image_path,
-                    zoom_out_percentage=self.config.zoom_out_percentage,
-                    expand_left=expand_left,
-                    expand_right=expand_right,
-                    expand_top=expand_top,
-                    expand_bottom=expand_bottom,
-                    num_images=self.config.num_images,
-                    prompt=self.config.prompt,
-                    output_format=self.config.output_format,
-                    enable_safety_checker=self.config.enable_safety_checker,
-                    progress_callback=self._progress_callback,
-                    cancel_event=cancel_event,
+                outputs.append(self._encode_canvas(composite_original(b, prepared, expand, feather=self.config.proxy.feather)))
+        finally:
+            self._release(raw)
+        # The composited encodings take the place of the raw downloads until written.
+        self._charge(outputs)
+        return outputs
+
+    def _encode_canvas(self, canvas: Image.Image) -> bytes:
+        try:
+            buffer = io.BytesIO()
+            encode_image(canvas, buffer, self.config.output_format, self.config.encoder_profile)
+            return buffer.getvalue()
+        finally:
+            canvas.close()
+
+    def _use_progressive(self, expand: tuple[int, int, int, int]) -> bool:
+        progressive = self.config.progressive
+        return progressive.enabled and self.config.zoom_out_percentage == 0 and len(split_rings(expand, progressive.stages)) > 1
+
+    def _outpaint_progressive(
+        self,
+        image_path: str,
+        prepared: PreparedImage,
+        expand: tuple[int, int, int, int],
+        *,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> list[bytes]:
+        rings = split_rings(expand, self.config.progressive.stages)
+        cache = StageCache(
+            self.config.progressive.cache_dir,
+            image_path,
+            {
+                "backend": self.config.backend,
+                "prompt": self.config.prompt,
+                "expand": list(expand),
+                "stages": len(rings),
+                "output_format": self.config.output_format,
+            },
+        )
+        stem = Path(image_path).stem
+        current = prepared
+        width, height = prepared.size
+        total = len(rings)
+
+        for idx, ring in enumerate(rings[:-1], start=1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+            width += ring[0] + ring[1]
+            height += ring[2] + ring[3]
+
+            data = cache.load(idx)
+            if data is not None:
+                self._progress(f"Stage {idx}/{total} loaded from cache", "debug")
+            else:
+                self._progress(f"Stage {idx}/{total}: expanding to {width}x{height}", "info")
+                out = self._outpaint_with_retry(
+                    image_path, expand=ring, cancel_event=cancel_event, prepared=current, num_images=1
                 )
-            except Exception as e:
-                last_err = e
-
-                # Detect ComfyUI crash/unavailability (connection refused, server crash)
-                is_comfyui_crash = (
-                    isinstance(e, requests.RequestException) and
-                    ("connection refused" in str(e).lower() or
-                     "connection error" in str(e).lower() or
-                     "max retries" in str(e).lower())
+                # Only the first output feeds the next stage; the rest are never written.
+                self._release(out)
+                data = out[0]
+                cache.store(idx, data)
+
+            # Hand the stage to the next one in memory; no disk round-trip or re-probe.
+            with Image.open(io.BytesIO(data)) as decoded:
+                stage_img = decoded.convert("RGB")
+            if stage_img.size != (width, height):
+                stage_img = stage_img.resize((width, height), Image.Resampling.LANCZOS)
+            current = PreparedImage.from_image(stage_img, name=f"{stem}_stage{idx}.png")
+
+        ring = rings[-1]
+        self._progress(f"Stage {total}/{total}: expanding to {width + ring[0] + ring[1]}x{height + ring[2] + ring[3]}", "info")
+        out = self._outpaint_with_retry(image_path, expand=ring, cancel_event=cancel_event, prepared=current)
+        cache.clear()
+        return out
+
+    def _use_tiling(self, size: tuple[int, int], expand: tuple[int, int, int, int]) -> bool:
+        if not self.config.tiling.enabled or self.config.zoom_out_percentage > 0 or not any(expand):
+            return False
+        width, height = size
+        canvas = (width + expand[0] + expand[1]) * (height + expand[2] + expand[3])
+        return width * height > MAX_IMAGE_PIXELS or canvas > MAX_IMAGE_PIXELS
+
+    def _outpaint_tiled(
+        self,
+        image_path: str,
+        prepared: PreparedImage,
+        expand: tuple[int, int, int, int],
+        *,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> list[bytes]:
+        tiling = self.config.tiling
+        tiles = plan_tiles(prepared.size, expand, tile_size=tiling.tile_size, overlap=tiling.overlap, context=tiling.context)
+        steps = phases(tiles)
+        self._progress(
+            f"Tiled mode: {len(tiles)} tiles in {len(steps)} phases ({tiling.tile_size}px, {tiling.overlap}px overlap)", "info"
+        )
+
+        original = prepared.image()
+        stem = Path(image_path).stem
+        left, _right, top, _bottom = expand
+        # Separate event so one failed tile stops its siblings without touching the caller's.
+        tile_cancel = threading.Event()
+
+        def job(context: Image.Image, t: Tile, num_images: int) -> Callable[[], list[bytes]]:
+            def run() -> list[bytes]:
+                piece = PreparedImage.from_image(context, name=f"{stem}_tile{t.box[0]}x{t.box[1]}.png")
+                return self._outpaint_with_retry(
+                    image_path, expand=t.expand, cancel_event=tile_cancel, prepared=piece, num_images=num_images
                 )
 
-                # Try fallback to falai on ComfyUI crash
-                if is_comfyui_crash and not self._fallback_attempted:
-                    if self._try_fallback_to_falai():
-                        # Retry immediately with new backend
-                        try:
-                            return self._backend.outpaint(
-                                image_path,
-                                zoom_out_percentage=self.config.zoom_out_percentage,
-                                expand_left=expand_left,
-                                expand_right=expand_right,
-                                expand_top=expand_top,
-                                expand_bottom=expand_bottom,
-                                num_images=self.config.num_images,
-                                prompt=self.config.prompt,
-                                output_format=self.config.output_format,
-                                enable_safety_checker=self.config.enable_safety_checker,
-                                progress_callback=self._progress_callback,
-                                cancel_event=cancel_event,
-                            )
-                        except Exception as fallback_err:
-                            self._progress(f"Fallback backend also failed: {fallback_err}", "error")
-                            raise
-
-                # Only retry transient failures
-                transient = isinstance(e, (TimeoutError, requests.RequestException))
-                if not transient:
-                    raise
-                if attempt >= 1 + len(delays):
-                    raise
-
-        assert last_err is not None
-        raise last_err
+            return run
+
+        # The first phase only sees the original, so one job per tile serves every variant.
+        first = self._run_tiles(
+            [
+                job(original.crop((t.crop[0] - left, t.crop[1] - top, t.crop[2] - left, t.crop[3] - top)), t, self.config.num_images)
+                for t in steps[0]
+            ],
+            label=f"Phase 1/{len(steps)}",
+            cancel_event=cancel_event,
+            tile_cancel=tile_cancel,
+        )
+        outputs: list[bytes] = []
+        try:
+            # Later phases continue a particular variant's pixels, so each variant grows on its own canvas.
+            for k in range(min(len(r) for r in first)):
+                canvas = TileCanvas(original, expand)
+                for t, r in zip(steps[0], first):
+                    canvas.paste(t, r[k], overlap=tiling.overlap)
+                # Variant k's first-phase pieces now live in the canvas: stop charging them
+                # while the later phases download more through the same budget.
+                self._release([r[k] for r in first])
+                for r in first:
+                    r[k] = b""
+                for n, step in enumerate(steps[1:], start=2):
+                    done = self._run_tiles(
+                        [job(canvas.context(t), t, 1) for t in step],
+                        label=f"Phase {n}/{len(steps)}",
+                        cancel_event=cancel_event,
+                        tile_cancel=tile_cancel,
+                    )
+                    try:
+                        for t, r in zip(step, done):
+                            if not r:
+                                raise RuntimeError("Backend returned no image for a tile")
+                            canvas.paste(t, r[0], overlap=tiling.overlap)
+                    finally:
+                        self._release([b for r in done for b in r])
+                outputs.append(self._encode_canvas(canvas.finish(tiling.overlap)))
+        finally:
+            self._release([b for r in first for b in r])
+        return outputs
+
+    def _run_tiles(
+        self,
+        jobs: list[Callable[[], list[bytes]]],
+        *,
+        label: str,
+        cancel_event: Optional[threading.Event],
+        tile_cancel: threading.Event,
+    ) -> list[list[bytes]]:
+        """Run one phase of tile jobs in parallel; on failure nothing they downloaded stays charged."""
+        results: list[list[bytes]] = [[] for _ in jobs]
+        with ThreadPoolExecutor(max_workers=min(self.config.tiling.workers, len(jobs))) as ex:
+            futs = {ex.submit(run): i for i, run in enumerate(jobs)}
+            pending = set(futs)
+            kept: set[Future] = set()
+            try:
+                while pending:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise CancelledError()
+                    done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        results[futs[fut]] = fut.result()
+                        kept.add(fut)
+                        self._progress(f"{label}: tile {len(kept)}/{len(jobs)} done", "debug")
+            except BaseException:
+                tile_cancel.set()
+                for fut in futs:
+                    if fut not in kept and not fut.cancel():
+                        # Already running: the executor exit waits for it, so release what it downloaded.
+                        fut.add_done_callback(self._release_result)
+                self._release([b for r in results for b in r])
+                raise
+        return results
 
     def check_backend_available(self) -> tuple[bool, str]:
         if getattr(self._backend, "check_available", None):
             return self._backend.check_available()  # type: ignore[attr-defined]
         return True, "OK"
 
+    @property
+    def backend(self) -> OutpaintBackend:
+        return self._backend
+
+    def backend_stats(self) -> dict[str, dict]:
+        """Per-backend latency, failure and circuit state when routing is active."""
+        stats = getattr(self._backend, "stats", None)
+        return stats() if callable(stats) else {}
+
+    def timing_stats(self) -> Optional[dict]:
+        """ComfyUI cold starts, model-load and sampling time, when the backend reports them."""
+        timing = getattr(self._backend, "timing_stats", None)
+        return timing() if callable(timing) else None
+
+    def rate_limit_stats(self) -> Optional[dict]:
+        """fal.ai/freeimage request rates, waits and 429s per endpoint class, when rate limited."""
+        stats = getattr(self._backend, "rate_limit_stats", None)
+        return stats() if callable(stats) else None
+
     def _get_output_folder(self, image_path: str) -> Path:
         if self.config.use_source_folder:
             return Path(image_path).parent
@@ -309,11 +614,16 @@ class OutpaintGenerator:
             return Path(self.config.output_folder)
         return Path(image_path).parent
 
-    def generate(self, image_path: str, cancel_event: Optional[threading.Event] = None) -> OutpaintResult:
+    def _plan(self, image_path: str, cancel_event: Optional[threading.Event]) -> _Plan:
+        """Validate ``image_path`` and work out the expansion and where outputs go."""
         if cancel_event is not None and cancel_event.is_set():
             raise CancelledError()
 
-        ok, msg, size = validate_input_image(image_path)
+        tiling = self.config.tiling
+        ok, msg, size = validate_input_image(
+            image_path,
+            max_pixels=tiling.max_input_megapixels * 1_000_000 if tiling.enabled else MAX_IMAGE_PIXELS,
+        )
         if not ok:
             raise ValueError(msg)
 
@@ -331,6 +641,7 @@ class OutpaintGenerator:
             expand_right,
             expand_top,
             expand_bottom,
+            **({"max_pixels": tiling.max_output_megapixels * 1_000_000} if tiling.enabled else {}),
         )
         if size_check[0] is False:
             raise ValueError(size_check[1])
@@ -352,12 +663,218 @@ class OutpaintGenerator:
         if not self.config.allow_reprocess and expected_targets and all(p.exists() for p in expected_targets):
             raise OutpaintSkipped("Outputs already exist", output_paths=[str(p) for p in expected_targets])
 
-        out_bytes = self._outpaint_with_retry(
-            image_path,
-            expand=(expand_left, expand_right, expand_top, expand_bottom),
-            cancel_event=cancel_event,
-        )
+        expand = (expand_left, expand_right, expand_top, expand_bottom)
+        return _Plan(image_path=image_path, size=size, expand=expand, out_dir=out_dir, stem=stem)
 
+    def _wait_for_room(self, cancel_event: Optional[threading.Event]) -> None:
+        # Back-pressure: don't start new remote work while downloaded bytes are piling up.
+        if self._budget is not None:
+            self._budget.wait_for_room(cancel_event)
+
+    def _run_plan(
+        self, plan: _Plan, cancel_event: Optional[threading.Event], job: Optional[JobHandle]
+    ) -> list[bytes]:
+        image_path, size, expand = plan.image_path, plan.size, plan.expand
+        # Header was just probed by validation; pixels are decoded at most once, on first use.
+        prepared = PreparedImage.from_path(image_path)
+        try:
+            scale = self._proxy_scale(size)
+            if self._use_tiling(size, expand):
+                return self._outpaint_tiled(image_path, prepared, expand, cancel_event=cancel_event)
+            if self._use_progressive(expand):
+                return self._outpaint_progressive(image_path, prepared, expand, cancel_event=cancel_event)
+            if scale is None:
+                return self._outpaint_with_retry(
+                    image_path,
+                    expand=expand,
+                    cancel_event=cancel_event,
+                    prepared=prepared,
+                    job=job,
+                )
+            return self._outpaint_proxy(image_path, prepared, expand, scale, cancel_event=cancel_event, job=job)
+        finally:
+            prepared.close()
+
+    def _finish(self, plan: _Plan, out_bytes: list[bytes], cancel_event: Optional[threading.Event]) -> OutpaintResult:
+        try:
+            outputs = self._write_outputs(out_bytes, plan.out_dir, plan.stem, cancel_event=cancel_event)
+        finally:
+            self._release(out_bytes)
+
+        if not outputs:
+            raise RuntimeError("No outputs written")
+
+        backend_used = getattr(self._backend, "last_backend_name", None) or self.config.backend
+        return OutpaintResult(source_path=plan.image_path, output_paths=outputs, backend=backend_used)
+
+    def generate(
+        self,
+        image_path: str,
+        cancel_event: Optional[threading.Event] = None,
+        *,
+        job: Optional[JobHandle] = None,
+    ) -> OutpaintResult:
+        """Outpaint one image and write its outputs.
+
+        ``job`` records the remote job for resuming; it only applies when the image
+        goes out as a single job (tiled and progressive runs submit several).
+        """
+        plan = self._plan(image_path, cancel_event)
+        self._wait_for_room(cancel_event)
+        return self._finish(plan, self._run_plan(plan, cancel_event, job), cancel_event)
+
+    def can_batch(self) -> bool:
+        """Whether same-size inputs can share one backend prompt (see :meth:`generate_batch`)."""
+        if self.config.comfyui_batch_size < 2 or getattr(self._backend, "outpaint_batch", None) is None:
+            return False
+        return not (self.config.tiling.enabled or self.config.progressive.enabled)
+
+    def generate_batch(
+        self, image_paths: list[str], cancel_event: Optional[threading.Event] = None
+    ) -> list[Union[OutpaintResult, Exception]]:
+        """Outpaint same-size images together and write each one's outputs.
+
+        Returns a result or the exception for each input, in order. Inputs are
+        stacked into prompts of up to ``comfyui_batch_size`` per size and expansion;
+        odd ones out and proxy-mode images run alone, and if a batch prompt fails its
+        images are retried one at a time.
+        """
+        results: list[Union[OutpaintResult, Exception, None]] = [None] * len(image_paths)
+        groups: dict[tuple, list[tuple[int, _Plan]]] = {}
+        for i, p in enumerate(image_paths):
+            try:
+                plan = self._plan(p, cancel_event)
+            except Exception as e:
+                results[i] = e
+                continue
+            groups.setdefault((plan.size, plan.expand), []).append((i, plan))
+
+        limit = self.config.comfyui_batch_size
+        for members in groups.values():
+            for lo in range(0, len(members), limit):
+                chunk = members[lo : lo + limit]
+                for (i, _plan), outcome in zip(chunk, self._run_batch([plan for _, plan in chunk], cancel_event)):
+                    results[i] = outcome
+        return results  # type: ignore[return-value]
+
+    def _run_batch(
+        self, plans: list[_Plan], cancel_event: Optional[threading.Event]
+    ) -> list[Union[OutpaintResult, Exception]]:
+        def alone(plan: _Plan) -> Union[OutpaintResult, Exception]:
+            try:
+                self._wait_for_room(cancel_event)
+                return self._finish(plan, self._run_plan(plan, cancel_event, None), cancel_event)
+            except Exception as e:
+                return e
+
+        if len(plans) < 2 or not self.can_batch() or self._proxy_scale(plans[0].size) is not None:
+            return [alone(plan) for plan in plans]
+
+        expand_left, expand_right, expand_top, expand_bottom = plans[0].expand
+        prepared = [PreparedImage.from_path(plan.image_path) for plan in plans]
+        try:
+            self._wait_for_room(cancel_event)
+            outs = self._retry(
+                lambda: self._backend.outpaint_batch(  # type: ignore[attr-defined]
+                    [plan.image_path for plan in plans],
+                    zoom_out_percentage=self.config.zoom_out_percentage,
+                    expand_left=expand_left,
+                    expand_right=expand_right,
+                    expand_top=expand_top,
+                    expand_bottom=expand_bottom,
+                    num_images=self.config.num_images,
+                    prompt=self.config.prompt,
+                    output_format=self.config.output_format,
+                    enable_safety_checker=self.config.enable_safety_checker,
+                    progress_callback=self._progress_callback,
+                    cancel_event=cancel_event,
+                    prepared_images=prepared,
+                ),
+                cancel_event,
+            )
+        except CancelledError as e:
+            return [e] * len(plans)
+        except Exception as e:
+            self._progress(f"Batch of {len(plans)} failed ({e}); running its images one at a time", "warning")
+            return [alone(plan) for plan in plans]
+        finally:
+            for prep in prepared:
+                prep.close()
+
+        results: list[Union[OutpaintResult, Exception]] = []
+        for plan, out_bytes in zip(plans, outs):
+            # _finish releases each image's bytes, written or not.
+            try:
+                results.append(self._finish(plan, out_bytes, cancel_event))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def can_pipeline(self, size: Optional[tuple[int, int]] = None) -> bool:
+        """Whether jobs can be queued remotely ahead of collection (see :meth:`submit`)."""
+        if getattr(self._backend, "submit", None) is None:
+            return False
+        if self.config.tiling.enabled or self.config.progressive.enabled:
+            return False
+        return size is None or self._proxy_scale(size) is None
+
+    def submit(
+        self,
+        image_path: str,
+        cancel_event: Optional[threading.Event] = None,
+        *,
+        job: Optional[JobHandle] = None,
+    ) -> PendingOutpaint:
+        """Upload ``image_path`` and queue its remote job without waiting for the result.
+
+        :meth:`collect` then waits for it and writes the outputs. Images that can't
+        go out as one queued job (tiled, progressive, proxy, or a backend without
+        ``submit``) come back unqueued and run in full inside ``collect``.
+        """
+        plan = self._plan(image_path, cancel_event)
+        if not self.can_pipeline(plan.size):
+            return PendingOutpaint(plan, job, queued=False)
+
+        self._wait_for_room(cancel_event)
+        job = job or JobHandle()
+        if not job.data:
+            self._outpaint_with_retry(image_path, expand=plan.expand, cancel_event=cancel_event, job=job, submit_only=True)
+        return PendingOutpaint(plan, job, queued=True)
+
+    def collect(self, pending: PendingOutpaint, cancel_event: Optional[threading.Event] = None) -> OutpaintResult:
+        plan = pending.plan
+        if not pending.queued:
+            self._wait_for_room(cancel_event)
+            return self._finish(plan, self._run_plan(plan, cancel_event, pending.job), cancel_event)
+        # With job data set the backend polls the queued job instead of submitting again.
+        out_bytes = self._outpaint_with_retry(plan.image_path, expand=plan.expand, cancel_event=cancel_event, job=pending.job)
+        return self._finish(plan, out_bytes, cancel_event)
+
+    def cancel(self, pending: PendingOutpaint) -> bool:
+        """Ask the backend to drop ``pending``'s queued remote job; True if it did.
+
+        Best effort: a failure is logged and the job is left to finish remotely.
+        """
+        cancel = getattr(self._backend, "cancel", None)
+        if cancel is None or not pending.queued or pending.job is None or not pending.job.data:
+            return False
+        try:
+            return bool(cancel(pending.job))
+        except Exception as e:
+            logger.warning("Cancelling remote job for %s failed: %s", pending.source_path, e)
+            return False
+
+    def _write_outputs(
+        self,
+        out_bytes: list[bytes],
+        out_dir: Path,
+        stem: str,
+        *,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> list[str]:
+        fmt = self.config.output_format
+        suffix = self.config.output_suffix
+        encode_pool = shared_encode_pool(self.config.workers.encode)
         outputs: list[str] = []
         for idx, b in enumerate(out_bytes, start=1):
             if cancel_event is not None and cancel_event.is_set():
@@ -373,65 +890,228 @@ class OutpaintGenerator:
             if target.exists() and self.config.reprocess_mode == "increment":
                 target = _next_available_path(target)
 
-            # Normalize format
-            with Image.open(io.BytesIO(b)) as img:
-                if fmt == "jpeg":
-                    if img.mode in ("RGBA", "LA", "P"):
-                        converted = img.convert("RGB")
-                        try:
-                            converted.save(target, format="JPEG", quality=95)
-                        finally:
-                            converted.close()
-                    else:
-                        img.save(target, format="JPEG", quality=95)
-                elif fmt == "webp":
-                    img.save(target, format="WEBP", quality=90)
-                else:
-                    img.save(target, format="PNG")
+            # Bytes already in the requested container go straight to disk; others are converted.
+            if encode_pool is not None:
+                encode_pool.write(b, target, fmt, self.config.encoder_profile)
+            else:
+                write_output(b, target, fmt, self.config.encoder_profile)
 
             outputs.append(str(target))
+        return outputs
 
-        if not outputs:
-            raise RuntimeError("No outputs written")
+    def _charge(self, chunks: list[bytes]) -> None:
+        if self._budget is not None:
+            self._budget.adjust(sum(len(b) for b in chunks))
 
-        return OutpaintResult(source_path=image_path, output_paths=outputs)
+    def _release(self, chunks: list[bytes]) -> None:
+        if self._budget is not None:
+            self._budget.release(sum(len(b) for b in chunks))
 
-    def generate_many(
+    def _release_result(self, fut: Future) -> None:
+        """Done-callback for a job whose outputs are being dropped."""
+        if not fut.cancelled() and fut.exception() is None:
+            self._release(fut.result())
+
+    def memory_stats(self) -> dict:
+        """In-flight byte budget counters plus this process's peak RSS."""
+        stats = self._budget.stats() if self._budget is not None else {}
+        return {**stats, "peak_rss_bytes": peak_rss_bytes()}
+
+    def iter_generate(
         self,
-        image_paths: list[str],
+        image_paths: Iterable[str],
         *,
         max_workers: Optional[int] = None,
-        per_item_callback: Optional[Callable[[int, int, str], None]] = None,
-    ) -> list[OutpaintResult]:
+        window: Optional[int] = None,
+        total: Optional[int] = None,
+        manifest: Optional[RunManifest] = None,
+    ) -> Iterator[BatchOutcome]:
+        """Run ``generate`` over ``image_paths`` and yield outcomes as they complete.
+
+        Paths are pulled lazily and at most ``window`` jobs (default: twice the
+        worker count) are queued or running at once, so a 50k-file folder costs
+        a bounded number of futures. Closing the iterator early cancels jobs that
+        have not started yet.
+
+        With a ``manifest``, inputs it records as done are yielded straight back
+        (``from_manifest=True``), in-flight remote jobs are resumed, and every
+        submission and result is appended to it.
+
+        With ``pipeline.enabled`` (and a backend that can queue), jobs go through a
+        :class:`~pipeline.SubmitPipeline` that keeps ``pipeline.depth`` of them
+        queued remotely while a few collectors fetch and write the results.
+        Otherwise, with ``comfyui_batch_size`` > 1, consecutive same-size inputs go
+        through :meth:`generate_batch` together (batched inputs are not resumable).
+        """
         workers = max_workers or (self.config.workers.falai if self.config.backend == "falai" else self.config.workers.comfyui)
-        results: list[OutpaintResult] = []
-        total = len(image_paths)
-        done = 0
-        durations: list[float] = []
-
-        def work(p: str) -> OutpaintResult:
-            return self.generate(p)
-
-        with ThreadPoolExecutor(max_workers=workers) as ex:
-            start_times = {p: time.perf_counter() for p in image_paths}
-            futs = {ex.submit(work, p): p for p in image_paths}
-            for fut in as_completed(futs):
-                src = futs[fut]
-                done += 1
-                dur = max(0.0, time.perf_counter() - start_times.get(src, time.perf_counter()))
-                durations.append(dur)
+        pipe = None
+        if self.config.pipeline.enabled and self.can_pipeline():
+            from pipeline import SubmitPipeline
+
+            pipe = SubmitPipeline(
+                self,
+                depth=self.config.pipeline.depth,
+                submitters=workers,
+                collectors=self.config.pipeline.collectors,
+            )
+            # Everything handed to the pipeline may be queued remotely, so depth is the window.
+            workers = window = pipe.depth
+        elif self.config.pipeline.enabled:
+            self._progress("Pipelining needs a backend that can queue jobs and no tiling/progressive mode; running jobs whole", "warning")
+        batch = self.config.comfyui_batch_size if pipe is None and self.can_batch() else 1
+        window = max(workers, window or workers * 2) * batch
+        if total is None and isinstance(image_paths, Sized):
+            total = len(image_paths)
+
+        def job_for(p: str) -> Optional[JobHandle]:
+            if manifest is None:
+                return None
+            return JobHandle(manifest.pending_job(p), on_submitted=lambda data: manifest.record_submitted(p, data))
+
+        def record(
+            p: str, started: float, result: Optional[OutpaintResult], error: Optional[Exception], share: int = 1
+        ) -> BatchOutcome:
+            # A batched input is charged its share of the batch's time.
+            duration = (time.perf_counter() - started) / share
+            if manifest is not None:
+                if result is not None:
+                    manifest.record_done(p, result.output_paths)
+                elif os.path.exists(p):
+                    manifest.record_failed(p, str(error))
+            return BatchOutcome(p, result=result, error=error, duration=duration)
+
+        def work(p: str) -> BatchOutcome:
+            started = time.perf_counter()
+            try:
+                result = self.generate(p, job=job_for(p))
+            except Exception as e:
+                return record(p, started, None, e)
+            return record(p, started, result, None)
+
+        def start(p: str) -> Future:
+            if pipe is None:
+                return ex.submit(work, p)
+            started = time.perf_counter()
+            mapped: Future = Future()
+
+            def settle(fut: Future) -> None:
+                err = fut.exception()
+                if isinstance(err, Exception) or err is None:
+                    mapped.set_result(record(p, started, None if err else fut.result(), err))
+                else:
+                    mapped.set_exception(err)
 
-                if durations:
-                    avg = sum(durations) / len(durations)
-                    eta = avg * (total - done)
-                    self._progress(f"{done}/{total} complete • ETA {int(eta // 60)}m{int(eta % 60)}s", "progress")
+            pipe.put(p, job=job_for(p)).add_done_callback(settle)
+            return mapped
 
-                if per_item_callback:
-                    per_item_callback(done, total, src)
+        def start_run(run: list[str]) -> list[Future]:
+            if len(run) == 1:
+                return [start(run[0])]
+            started = time.perf_counter()
+            mapped: list[Future] = [Future() for _ in run]
 
+            def work_run() -> None:
                 try:
-                    results.append(fut.result())
+                    results = self.generate_batch(run)
                 except Exception as e:
-                    self._progress(f"Failed: {os.path.basename(src)} • {e}", "error")
+                    results = [e] * len(run)
+                for p, fut, res in zip(run, mapped, results):
+                    if not fut.set_running_or_notify_cancel():
+                        continue
+                    if isinstance(res, Exception):
+                        fut.set_result(record(p, started, None, res, share=len(run)))
+                    else:
+                        fut.set_result(record(p, started, res, None, share=len(run)))
+
+            ex.submit(work_run)
+            return mapped
+
+        def fresh() -> Iterator[str]:
+            # Inputs the manifest already has are answered without touching the pool.
+            for p in image_paths:
+                outputs = manifest.completed(p) if manifest is not None else None
+                if outputs is not None:
+                    skipped.append(BatchOutcome(p, result=OutpaintResult(p, outputs), from_manifest=True))
+                    continue
+                yield p
+
+        def refill(count: int) -> set:
+            futs = set()
+            for run in runs:
+                futs.update(start_run(run))
+                if len(futs) >= count:
+                    break
+            return futs
+
+        runs = group_same_size(fresh(), batch) if batch > 1 else ([p] for p in fresh())
+        skipped: list[BatchOutcome] = []
+        done = 0
+        timed = 0
+        busy_seconds = 0.0
+        ex = ThreadPoolExecutor(max_workers=workers) if pipe is None else None
+        try:
+            pending = refill(window)
+            while pending or skipped:
+                yield from skipped
+                done += len(skipped)
+                skipped.clear()
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    outcome = fut.result()
+                    done += 1
+                    timed += 1
+                    busy_seconds += outcome.duration
+                    # ETA from time spent in jobs (not queue wait), spread over the workers.
+                    avg = busy_seconds / timed
+                    if total:
+                        eta = avg * max(0, total - done) / workers
+                        self._progress(f"{done}/{total} complete • ETA {int(eta // 60)}m{int(eta % 60)}s", "progress")
+                    else:
+                        self._progress(f"{done} complete • {avg:.1f}s/job", "progress")
+                    if outcome.error is not None:
+                        self._progress(f"Failed: {os.path.basename(outcome.source_path)} • {outcome.error}", "error")
+
+                    pending |= refill(1)
+                    yield outcome
+        finally:
+            if ex is not None:
+                ex.shutdown(wait=True, cancel_futures=True)
+            if pipe is not None:
+                pipe.shutdown(wait=True)
+            self._progress(format_memory_stats(self.memory_stats()), "info")
+            timing = self.timing_stats()
+            if timing and timing["cold_starts"]:
+                self._progress(
+                    f"ComfyUI cold starts: {timing['cold_starts']} • ~{timing['model_load_seconds']:.0f}s loading models"
+                    f" • sampling p50 {timing['sampling_p50_seconds'] or 0:.1f}s",
+                    "info",
+                )
+            limits = self.rate_limit_stats()
+            if limits and any(s["waits"] or s["throttled"] for s in limits.values()):
+                self._progress(
+                    "Rate limited: "
+                    + ", ".join(
+                        f"{name} {s['waits']} waits ({s['wait_seconds']:.1f}s), {s['throttled']}×429"
+                        for name, s in limits.items()
+                        if s["waits"] or s["throttled"]
+                    ),
+                    "info",
+                )
 
+    def generate_many(
+        self,
+        image_paths: Iterable[str],
+        *,
+        max_workers: Optional[int] = None,
+        per_item_callback: Optional[Callable[[int, int, str], None]] = None,
+    ) -> list[OutpaintResult]:
+        total = len(image_paths) if isinstance(image_paths, Sized) else 0
+        results: list[OutpaintResult] = []
+        for done, outcome in enumerate(self.iter_generate(image_paths, max_workers=max_workers), start=1):
+            if per_item_callback:
+                per_item_callback(done, total, outcome.source_path)
+            if outcome.result is not None:
+                results.append(outcome.result)
         return results
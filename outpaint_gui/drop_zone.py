@@ -3,8 +3,8 @@ Drop Zone Widget - Drag-and-drop area for image files with visual feedback.
 """
 
 import tkinter as tk
-from tkinter import filedialog
-from typing import Callable, List
+from tkinter import filedialog, ttk
+from typing import Callable, List, Optional
 import os
 
 try:
@@ -103,6 +103,29 @@ class DropZone(tk.Frame):
         )
         self.status_label.pack(pady=5)
 
+        # Background scan progress (hidden until a scan runs)
+        self._cancel_callback: Optional[Callable[[], None]] = None
+        self.progress_frame = tk.Frame(self.drop_frame, bg=self._default_bg)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="indeterminate", length=220)
+        self.progress_bar.pack(side=tk.LEFT, padx=(0, 8))
+        self.progress_label = tk.Label(
+            self.progress_frame,
+            text="",
+            font=("Segoe UI", 10),
+            bg=self._default_bg,
+            fg=COLORS["text_dim"]
+        )
+        self.progress_label.pack(side=tk.LEFT, padx=(0, 8))
+        self.cancel_button = tk.Button(
+            self.progress_frame,
+            text="Cancel",
+            font=("Segoe UI", 9),
+            bg=COLORS["drop_invalid"],
+            fg="white",
+            command=self._on_cancel_clicked
+        )
+        self.cancel_button.pack(side=tk.LEFT)
+
         # Register for drag-and-drop if available
         if HAS_DND:
             self._setup_dnd()
@@ -300,6 +323,33 @@ class DropZone(tk.Frame):
 
         return True, "file"
 
+    def show_progress(self, text: str, on_cancel: Optional[Callable[[], None]] = None):
+        """Show the scan progress row with a Cancel button."""
+        self._cancel_callback = on_cancel
+        self.progress_label.config(text=text)
+        self.cancel_button.config(state=tk.NORMAL if on_cancel else tk.DISABLED)
+        if not self.progress_frame.winfo_ismapped():
+            self.progress_frame.pack(pady=(0, 10))
+            self.progress_bar.start(15)
+
+    def update_progress(self, text: str):
+        """Update the progress text (no-op when hidden)."""
+        if self.progress_frame.winfo_ismapped():
+            self.progress_label.config(text=text)
+
+    def hide_progress(self):
+        """Hide the progress row."""
+        self._cancel_callback = None
+        self.progress_bar.stop()
+        self.progress_frame.pack_forget()
+
+    def _on_cancel_clicked(self):
+        """Handle Cancel on the progress row."""
+        if self._cancel_callback:
+            self._cancel_callback()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.progress_label.config(text="Cancelling...")
+
     def _set_highlight(self, color: str):
         """Set the highlight color for drop feedback."""
         self.drop_frame.config(bg=color)
@@ -307,6 +357,8 @@ class DropZone(tk.Frame):
         self.main_label.config(bg=color)
         self.sub_label.config(bg=color)
         self.status_label.config(bg=color)
+        self.progress_frame.config(bg=color)
+        self.progress_label.config(bg=color)
 
     def _reset_highlight(self):
         """Reset to default colors."""
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from outpaint_config import MAX_IMAGE_PIXELS, SUPPORTED_INPUT_FORMATS, validate_input_image
+from outpaint_generator import iter_image_files_in_folder
+
+
+ValidatedEntry = tuple[str, bool, str]
+
+
+class IngestJob:
+    """Scan folders / validate files on a background thread and stream results to the queue.
+
+    Sources are pushed with ``add_folder``/``add_files`` and processed in order. Validated
+    entries are handed to ``on_batch`` in small batches; ``on_batch`` returns False when the
+    queue can take no more, which ends the job. ``on_progress`` is throttled to
+    ``PROGRESS_INTERVAL`` and ``on_done`` fires once with the final counts.
+    """
+
+    BATCH_SIZE = 50
+    BATCH_INTERVAL = 0.25
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        *,
+        on_batch: Callable[[list[ValidatedEntry]], bool],
+        on_progress: Callable[[int, int], None],
+        on_done: Callable[[int, int, bool], None],
+        scan_options: Optional[dict] = None,
+        max_input_pixels: int = MAX_IMAGE_PIXELS,
+    ):
+        self._scan_options = dict(scan_options or {})
+        self._max_input_pixels = max_input_pixels
+        self._on_batch = on_batch
+        self._on_progress = on_progress
+        self._on_done = on_done
+
+        self._sources: queue.Queue[tuple[str, object]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="folder-ingest", daemon=True)
+
+        self.scanned = 0
+        self.accepted = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _push(self, kind: str, payload: object) -> bool:
+        with self._lock:
+            if self._closed:
+                return False
+            self._sources.put((kind, payload))
+            return True
+
+    def add_folder(self, folder: str) -> bool:
+        """Queue a folder; returns False if the job already finished (start a new one)."""
+        return self._push("folder", folder)
+
+    def add_files(self, paths: list[str]) -> bool:
+        return self._push("files", list(paths))
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def _iter_paths(self, kind: str, payload: object):
+        if kind == "folder":
+            yield from iter_image_files_in_folder(str(payload), **self._scan_options)
+        else:
+            for p in payload:  # type: ignore[attr-defined]
+                if os.path.splitext(p)[1].lower() in SUPPORTED_INPUT_FORMATS:
+                    yield p
+
+    def _run(self) -> None:
+        batch: list[ValidatedEntry] = []
+        last_flush = time.monotonic()
+        last_progress = 0.0
+        queue_full = False
+
+        def flush() -> bool:
+            nonlocal batch, last_flush
+            last_flush = time.monotonic()
+            if not batch:
+                return True
+            entries, batch = batch, []
+            return self._on_batch(entries)
+
+        try:
+            while not self._cancel.is_set() and not queue_full:
+                with self._lock:
+                    try:
+                        kind, payload = self._sources.get_nowait()
+                    except queue.Empty:
+                        self._closed = True
+                        break
+
+                for p in self._iter_paths(kind, payload):
+                    if self._cancel.is_set():
+                        break
+                    ok, msg, _size = validate_input_image(p, max_pixels=self._max_input_pixels)
+                    batch.append((p, ok, msg))
+                    self.scanned += 1
+                    if ok:
+                        self.accepted += 1
+
+                    now = time.monotonic()
+                    if len(batch) >= self.BATCH_SIZE or now - last_flush >= self.BATCH_INTERVAL:
+                        if not flush():
+                            queue_full = True
+                            break
+                    if now - last_progress >= self.PROGRESS_INTERVAL:
+                        last_progress = now
+                        self._on_progress(self.scanned, self.accepted)
+
+            if not self._cancel.is_set() and not queue_full:
+                flush()
+        finally:
+            with self._lock:
+                self._closed = True
+            self._on_done(self.scanned, self.accepted, self._cancel.is_set())
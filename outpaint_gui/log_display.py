@@ -2,7 +2,9 @@
 Log Display Widget - Scrolling text log with color-coded messages.
 """
 
+import threading
 import tkinter as tk
+from collections import deque
 from tkinter import ttk
 from datetime import datetime
 
@@ -29,11 +31,26 @@ COLORS = {
 
 
 class LogDisplay(tk.Frame):
-    """Scrolling log display with color-coded messages."""
+    """
+    Scrolling log display with color-coded messages.
+
+    log() may be called from any thread: messages go into a bounded ring buffer
+    that the Tk thread drains in one batch per FLUSH_INTERVAL_MS. The widget
+    keeps at most MAX_LINES lines, dropping the oldest.
+    """
+
+    FLUSH_INTERVAL_MS = 100
+    MAX_LINES = 5000
+    MAX_PENDING = 5000
 
     def __init__(self, parent, **kwargs):
         super().__init__(parent, bg=COLORS["bg_panel"], **kwargs)
 
+        self._pending = deque(maxlen=self.MAX_PENDING)
+        self._pending_lock = threading.Lock()
+        self._dropped = 0
+        self._line_count = 0
+
         # Create header
         header = tk.Label(
             self,
@@ -82,31 +99,59 @@ class LogDisplay(tk.Frame):
         self.text.tag_configure("download", foreground=COLORS["download"])
         self.text.tag_configure("api", foreground=COLORS["api"])
 
+        self.after(self.FLUSH_INTERVAL_MS, self._drain)
+
     def log(self, message: str, level: str = "info"):
         """
-        Add a log message with timestamp.
+        Queue a log message with timestamp (thread-safe).
 
         Args:
             message: The message to log
             level: One of "info", "success", "error", "warning"
         """
         timestamp = datetime.now().strftime("[%H:%M:%S]")
-
-        self.text.config(state=tk.NORMAL)
-
-        # Insert timestamp
-        self.text.insert(tk.END, timestamp + " ", "timestamp")
-
-        # Insert message with level color
-        self.text.insert(tk.END, message + "\n", level)
-
-        # Auto-scroll to bottom
-        self.text.see(tk.END)
-
-        self.text.config(state=tk.DISABLED)
+        with self._pending_lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append((timestamp, message, level))
+
+    def _drain(self):
+        """Write all pending messages in one batch, then trim old lines."""
+        try:
+            with self._pending_lock:
+                batch = list(self._pending)
+                self._pending.clear()
+                dropped, self._dropped = self._dropped, 0
+
+            if batch or dropped:
+                chunks = []
+                if dropped:
+                    timestamp = datetime.now().strftime("[%H:%M:%S]")
+                    chunks.extend((timestamp + " ", "timestamp", f"… {dropped} message(s) dropped\n", "warning"))
+                for timestamp, message, level in batch:
+                    chunks.extend((timestamp + " ", "timestamp", message + "\n", level))
+
+                self.text.config(state=tk.NORMAL)
+                self.text.insert(tk.END, *chunks)
+                self._line_count += sum(chunks[i].count("\n") for i in range(2, len(chunks), 4))
+
+                excess = self._line_count - self.MAX_LINES
+                if excess > 0:
+                    self.text.delete("1.0", f"{excess + 1}.0")
+                    self._line_count -= excess
+
+                # Auto-scroll to bottom
+                self.text.see(tk.END)
+                self.text.config(state=tk.DISABLED)
+        finally:
+            self.after(self.FLUSH_INTERVAL_MS, self._drain)
 
     def clear(self):
         """Clear all log messages."""
+        with self._pending_lock:
+            self._pending.clear()
+            self._dropped = 0
         self.text.config(state=tk.NORMAL)
         self.text.delete(1.0, tk.END)
         self.text.config(state=tk.DISABLED)
+        self._line_count = 0
@@ -4,6 +4,7 @@ import json
 import logging
 import os
 import threading
+import time
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from typing import Any, Optional
@@ -11,21 +12,24 @@ from typing import Any, Optional
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
+from folder_scan import folder_scan_options
+from outpaint_config import input_pixel_limit
 from path_utils import get_log_path
 from outpaint_diagnostics import run_diagnostics
 from outpaint_generator import (
     OutpaintGenerator,
     _deep_merge,
     default_config_dict,
-    iter_image_files_in_folder,
     load_outpaint_config,
     save_config_file,
 )
 
 from .config_panel import ConfigPanel
 from .drop_zone import DropZone, create_dnd_root
+from .folder_ingest import IngestJob
 from .log_display import LogDisplay
 from .queue_manager import QueueItem, QueueManager
+from .queue_view import QueueView
 
 
 COLORS = {
@@ -40,6 +44,8 @@ COLORS = {
 
 
 class OutpaintGUIWindow:
+    QUEUE_REFRESH_INTERVAL = 0.1  # seconds (max 10 Hz)
+
     def __init__(self, *, config_path: str):
         self.config_path = config_path
         self.root = create_dnd_root()
@@ -61,6 +67,14 @@ class OutpaintGUIWindow:
         self.generator: Optional[OutpaintGenerator] = None
         self._save_timer: Optional[str] = None  # For debounced auto-save
 
+        # Coalesced queue refresh: worker threads only mark the view dirty.
+        self._queue_refresh_lock = threading.Lock()
+        self._queue_refresh_pending = False
+        self._queue_last_refresh = 0.0
+
+        # Background scan/validation of dropped files and folders (Tk thread only).
+        self._ingest_job: Optional[IngestJob] = None
+
         self._build_ui()
 
         self.queue_manager = QueueManager(
@@ -68,7 +82,6 @@ class OutpaintGUIWindow:
             log_callback=self._log,
             queue_update_callback=self._refresh_queue,
             processing_complete_callback=self._on_item_complete,
-            fallback_switch_callback=self._fallback_switch,
         )
         self._refresh_queue()
 
@@ -138,16 +151,8 @@ class OutpaintGUIWindow:
             anchor="w", padx=10, pady=(8, 4)
         )
 
-        self.queue_list = tk.Listbox(
-            queue_frame,
-            bg=COLORS["bg_main"],
-            fg=COLORS["text_light"],
-            font=("Consolas", 9),
-            selectbackground=COLORS["accent_blue"],
-            borderwidth=0,
-            highlightthickness=0,
-        )
-        self.queue_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 8))
+        self.queue_view = QueueView(queue_frame)
+        self.queue_view.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 8))
 
         btns = tk.Frame(queue_frame, bg=COLORS["bg_panel"])
         btns.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -209,7 +214,8 @@ class OutpaintGUIWindow:
             save_config_file(self.config_path, self.config)
 
     def _log(self, message: str, level: str = "info") -> None:
-        self.root.after(0, lambda: self.log_display.log(message, level))
+        # LogDisplay.log is thread-safe and batches writes on the Tk thread.
+        self.log_display.log(message, level)
 
     def _on_config_changed(self, cfg: dict[str, Any]) -> None:
         # Preserve non-UI config keys (workers, diagnostics_run, etc.)
@@ -284,29 +290,89 @@ class OutpaintGUIWindow:
             self._on_files_dropped(list(files))
 
     def _on_files_dropped(self, file_paths: list[str]) -> None:
-        self.queue_manager.add_files(file_paths)
+        paths = list(file_paths)
+        self._ingest(lambda job: job.add_files(paths))
 
     def _on_folder_dropped(self, folder_path: str) -> None:
-        files = list(iter_image_files_in_folder(folder_path))
-        if not files:
-            messagebox.showinfo("No images", "No supported images found in folder")
+        self._log(f"Scanning folder: {folder_path}", "info")
+        self._ingest(lambda job: job.add_folder(folder_path))
+
+    def _ingest(self, push) -> None:
+        """Hand a source to the running ingest job, or start a new one."""
+        job = self._ingest_job
+        if job is not None and not job.cancelled and push(job):
             return
-        if messagebox.askyesno("Add folder", f"Add {len(files)} images from folder to queue?"):
-            self.queue_manager.add_files(files)
+
+        counts = {"added": 0, "skipped": 0, "full": False}
+
+        def on_batch(entries: list[tuple[str, bool, str]]) -> bool:
+            added, skipped = self.queue_manager.add_validated(entries)
+            counts["added"] += added
+            counts["skipped"] += skipped
+            if self.queue_manager.is_full():
+                counts["full"] = True
+                return False
+            return True
+
+        def on_progress(scanned: int, accepted: int) -> None:
+            text = f"Scanned {scanned} • {accepted} valid • {counts['added']} queued"
+            self.root.after(0, lambda: self.drop_zone.update_progress(text))
+
+        def on_done(scanned: int, _accepted: int, cancelled: bool) -> None:
+            self.root.after(0, lambda: self._on_ingest_done(job, scanned, cancelled, counts))
+
+        snapshot = self._get_config_snapshot()
+        job = IngestJob(
+            on_batch=on_batch,
+            on_progress=on_progress,
+            on_done=on_done,
+            scan_options=folder_scan_options(snapshot),
+            max_input_pixels=input_pixel_limit(snapshot),
+        )
+        push(job)
+        self._ingest_job = job
+        self.drop_zone.show_progress("Scanning…", on_cancel=job.cancel)
+        job.start()
+
+    def _on_ingest_done(self, job: IngestJob, scanned: int, cancelled: bool, counts: dict) -> None:
+        if self._ingest_job is job:
+            self._ingest_job = None
+            self.drop_zone.hide_progress()
+
+        if counts["added"]:
+            self._log(f"Added {counts['added']} item(s)", "info")
+        if counts["skipped"]:
+            self._log(f"Skipped {counts['skipped']} item(s)", "warning")
+        if counts["full"]:
+            self._log(f"Queue is full ({QueueManager.MAX_QUEUE_SIZE} items); stopped adding", "warning")
+        if cancelled:
+            self._log(f"Scan cancelled after {scanned} file(s)", "warning")
+        elif scanned == 0:
+            messagebox.showinfo("No images", "No supported images found")
 
     def _refresh_queue(self) -> None:
-        def _do() -> None:
-            self.queue_list.delete(0, tk.END)
-            for item in self.queue_manager.get_items():
-                name = os.path.basename(item.path)
-                extra = ""
-                if item.status == "completed" and item.output_paths:
-                    extra = f" → {len(item.output_paths)} output(s)"
-                if item.status == "failed" and item.error_message:
-                    extra = f" • {item.error_message}"
-                self.queue_list.insert(tk.END, f"[{item.status}] {name}{extra}")
-
-        self.root.after(0, _do)
+        """Request a queue redraw; bursts of updates collapse into at most one per interval."""
+        with self._queue_refresh_lock:
+            if self._queue_refresh_pending:
+                return
+            self._queue_refresh_pending = True
+            wait = self.QUEUE_REFRESH_INTERVAL - (time.monotonic() - self._queue_last_refresh)
+        self.root.after(max(0, int(wait * 1000)), self._flush_queue_refresh)
+
+    def _flush_queue_refresh(self) -> None:
+        with self._queue_refresh_lock:
+            self._queue_refresh_pending = False
+            self._queue_last_refresh = time.monotonic()
+
+        rows = []
+        for item in self.queue_manager.get_items():
+            extra = ""
+            if item.status == "completed" and item.output_paths:
+                extra = f"→ {len(item.output_paths)} output(s)"
+            elif item.error_message and item.status in ("failed", "skipped"):
+                extra = item.error_message
+            rows.append((item.status, os.path.basename(item.path), extra))
+        self.queue_view.set_rows(rows)
 
     def _validate_and_build_generator(self) -> Optional[OutpaintGenerator]:
         try:
@@ -369,31 +435,6 @@ class OutpaintGUIWindow:
         elif item.status == "failed":
             self._log(f"✗ Failed: {os.path.basename(item.path)} • {item.error_message}", "error")
 
-    def _fallback_switch(self, remaining: int) -> Optional[OutpaintGenerator]:
-        done = threading.Event()
-        result: dict[str, Optional[OutpaintGenerator]] = {"gen": None}
-
-        def on_main() -> None:
-            try:
-                ok = messagebox.askyesno(
-                    "ComfyUI repeatedly failed",
-                    f"ComfyUI failed 3 times in a row. Switch to fal.ai for remaining {remaining} items?",
-                )
-                if not ok:
-                    return
-
-                self.config = {**self.config, "backend": "falai"}
-                gen = self._validate_and_build_generator()
-                if gen:
-                    self._log("Switched backend to fal.ai", "warning")
-                    result["gen"] = gen
-            finally:
-                done.set()
-
-        self.root.after(0, on_main)
-        done.wait()
-        return result["gen"]
-
     def run(self) -> None:
         self.root.mainloop()
 
@@ -8,7 +8,8 @@ from dataclasses import dataclass, field
 from typing import Callable, Optional
 
 from outpaint_config import SUPPORTED_INPUT_FORMATS, validate_input_image
-from outpaint_generator import OutpaintGenerator, OutpaintResult, OutpaintSkipped
+from outpaint_generator import OutpaintGenerator, OutpaintResult, OutpaintSkipped, group_same_size
+from pipeline import SubmitPipeline
 
 
 @dataclass
@@ -24,7 +25,7 @@ class QueueItem:
 
 
 class QueueManager:
-    MAX_QUEUE_SIZE = 50
+    MAX_QUEUE_SIZE = 10_000
 
     def __init__(
         self,
@@ -33,16 +34,15 @@ class QueueManager:
         log_callback: Callable[[str, str], None],
         queue_update_callback: Callable[[], None],
         processing_complete_callback: Callable[[QueueItem], None],
-        fallback_switch_callback: Callable[[int], Optional[OutpaintGenerator]],
     ):
         self._get_config = config_getter
         self._log = log_callback
         self._on_queue_update = queue_update_callback
         self._on_item_complete = processing_complete_callback
-        self._fallback_switch = fallback_switch_callback
 
         self._lock = threading.Lock()
         self._items: list[QueueItem] = []
+        self._paths: set[str] = set()
 
         self._thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
@@ -58,31 +58,54 @@ class QueueManager:
     def clear(self) -> None:
         with self._lock:
             self._items.clear()
+            self._paths.clear()
         self._on_queue_update()
 
-    def add_files(self, paths: list[str]) -> None:
+    def is_full(self) -> bool:
+        with self._lock:
+            return len(self._items) >= self.MAX_QUEUE_SIZE
+
+    def add_validated(self, entries: list[tuple[str, bool, str]]) -> tuple[int, int]:
+        """Append already-validated ``(path, ok, message)`` entries; returns ``(added, skipped)``.
+
+        Validation is done by the caller (usually a background thread) so the lock is only
+        held for the append.
+        """
         added = 0
         skipped = 0
         with self._lock:
-            existing = {i.path for i in self._items}
-            for p in paths:
+            for p, ok, msg in entries:
                 if len(self._items) >= self.MAX_QUEUE_SIZE:
-                    break
-                if p in existing:
                     skipped += 1
                     continue
-                ext = os.path.splitext(p)[1].lower()
-                if ext not in SUPPORTED_INPUT_FORMATS:
+                if p in self._paths:
                     skipped += 1
                     continue
-                ok, msg, _size = validate_input_image(p)
-                if not ok:
+                if ok:
+                    self._items.append(QueueItem(path=p))
+                else:
                     self._items.append(QueueItem(path=p, status="failed", error_message=msg))
-                    added += 1
-                    continue
-                self._items.append(QueueItem(path=p))
+                self._paths.add(p)
                 added += 1
 
+        if added:
+            self._on_queue_update()
+        return added, skipped
+
+    def add_files(self, paths: list[str]) -> None:
+        entries: list[tuple[str, bool, str]] = []
+        unsupported = 0
+        for p in paths:
+            ext = os.path.splitext(p)[1].lower()
+            if ext not in SUPPORTED_INPUT_FORMATS:
+                unsupported += 1
+                continue
+            ok, msg, _size = validate_input_image(p)
+            entries.append((p, ok, msg))
+
+        added, skipped = self.add_validated(entries)
+        skipped += unsupported
+
         if added:
             self._log(f"Added {added} item(s)", "info")
         if skipped:
@@ -128,20 +151,62 @@ class QueueManager:
         except Exception:
             return 5
 
-    def _run(self, generator: OutpaintGenerator) -> None:
-        consecutive_comfyui_failures = 0
+    def _make_pipeline(self, generator: OutpaintGenerator, cfg: dict) -> Optional[SubmitPipeline]:
+        pipeline = generator.config.pipeline
+        if not pipeline.enabled:
+            return None
+        if not generator.can_pipeline():
+            self._log("Pipelining unavailable with this backend or tiling/progressive mode; running jobs whole", "warning")
+            return None
+        return SubmitPipeline(
+            generator,
+            depth=pipeline.depth,
+            submitters=self._desired_workers(cfg),
+            collectors=pipeline.collectors,
+            cancel_event=self._stop,
+        )
+
+    def _start_batch(
+        self, ex: ThreadPoolExecutor, generator: OutpaintGenerator, items: list[QueueItem]
+    ) -> list[Future[OutpaintResult]]:
+        """Run ``items`` through one ``generate_batch`` call; returns a future per item."""
+        mapped: list[Future[OutpaintResult]] = [Future() for _ in items]
+
+        def run() -> None:
+            try:
+                results = generator.generate_batch([i.path for i in items], cancel_event=self._stop)
+            except Exception as e:
+                results = [e] * len(items)
+            for fut, res in zip(mapped, results):
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                if isinstance(res, Exception):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
 
+        ex.submit(run)
+        return mapped
+
+    def _run(self, generator: OutpaintGenerator) -> None:
         def pick_pending() -> list[QueueItem]:
             with self._lock:
                 return [i for i in self._items if i.status == "pending"]
 
         ex: ThreadPoolExecutor | None = None
+        pipe: SubmitPipeline | None = None
         fut_to_item: dict[Future[OutpaintResult], QueueItem] = {}
 
         try:
             cfg = self._get_config()
             max_workers = self._max_workers(cfg)
             ex = ThreadPoolExecutor(max_workers=max_workers)
+            pipe = self._make_pipeline(generator, cfg)
+            if pipe is not None:
+                self._log(f"Pipelined submission: keeping {pipe.depth} job(s) queued ahead", "info")
+            batch = generator.config.comfyui_batch_size if pipe is None and generator.can_batch() else 1
+            if batch > 1:
+                self._log(f"Batching up to {batch} same-size image(s) per ComfyUI prompt", "info")
 
             while not self._stop.is_set():
                 if self._pause.is_set():
@@ -149,18 +214,28 @@ class QueueManager:
                     continue
 
                 cfg = self._get_config()
-                desired_workers = self._desired_workers(cfg)
+                # Pipelined: in flight means queued remotely, so the limit is the queue depth.
+                # Batched: each worker runs a whole batch, so that many more items are in flight.
+                desired_workers = pipe.depth if pipe is not None else self._desired_workers(cfg) * batch
                 pending = pick_pending()
 
                 while pending and len(fut_to_item) < desired_workers and not self._stop.is_set() and not self._pause.is_set():
-                    item = pending.pop(0)
+                    run = next(group_same_size([i.path for i in pending[:batch]], batch)) if batch > 1 else [pending[0].path]
+                    items = pending[: len(run)]
+                    del pending[: len(run)]
                     with self._lock:
-                        item.status = "processing"
-                        item.error_message = None
-                        item.output_paths = []
+                        for item in items:
+                            item.status = "processing"
+                            item.error_message = None
+                            item.output_paths = []
                     self._on_queue_update()
-                    fut = ex.submit(generator.generate, item.path, cancel_event=self._stop)
-                    fut_to_item[fut] = item
+                    if pipe is not None:
+                        futs = [pipe.put(items[0].path)]
+                    elif len(items) > 1:
+                        futs = self._start_batch(ex, generator, items)
+                    else:
+                        futs = [ex.submit(generator.generate, items[0].path, cancel_event=self._stop)]
+                    fut_to_item.update(zip(futs, items))
 
                 if not fut_to_item:
                     if not pending:
@@ -176,42 +251,23 @@ class QueueManager:
                         with self._lock:
                             item.status = "completed"
                             item.output_paths = res.output_paths
-                        consecutive_comfyui_failures = 0
                     except OutpaintSkipped as e:
                         with self._lock:
                             item.status = "skipped"
                             item.error_message = str(e)
                             item.output_paths = list(e.output_paths)
-                        consecutive_comfyui_failures = 0
                     except CancelledError:
                         with self._lock:
                             item.status = "skipped"
                             item.error_message = "Cancelled"
-                        consecutive_comfyui_failures = 0
                     except Exception as e:
                         with self._lock:
                             item.status = "failed"
                             item.error_message = str(e)
-                        cfg = self._get_config()
-                        if cfg.get("backend") == "comfyui":
-                            consecutive_comfyui_failures += 1
-                        else:
-                            consecutive_comfyui_failures = 0
 
                     self._on_queue_update()
                     self._on_item_complete(item)
 
-                    # Fallback prompt after 3 consecutive comfyui failures
-                    cfg = self._get_config()
-                    if cfg.get("backend") == "comfyui" and consecutive_comfyui_failures >= 3:
-                        remaining = len(pick_pending()) + len(fut_to_item)
-                        new_gen = self._fallback_switch(remaining)
-                        if new_gen is not None:
-                            generator = new_gen
-                            consecutive_comfyui_failures = 0
-                        else:
-                            consecutive_comfyui_failures = 0
-
         finally:
             # Mark any in-flight items as stopped so UI doesn't stay stuck in "processing"
             if self._stop.is_set() and fut_to_item:
@@ -227,6 +283,8 @@ class QueueManager:
 
             if ex is not None:
                 ex.shutdown(wait=False, cancel_futures=True)
+            if pipe is not None:
+                pipe.shutdown(wait=False)
 
             self.is_running = False
             self.is_paused = False
@@ -0,0 +1,147 @@
+"""
+Queue View Widget - Virtualized Treeview that renders only the visible queue rows.
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from typing import List, Sequence, Tuple
+
+
+COLORS = {
+    "bg_main": "#2D2D30",
+    "bg_panel": "#3C3C41",
+    "text_light": "#DCDCDC",
+    "text_dim": "#B4B4B4",
+    "accent_blue": "#6496FF",
+}
+
+Row = Tuple[str, str, str]
+_EMPTY_ROW: Row = ("", "", "")
+
+
+class QueueView(tk.Frame):
+    """
+    Virtualized queue list.
+
+    The Treeview only ever holds enough rows to fill the visible area. The full
+    model lives in Python; scrolling moves a window over it, and a refresh only
+    touches rows whose text actually changed.
+    """
+
+    ROW_HEIGHT = 20
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, bg=COLORS["bg_main"], **kwargs)
+
+        style = ttk.Style()
+        style.configure(
+            "Queue.Treeview",
+            background=COLORS["bg_main"],
+            fieldbackground=COLORS["bg_main"],
+            foreground=COLORS["text_light"],
+            rowheight=self.ROW_HEIGHT,
+            font=("Consolas", 9),
+            borderwidth=0,
+        )
+        style.configure(
+            "Queue.Treeview.Heading",
+            background=COLORS["bg_panel"],
+            foreground=COLORS["text_dim"],
+            font=("Segoe UI", 9, "bold"),
+        )
+        style.map("Queue.Treeview", background=[("selected", COLORS["accent_blue"])])
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree = ttk.Treeview(
+            self,
+            columns=("status", "file", "detail"),
+            show="headings",
+            selectmode="browse",
+            style="Queue.Treeview",
+        )
+        self.tree.heading("status", text="Status", anchor="w")
+        self.tree.heading("file", text="File", anchor="w")
+        self.tree.heading("detail", text="Detail", anchor="w")
+        self.tree.column("status", width=90, stretch=False, anchor="w")
+        self.tree.column("file", width=240, stretch=True, anchor="w")
+        self.tree.column("detail", width=240, stretch=True, anchor="w")
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self._rows: List[Row] = []
+        self._offset = 0
+        # Row slots currently in the Treeview and the values last written to each.
+        self._slots: List[str] = []
+        self._rendered: List[Row] = []
+
+        self.tree.bind("<Configure>", lambda e: self._resize_slots(e.height))
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_by(3))
+
+    @property
+    def visible_rows(self) -> int:
+        return len(self._slots)
+
+    def set_rows(self, rows: Sequence[Row]) -> None:
+        """Replace the model and re-render only the visible rows that changed."""
+        self._rows = list(rows)
+        self._clamp_offset()
+        self._render()
+
+    def _resize_slots(self, height: int) -> None:
+        # Header takes roughly one row.
+        wanted = max(1, height // self.ROW_HEIGHT - 1)
+        while len(self._slots) < wanted:
+            iid = f"slot{len(self._slots)}"
+            self.tree.insert("", tk.END, iid=iid, values=_EMPTY_ROW)
+            self._slots.append(iid)
+            self._rendered.append(_EMPTY_ROW)
+        while len(self._slots) > wanted:
+            self.tree.delete(self._slots.pop())
+            self._rendered.pop()
+        self._clamp_offset()
+        self._render()
+
+    def _clamp_offset(self) -> None:
+        max_offset = max(0, len(self._rows) - len(self._slots))
+        self._offset = min(max(0, self._offset), max_offset)
+
+    def _render(self) -> None:
+        for i, iid in enumerate(self._slots):
+            idx = self._offset + i
+            values = self._rows[idx] if idx < len(self._rows) else _EMPTY_ROW
+            if values != self._rendered[i]:
+                self.tree.item(iid, values=values)
+                self._rendered[i] = values
+        self._update_scrollbar()
+
+    def _update_scrollbar(self) -> None:
+        total = len(self._rows)
+        if total <= len(self._slots) or total == 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        first = self._offset / total
+        last = min(1.0, (self._offset + len(self._slots)) / total)
+        self.scrollbar.set(first, last)
+
+    def _scroll_by(self, rows: int) -> None:
+        self._offset += rows
+        self._clamp_offset()
+        self._render()
+
+    def _on_mousewheel(self, event) -> None:
+        self._scroll_by(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, *args) -> None:
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._offset = int(float(args[1]) * len(self._rows))
+            self._clamp_offset()
+            self._render()
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            step = max(1, len(self._slots) - 1) if args[2] == "pages" else 1
+            self._scroll_by(amount * step)
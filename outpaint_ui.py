@@ -2,11 +2,15 @@ from __future__ import annotations
 
 import argparse
 import json
+import multiprocessing
 import os
 import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
 
+from folder_scan import folder_scan_options
+from manifest import RunManifest, output_params
+from memory_budget import format_memory_stats
 from path_utils import get_config_path
 from outpaint_diagnostics import run_diagnostics
 from outpaint_generator import OutpaintGenerator, default_config_dict, iter_image_files_in_folder, load_outpaint_config, save_config_file
@@ -40,10 +44,13 @@ def _apply_overrides(merged: dict[str, Any], args: argparse.Namespace) -> dict[s
     set_if("backend", "backend")
     set_if("falai_api_key", "falai_api_key")
     set_if("comfyui_url", "comfyui_url")
+    set_if("comfyui_pool", "comfyui_urls")
     set_if("comfyui_workflow_path", "comfyui_workflow_path")
+    set_if("comfyui_batch_size", "comfyui_batch_size")
     set_if("output_folder", "output_folder")
     set_if("output_suffix", "output_suffix")
     set_if("output_format", "output_format")
+    set_if("encoder_profile", "encoder_profile")
     set_if("zoom_out_percentage", "zoom_out_percentage")
     set_if("expand_left", "expand_left")
     set_if("expand_right", "expand_right")
@@ -51,6 +58,9 @@ def _apply_overrides(merged: dict[str, Any], args: argparse.Namespace) -> dict[s
     set_if("expand_bottom", "expand_bottom")
     set_if("num_images", "num_images")
     set_if("prompt", "prompt")
+    set_if("include", "folder_include_globs")
+    set_if("exclude", "folder_exclude_globs")
+    set_if("max_depth", "folder_max_depth")
 
     if args.use_source_folder is not None:
         merged["use_source_folder"] = bool(args.use_source_folder)
@@ -58,16 +68,101 @@ def _apply_overrides(merged: dict[str, Any], args: argparse.Namespace) -> dict[s
     if args.enable_safety_checker is not None:
         merged["enable_safety_checker"] = bool(args.enable_safety_checker)
 
-    workers = merged.get("workers") or {"falai": 5, "comfyui": 2}
+    workers = merged.get("workers") or {"falai": 5, "comfyui": 2, "encode": 0}
     if args.workers_falai is not None:
         workers["falai"] = int(args.workers_falai)
     if args.workers_comfyui is not None:
         workers["comfyui"] = int(args.workers_comfyui)
+    if args.workers_encode is not None:
+        workers["encode"] = int(args.workers_encode)
     merged["workers"] = workers
 
+    if args.proxy is not None or args.proxy_max_side is not None:
+        proxy = dict(merged.get("proxy") or {})
+        if args.proxy is not None:
+            proxy["enabled"] = bool(args.proxy)
+        if args.proxy_max_side is not None:
+            proxy["max_side"] = int(args.proxy_max_side)
+        merged["proxy"] = proxy
+
+    if args.pipeline_depth is not None:
+        depth = int(args.pipeline_depth)
+        pipeline = dict(merged.get("pipeline") or {})
+        pipeline["enabled"] = depth > 0
+        if depth > 0:
+            pipeline["depth"] = depth
+        merged["pipeline"] = pipeline
+
+    if args.comfyui_warmup is not None:
+        merged["warmup"] = {**(merged.get("warmup") or {}), "enabled": bool(args.comfyui_warmup)}
+
+    if args.max_inflight_mb is not None:
+        merged["memory"] = {**(merged.get("memory") or {}), "max_inflight_mb": int(args.max_inflight_mb)}
+
     return merged
 
 
+def _input_paths(path: str, cfg_dict: dict) -> Iterable[str]:
+    p = Path(path)
+    if p.is_file():
+        return [str(p)]
+    # Walked lazily: the batch starts while the folder scan is still running.
+    return iter_image_files_in_folder(str(p), **folder_scan_options(cfg_dict))
+
+
+def _serve(args: argparse.Namespace, cfg: Any) -> int:
+    from distributed import CoordinatorServer, LeaseQueue
+
+    if not args.path:
+        print("--serve needs an image file or folder to hand out")
+        return 2
+    host, _, port = args.serve.rpartition(":")
+    paths = _input_paths(args.path, cfg.model_dump())
+
+    manifest = RunManifest(args.manifest, output_params(cfg.model_dump())) if args.manifest else None
+    if manifest is not None:
+        paths = (p for p in paths if manifest.completed(p) is None)
+
+    def on_complete(src: str, ok: bool, outputs: list[str], error: str) -> None:
+        print(f"[{'ok' if ok else 'failed'}] {os.path.basename(src)}{'' if ok else ' • ' + error}")
+        if manifest is not None:
+            if ok:
+                manifest.record_done(src, outputs)
+            else:
+                manifest.record_failed(src, error)
+
+    queue = LeaseQueue(paths, lease_seconds=args.lease_seconds)
+    server = CoordinatorServer(queue, host or "0.0.0.0", int(port), on_complete=on_complete).start()
+    print(f"Coordinator listening on {server.url}")
+    try:
+        server.wait_finished()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        if manifest is not None:
+            manifest.close()
+
+    stats = queue.stats()
+    print(f"Done: {stats['done']} • failed: {stats['failed']} • reclaimed leases: {stats['reclaimed']}")
+    return 4 if stats["failed"] else 0
+
+
+def _work(args: argparse.Namespace, gen: OutpaintGenerator) -> int:
+    from distributed import CoordinatorClient, run_worker
+
+    def log(src: str, ok: bool, error: str) -> None:
+        print(f"[{'ok' if ok else 'failed'}] {os.path.basename(src)}{'' if ok else ' • ' + error}")
+
+    cfg = gen.config
+    threads = args.max_workers or (cfg.workers.falai if cfg.backend == "falai" else cfg.workers.comfyui)
+    client = CoordinatorClient(args.worker)
+    print(f"Worker {client.worker} consuming {client.base_url}")
+    counts = run_worker(client, gen.generate, threads=threads, on_result=log)
+    print(f"Done: {counts['done']} • failed: {counts['failed']} • lost leases: {counts['lost']}")
+    return 4 if counts["failed"] else 0
+
+
 def main(argv: list[str]) -> int:
     parser = argparse.ArgumentParser(description="fal.ai Image Outpainting Tool")
     parser.add_argument("path", nargs="?", help="Image file or folder to process")
@@ -78,7 +173,28 @@ def main(argv: list[str]) -> int:
     parser.add_argument("--backend", choices=["falai", "comfyui"], help="Backend to use")
     parser.add_argument("--falai-api-key", dest="falai_api_key", help="fal.ai API key")
     parser.add_argument("--comfyui-url", dest="comfyui_url", help="ComfyUI server URL")
+    parser.add_argument(
+        "--comfyui-pool",
+        dest="comfyui_pool",
+        action="append",
+        metavar="URL",
+        help="ComfyUI server to balance jobs across (repeatable; replaces --comfyui-url)",
+    )
     parser.add_argument("--workflow", dest="comfyui_workflow_path", help="ComfyUI workflow JSON path")
+    parser.add_argument(
+        "--comfyui-batch",
+        dest="comfyui_batch_size",
+        type=int,
+        help="Stack up to N consecutive same-size inputs into one ComfyUI prompt (1-16)",
+    )
+
+    parser.add_argument(
+        "--comfyui-warmup",
+        dest="comfyui_warmup",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Run a tiny ComfyUI prompt before the first job and after idle periods to keep models loaded",
+    )
 
     parser.add_argument("--zoom", dest="zoom_out_percentage", type=int, help="Zoom out percentage (0-90)")
     parser.add_argument("--expand-left", type=int)
@@ -89,6 +205,12 @@ def main(argv: list[str]) -> int:
     parser.add_argument("--prompt", type=str)
 
     parser.add_argument("--output-format", dest="output_format", choices=["png", "jpeg", "webp"])
+    parser.add_argument(
+        "--encoder-profile",
+        dest="encoder_profile",
+        choices=["fast", "balanced", "archive"],
+        help="Encode speed/size trade-off when outputs are re-encoded",
+    )
     parser.add_argument("--output-suffix", dest="output_suffix")
     parser.add_argument("--output-folder", dest="output_folder")
 
@@ -108,9 +230,45 @@ def main(argv: list[str]) -> int:
         help="fal.ai only",
     )
 
+    parser.add_argument(
+        "--proxy",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Outpaint a downscaled copy, then restore the full-resolution original",
+    )
+    parser.add_argument("--proxy-max-side", dest="proxy_max_side", type=int, help="Longest side sent in proxy mode")
+
+    parser.add_argument("--include", action="append", help="Glob a file name/relative path must match (repeatable)")
+    parser.add_argument("--exclude", action="append", help="Glob of files/folders to skip (repeatable)")
+    parser.add_argument("--max-depth", dest="max_depth", type=int, help="Folder recursion depth (0 = top folder only)")
+
     parser.add_argument("--workers-falai", type=int, help="Concurrent workers for fal.ai")
     parser.add_argument("--workers-comfyui", type=int, help="Concurrent workers for ComfyUI")
+    parser.add_argument("--workers-encode", type=int, help="Processes for output encoding (0 = inline)")
     parser.add_argument("--max-workers", type=int, help="Override max workers for this run")
+    parser.add_argument(
+        "--pipeline-depth",
+        dest="pipeline_depth",
+        type=int,
+        help="Keep this many jobs queued on the backend ahead of result collection (0 = off)",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSONL run log; rerunning with the same file skips finished inputs and resumes in-flight jobs",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="HOST:PORT",
+        help="Coordinate a distributed run: hand the inputs out to --worker nodes instead of processing them",
+    )
+    parser.add_argument("--lease-seconds", type=float, default=600.0, help="Coordinator: reclaim items not renewed within this time")
+    parser.add_argument("--worker", metavar="URL", help="Process items leased from the coordinator at URL")
+    parser.add_argument(
+        "--max-inflight-mb",
+        dest="max_inflight_mb",
+        type=int,
+        help="Cap on downloaded image bytes held in memory (0 = unlimited)",
+    )
 
     args = parser.parse_args(argv)
 
@@ -126,7 +284,7 @@ def main(argv: list[str]) -> int:
         return 0
 
     # GUI should always launch even if config is incomplete; validation happens on Start/Test.
-    if args.gui or not args.path:
+    if args.gui or not (args.path or args.worker or args.serve):
         save_config_file(config_path, merged)
         from outpaint_gui.main_window import launch_gui
 
@@ -143,6 +301,10 @@ def main(argv: list[str]) -> int:
         cfg = None
         errors = [str(e)]
 
+    if args.serve and cfg is not None:
+        # The coordinator never calls a backend, so backend settings don't need to be valid here.
+        return _serve(args, cfg)
+
     if errors or cfg is None:
         print("Configuration errors:\n")
         for e in errors:
@@ -157,28 +319,38 @@ def main(argv: list[str]) -> int:
         print(f"Backend not ready: {msg}")
         return 3
 
-    p = Path(args.path)
-    if p.is_file():
-        paths = [str(p)]
-    else:
-        paths = list(iter_image_files_in_folder(str(p)))
-
-    if not paths:
-        print("No images found")
-        return 0
+    if args.worker:
+        return _work(args, gen)
 
-    def progress(done: int, total: int, current: str) -> None:
-        print(f"[{done}/{total}] {os.path.basename(current)}")
+    paths = _input_paths(args.path, cfg.model_dump())
 
     def log(message: str, level: str = "info") -> None:
-        # Ensure failures are visible in CLI mode (generate_many swallows exceptions).
+        # Ensure failures are visible in CLI mode (iter_generate reports them via the callback).
         if level in {"error", "warning"}:
             print(f"[{level}] {message}")
 
     gen.set_progress_callback(log)
-    results = gen.generate_many(paths, max_workers=args.max_workers, per_item_callback=progress)
-    if len(results) != len(paths):
-        print(f"\nCompleted with failures: {len(results)}/{len(paths)} succeeded")
+    manifest = RunManifest(args.manifest, output_params(cfg.model_dump())) if args.manifest else None
+    done = succeeded = resumed = 0
+    try:
+        for outcome in gen.iter_generate(paths, max_workers=args.max_workers, manifest=manifest):
+            done += 1
+            succeeded += outcome.result is not None
+            resumed += outcome.from_manifest
+            note = " (done in a previous run)" if outcome.from_manifest else ""
+            print(f"[{done}] {os.path.basename(outcome.source_path)}{note}")
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    if not done:
+        print("No images found")
+        return 0
+    if resumed:
+        print(f"Skipped {resumed} input(s) already completed in {args.manifest}")
+    print(format_memory_stats(gen.memory_stats()))
+    if succeeded != done:
+        print(f"\nCompleted with failures: {succeeded}/{done} succeeded")
         save_config_file(config_path, merged)
         return 4
     save_config_file(config_path, merged)
@@ -186,4 +358,7 @@ def main(argv: list[str]) -> int:
 
 
 if __name__ == "__main__":
+    # In the frozen (PyInstaller) exe, encode worker processes start this script again;
+    # freeze_support() turns them into workers instead of relaunching the app.
+    multiprocessing.freeze_support()
     raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,201 @@
+"""
+Writing backend outputs to disk.
+
+Backend bytes are written as-is when their container already matches the
+requested output format; only mismatches are decoded and re-encoded. Every
+write goes to a temp file in the target folder and is moved into place with
+os.replace, so a crash or cancel never leaves a truncated image behind.
+
+Re-encoding can run in an EncodePool (worker processes) so large PNG/WebP
+saves don't hold the GIL on the polling threads. Bytes reach the worker via a
+temp file next to the target rather than being pickled through a pipe.
+"""
+
+from __future__ import annotations
+
+import atexit
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from image_probe import sniff_format
+
+
+def _temp_path(target: Path) -> Path:
+    fd, name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=str(target.parent))
+    os.close(fd)
+    return Path(name)
+
+
+def _commit(tmp: Path, target: Path) -> None:
+    try:
+        os.replace(tmp, target)
+    finally:
+        try:
+            if tmp.exists():
+                tmp.unlink()
+        except OSError:
+            # Cleanup is best-effort only
+            pass
+
+
+def write_bytes_atomic(target: Path, data: bytes) -> None:
+    tmp = _temp_path(target)
+    try:
+        tmp.write_bytes(data)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _commit(tmp, target)
+
+
+# Pillow save() options per profile and output format. "balanced" is the historical
+# behaviour (PNG default compression, JPEG q95, WebP q90).
+ENCODER_PROFILES: dict[str, dict[str, dict]] = {
+    "fast": {
+        "png": {"compress_level": 1},
+        "jpeg": {"quality": 90, "optimize": False, "progressive": False, "subsampling": "4:2:0"},
+        "webp": {"quality": 85, "method": 0, "lossless": False},
+    },
+    "balanced": {
+        "png": {},
+        "jpeg": {"quality": 95},
+        "webp": {"quality": 90},
+    },
+    "archive": {
+        "png": {"compress_level": 9},
+        "jpeg": {"quality": 95, "optimize": True, "progressive": True, "subsampling": "4:4:4"},
+        "webp": {"lossless": True, "quality": 80, "method": 4},
+    },
+}
+
+_PIL_FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+
+
+def encode_image(img: Image.Image, fp, fmt: str, profile: str = "balanced") -> None:
+    """Save ``img`` to ``fp`` (path or file object) in the given output format and profile."""
+    if fmt not in _PIL_FORMATS:
+        fmt = "png"
+    options = ENCODER_PROFILES[profile][fmt]
+    src = img.convert("RGB") if fmt == "jpeg" and img.mode in ("RGBA", "LA", "P") else img
+    try:
+        try:
+            src.save(fp, format=_PIL_FORMATS[fmt], **options)
+        except OSError:
+            # libjpeg encodes optimize/progressive in one buffer sized from the pixel count,
+            # which near-incompressible content can overflow; fall back to a baseline JPEG.
+            if fmt != "jpeg" or not (options.get("optimize") or options.get("progressive")):
+                raise
+            if hasattr(fp, "seek"):
+                fp.seek(0)
+                fp.truncate()
+            src.save(fp, format="JPEG", **{**options, "optimize": False, "progressive": False})
+    finally:
+        if src is not img:
+            src.close()
+
+
+def reencode_to_file(data: bytes, target: Path, fmt: str, profile: str = "balanced") -> None:
+    tmp = _temp_path(target)
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            encode_image(img, tmp, fmt, profile)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _commit(tmp, target)
+
+
+def needs_reencode(data: bytes, fmt: str) -> bool:
+    return sniff_format(data[:16]) != fmt
+
+
+def write_output(data: bytes, target: Path, fmt: str, profile: str = "balanced") -> bool:
+    """Write one output image; returns True if the bytes had to be re-encoded.
+
+    The encoder profile only applies when re-encoding; matching bytes are kept as-is.
+    """
+    if needs_reencode(data, fmt):
+        reencode_to_file(data, target, fmt, profile)
+        return True
+    write_bytes_atomic(target, data)
+    return False
+
+
+def _encode_spilled(src: str, target: str, fmt: str, profile: str) -> str:
+    """Process-pool entry point: re-encode the spilled bytes at ``src`` into ``target``."""
+    try:
+        with open(src, "rb") as f:
+            data = f.read()
+        reencode_to_file(data, Path(target), fmt, profile)
+    finally:
+        try:
+            os.unlink(src)
+        except OSError:
+            pass
+    return target
+
+
+class EncodePool:
+    """Re-encodes outputs in worker processes; matching bytes are still written inline."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def write(self, data: bytes, target: Path, fmt: str, profile: str = "balanced") -> bool:
+        """Same contract as ``write_output``; blocks (without holding the GIL) until written."""
+        if not needs_reencode(data, fmt):
+            write_bytes_atomic(target, data)
+            return False
+
+        spill = _temp_path(target)
+        try:
+            spill.write_bytes(data)
+            try:
+                fut = self._executor.submit(_encode_spilled, str(spill), str(target), fmt, profile)
+            except RuntimeError:
+                # Pool was replaced/shut down under us (workers setting changed); encode here.
+                reencode_to_file(data, target, fmt, profile)
+            else:
+                fut.result()
+        finally:
+            spill.unlink(missing_ok=True)
+        return True
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_shared_pool: Optional[EncodePool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_encode_pool(workers: int) -> Optional[EncodePool]:
+    """Process-wide pool sized to ``workers`` (None when 0), shared by all generators."""
+    global _shared_pool
+    if workers <= 0:
+        return None
+    with _shared_lock:
+        if _shared_pool is not None and _shared_pool.workers != workers:
+            # Let in-flight encodes on the old pool finish; new work goes to the resized one.
+            _shared_pool.shutdown(wait=False)
+            _shared_pool = None
+        if _shared_pool is None:
+            _shared_pool = EncodePool(workers)
+        return _shared_pool
+
+
+@atexit.register
+def _shutdown_shared_pool() -> None:
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is not None:
+            _shared_pool.shutdown()
+            _shared_pool = None
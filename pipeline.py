@@ -0,0 +1,147 @@
+"""
+Pipelined submission: keep the backend's queue primed ahead of collection.
+
+Without it every worker thread uploads, submits, waits for the GPU and
+downloads in turn, so a ComfyUI server sits idle while the next job is still
+being uploaded. Here a submit pool only uploads and queues
+(``OutpaintGenerator.submit``) while a small collector pool waits for results
+and writes them (``OutpaintGenerator.collect``). At most ``depth`` jobs are
+queued or running remotely at any time; further ``put`` calls wait in the
+submit pool for a slot.
+
+Shutting down cancels the remote jobs that were queued but never picked up by
+a collector, so a Stop frees the backend instead of leaving up to ``depth``
+prompts running for nobody.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional
+
+from backends import JobHandle
+
+if TYPE_CHECKING:
+    from outpaint_generator import OutpaintGenerator, OutpaintResult, PendingOutpaint
+
+
+class SubmitPipeline:
+    def __init__(
+        self,
+        generator: "OutpaintGenerator",
+        *,
+        depth: int,
+        submitters: int,
+        collectors: int,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.depth = depth
+        self._gen = generator
+        self._cancel = cancel_event
+        self._submit_ex = ThreadPoolExecutor(max_workers=max(1, submitters), thread_name_prefix="submit")
+        self._collect_ex = ThreadPoolExecutor(max_workers=max(1, collectors), thread_name_prefix="collect")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # One slot per job between submission and the end of its collection.
+        self._slots = threading.BoundedSemaphore(depth)
+        self._closed = threading.Event()
+        # Queued remotely, not yet taken by a collector: (pending, settle) by job key.
+        self._waiting: dict[int, tuple["PendingOutpaint", Callable]] = {}
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def has_room(self) -> bool:
+        return self.in_flight < self.depth
+
+    def _acquire_slot(self) -> bool:
+        while not self._slots.acquire(timeout=0.2):
+            if self._closed.is_set() or (self._cancel is not None and self._cancel.is_set()):
+                return False
+        return True
+
+    def put(self, image_path: str, *, job: Optional[JobHandle] = None) -> "Future[OutpaintResult]":
+        """Start ``image_path``; the future resolves once its outputs are written."""
+        outer: Future = Future()
+        outer.set_running_or_notify_cancel()
+        with self._lock:
+            self._in_flight += 1
+        holding = threading.Event()
+        key = id(outer)
+
+        def settle(fn, *args) -> None:
+            try:
+                outer.set_result(fn(*args))
+            except BaseException as e:
+                outer.set_exception(e)
+            finally:
+                if holding.is_set():
+                    self._slots.release()
+                with self._lock:
+                    self._in_flight -= 1
+
+        def collect(pending: "PendingOutpaint") -> None:
+            settle(self._gen.collect, pending, self._cancel)
+
+        def collect_queued() -> None:
+            claimed = self._claim(key)
+            if claimed is not None:
+                collect(claimed[0])
+
+        def submit() -> None:
+            if not self._acquire_slot():
+                settle(_raise, CancelledError())
+                return
+            holding.set()
+            try:
+                pending = self._gen.submit(image_path, self._cancel, job=job)
+            except BaseException as e:
+                settle(_raise, e)
+                return
+            if not pending.queued:
+                # Nothing was queued remotely (tiled/progressive/proxy): run it here, not on a collector.
+                collect(pending)
+                return
+            with self._lock:
+                self._waiting[key] = (pending, settle)
+            try:
+                self._collect_ex.submit(collect_queued)
+            except RuntimeError:  # shut down meanwhile
+                self._drop(key)
+
+        try:
+            self._submit_ex.submit(submit)
+        except RuntimeError as e:
+            settle(_raise, e)
+        return outer
+
+    def _claim(self, key: int) -> Optional[tuple["PendingOutpaint", Callable]]:
+        with self._lock:
+            return self._waiting.pop(key, None)
+
+    def _drop(self, key: int) -> None:
+        """Cancel a queued job nobody will collect, remotely too, and fail its future."""
+        claimed = self._claim(key)
+        if claimed is None:
+            return
+        pending, settle = claimed
+        self._gen.cancel(pending)
+        settle(_raise, CancelledError())
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._closed.set()
+        self._submit_ex.shutdown(wait=wait, cancel_futures=True)
+        self._collect_ex.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            stranded = list(self._waiting)
+        for key in stranded:
+            self._drop(key)
+        if wait:
+            self._collect_ex.shutdown(wait=True)
+
+
+def _raise(e: BaseException) -> None:
+    raise e
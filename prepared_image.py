@@ -0,0 +1,169 @@
+"""
+Prepared source image: decoded at most once per job.
+
+A PreparedImage carries the size, mode and lazily-built upload payloads of one
+input through the generator to the backend, so validation, retries and
+fallbacks between backends don't reopen or re-encode the file.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+from typing import Optional
+
+from PIL import Image
+
+from image_probe import ImageHeader, probe_image
+
+
+class PreparedImage:
+    def __init__(
+        self,
+        *,
+        name: str,
+        path: Optional[str] = None,
+        image: Optional[Image.Image] = None,
+        header: Optional[ImageHeader] = None,
+    ):
+        if path is None and image is None:
+            raise ValueError("PreparedImage needs a path or an image")
+        self.name = name
+        self.path = path
+        self._image = image
+        self._header = header
+        self._mode: Optional[str] = image.mode if image is not None else None
+        self._lock = threading.Lock()
+        self._jpeg_cache: dict[tuple[int, int], bytes] = {}
+        self._png_cache: Optional[bytes] = None
+        self._drafts: dict[int, Image.Image] = {}
+
+    @classmethod
+    def from_path(cls, path: str) -> "PreparedImage":
+        """Wrap a file; only the header is read until pixels are needed."""
+        header: Optional[ImageHeader] = None
+        try:
+            header = probe_image(path)
+        except OSError:
+            header = None
+        return cls(name=os.path.basename(path), path=path, header=header)
+
+    @classmethod
+    def from_image(cls, image: Image.Image, *, name: str) -> "PreparedImage":
+        """Wrap an in-memory image (proxy, tile or intermediate stage)."""
+        return cls(name=name, image=image)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    @property
+    def format(self) -> Optional[str]:
+        if self._header is not None:
+            return self._header.format
+        return None
+
+    @property
+    def size(self) -> tuple[int, int]:
+        if self._image is not None:
+            return self._image.size
+        if self._header is not None:
+            return self._header.size
+        return self.image().size
+
+    @property
+    def mode(self) -> str:
+        if self._mode is None:
+            with Image.open(self.path) as img:  # type: ignore[arg-type]
+                self._mode = img.mode
+        return self._mode
+
+    def image(self) -> Image.Image:
+        """Full-resolution decoded pixels, cached for the life of the job."""
+        with self._lock:
+            if self._image is None:
+                img = Image.open(self.path)  # type: ignore[arg-type]
+                img.load()
+                self._mode = img.mode
+                self._image = img
+            return self._image
+
+    def reduced(self, max_side: int) -> Image.Image:
+        """Pixels at no less than ``max_side`` on the longest side, for callers that downscale.
+
+        JPEG sources larger than that are decoded via ``Image.draft`` at 1/2-1/8 scale
+        (cached separately) instead of paying for a full-resolution decode.
+        """
+        if self.path is not None and self.format == "jpeg" and max(self.size) > max_side:
+            with self._lock:
+                if self._image is None:
+                    cached = self._drafts.get(max_side)
+                    if cached is None:
+                        cached = Image.open(self.path)
+                        scale = max_side / max(cached.size)
+                        cached.draft("RGB", (max(1, int(cached.width * scale)), max(1, int(cached.height * scale))))
+                        cached.load()
+                        self._drafts[max_side] = cached
+                    return cached
+        return self.image()
+
+    def upload_jpeg(self, *, max_side: int = 4096, quality: int = 95) -> bytes:
+        """JPEG payload for URL-based uploads: alpha flattened on white, longest side <= max_side."""
+        key = (max_side, quality)
+        cached = self._jpeg_cache.get(key)
+        if cached is not None:
+            return cached
+
+        img = self.reduced(max_side)
+        owned: list[Image.Image] = []
+        try:
+            if max(img.size) > max_side:
+                img = img.copy()
+                owned.append(img)
+                img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+            if img.mode in ("RGBA", "LA", "P"):
+                src = img.convert("RGBA") if img.mode == "P" else img
+                if src is not img:
+                    owned.append(src)
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                owned.append(background)
+                background.paste(src, mask=src.split()[-1])
+                img = background
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+                owned.append(img)
+
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality, optimize=True)
+        finally:
+            for o in owned:
+                o.close()
+
+        payload = buffer.getvalue()
+        self._jpeg_cache[key] = payload
+        return payload
+
+    def upload_file(self) -> tuple[str, bytes]:
+        """(filename, bytes) for multipart uploads: the original file, or PNG for in-memory images."""
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return self.name, f.read()
+        if self._png_cache is None:
+            buffer = io.BytesIO()
+            self.image().save(buffer, format="PNG")
+            self._png_cache = buffer.getvalue()
+        stem = os.path.splitext(self.name)[0]
+        return f"{stem}.png", self._png_cache
+
+    def close(self) -> None:
+        with self._lock:
+            if self._image is not None and self.path is not None:
+                self._image.close()
+                self._image = None
+            for img in self._drafts.values():
+                img.close()
+            self._drafts.clear()
+            self._jpeg_cache.clear()
+            self._png_cache = None
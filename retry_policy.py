@@ -0,0 +1,170 @@
+"""
+Retries for remote calls: jittered backoff, a shared budget, and failure stages.
+
+Fixed delays made every worker that hit the same outage retry at the same
+instants. Delays here use decorrelated jitter (each one drawn between the base
+delay and three times the previous one, capped), and every retry spends a
+token from a process-wide bucket, so once an outage has used up the budget
+further failures are reported at once instead of piling more load on the API.
+
+Backends mark where a failure happened with :func:`stage` (``upload``,
+``submit``, ``poll`` or ``download``). Attempts are counted per stage, and
+since a retried call resumes its :class:`backends.JobHandle` (and reuses the
+upload it recorded) only the failed stage runs again.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+import requests
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying; any other 4xx is the request's fault and fails at once.
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Tag exceptions raised in the block with the stage they failed in (innermost wins)."""
+    try:
+        yield
+    except Exception as e:
+        if getattr(e, "stage", None) is None:
+            try:
+                e.stage = name  # type: ignore[attr-defined]
+            except AttributeError:
+                pass
+        raise
+
+
+def failed_stage(exc: BaseException) -> str:
+    """The stage ``exc`` was tagged with, or ``"unknown"``."""
+    return getattr(exc, "stage", None) or "unknown"
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Timeouts, connection errors and retryable HTTP statuses."""
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (TimeoutError, requests.RequestException))
+
+
+class RetryBudget:
+    """Token bucket shared by all workers: each retry takes a token."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._spent = 0
+        self._denied = 0
+        self._lock = threading.Lock()
+
+    def configure(self, capacity: float, refill_per_second: float) -> None:
+        with self._lock:
+            self._refill()
+            self.capacity = capacity
+            self.refill_per_second = refill_per_second
+            self._tokens = min(self._tokens, capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.refill_per_second)
+        self._stamp = now
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                self._denied += 1
+                return False
+            self._tokens -= 1
+            self._spent += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self._tokens, 2), "retries": self._spent, "denied": self._denied}
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        *,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        budget: Optional[RetryBudget] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._rng = rng or random.Random()
+
+    def next_delay(self, previous: float) -> float:
+        """Decorrelated jitter: uniform between the base and 3x the previous delay, capped."""
+        upper = max(self.base_delay, previous * 3)
+        return min(self.max_delay, self._rng.uniform(self.base_delay, upper))
+
+    def run(
+        self,
+        call: Callable[[], T],
+        cancel_event: Optional[threading.Event] = None,
+        on_retry: Optional[Callable[[BaseException, str, float], None]] = None,
+    ) -> T:
+        """Run ``call``, retrying transient failures.
+
+        Each stage gets ``max_attempts`` tries. ``on_retry(error, stage, delay)`` is
+        called before each wait; the wait ends early on ``cancel_event``.
+        """
+        attempts: dict[str, int] = {}
+        delay = self.base_delay  # so even the first retry is spread over [base, 3 * base]
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+            try:
+                return call()
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                where = failed_stage(e)
+                attempts[where] = attempts.get(where, 0) + 1
+                if attempts[where] >= self.max_attempts:
+                    raise
+                if self.budget is not None and not self.budget.try_spend():
+                    raise
+                delay = self.next_delay(delay)
+                if on_retry is not None:
+                    on_retry(e, where, delay)
+                if cancel_event is None:
+                    time.sleep(delay)
+                elif cancel_event.wait(delay):
+                    raise CancelledError() from e
+
+
+_shared: Optional[RetryBudget] = None
+_shared_lock = threading.Lock()
+
+
+def shared_retry_budget(capacity: float, refill_per_second: float) -> Optional[RetryBudget]:
+    """The process-wide retry budget (None when ``capacity`` is 0 = unlimited)."""
+    global _shared
+    if capacity <= 0:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = RetryBudget(capacity, refill_per_second)
+        else:
+            _shared.configure(capacity, refill_per_second)
+        return _shared
@@ -0,0 +1,144 @@
+"""In-process stand-in for a ComfyUI server, shared by the ComfyUI backend tests."""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+OBJECT_INFO = {
+    "LoadImage": {},
+    "KSampler": {"input": {"required": {"sampler_name": [["euler"], {}], "scheduler": [["normal"], {}]}}},
+    "VAEEncode": {},
+    "VAEDecode": {},
+    "DualCLIPLoader": {
+        "input": {
+            "required": {
+                "clip_name1": [["clip_l.safetensors"], {}],
+                "clip_name2": [["t5xxl_fp8_e4m3fn.safetensors"], {}],
+                "type": [["flux"], {}],
+            }
+        }
+    },
+    "UNETLoader": {"input": {"required": {"unet_name": [["flux1-fill-dev.safetensors"], {}], "weight_dtype": [["default"], {}]}}},
+}
+
+LOADERS = {"UNETLoader", "DualCLIPLoader", "VAELoader"}
+
+
+class ComfyStub:
+    """Just enough of the ComfyUI HTTP API to queue prompts and serve their outputs.
+
+    The history lists one output per image in the prompt's batch: every LoadImage,
+    times the RepeatImageBatch amount. Execution messages are simulated too: each
+    sampling step takes ``step_ms``, and the first prompt after start (or after
+    ``loaded`` is cleared, as on a restart) spends ``load_ms`` loading models and
+    does not report its loader nodes as cached.
+
+    With ``hold`` set, new prompts stay in ``/queue`` (the first running, the rest
+    pending) and have no history until they are deleted or interrupted, which
+    ``deleted`` and ``interrupted`` record.
+    """
+
+    def __init__(self, *, load_ms: int = 5000, step_ms: int = 100) -> None:
+        self.uploads = 0
+        self.upload_names: list[str] = []
+        self.hold = False
+        self.held: list[str] = []
+        self.deleted: list[str] = []
+        self.interrupted: list[str] = []
+        self.prompts: list[dict[str, Any]] = []
+        self.messages: list[list[Any]] = []
+        self.loaded = False
+        self.load_ms = load_ms
+        self.step_ms = step_ms
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, body: Any, raw: bytes | None = None) -> None:
+                payload = raw if raw is not None else json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                if url.path == "/system_stats":
+                    self._send({"devices": [{"vram_total": 24 << 30, "vram_free": 20 << 30}]})
+                elif url.path == "/object_info":
+                    self._send(OBJECT_INFO)
+                elif url.path == "/queue":
+                    items = [[n, pid, {}, {}, []] for n, pid in enumerate(stub.held)]
+                    self._send({"queue_running": items[:1], "queue_pending": items[1:]})
+                elif url.path.startswith("/history/"):
+                    prompt_id = url.path.rsplit("/", 1)[1]
+                    if prompt_id in stub.held:
+                        self._send({})
+                        return
+                    wf = stub.prompts[int(prompt_id)]
+                    loads = sum(1 for n in wf.values() if n.get("class_type") == "LoadImage")
+                    repeat = next((n["inputs"]["amount"] for n in wf.values() if n.get("class_type") == "RepeatImageBatch"), 1)
+                    images = [{"filename": f"out{k}.png", "subfolder": "", "type": "output"} for k in range(loads * repeat)]
+                    status = {"status_str": "success", "completed": True, "messages": stub.messages[int(prompt_id)]}
+                    self._send({prompt_id: {"status": status, "outputs": {"11": {"images": images}}}})
+                elif url.path == "/view":
+                    self._send(None, raw=parse_qs(url.query)["filename"][0].encode())
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path == "/upload/image":
+                    stub.uploads += 1
+                    stub.upload_names.append(re.search(rb'filename="([^"]+)"', body).group(1).decode())
+                    self._send({"name": f"in{stub.uploads}.png"})
+                elif self.path == "/prompt":
+                    wf = json.loads(body)["prompt"]
+                    stub.prompts.append(wf)
+                    stub.messages.append(stub._execute(wf))
+                    prompt_id = str(len(stub.prompts) - 1)
+                    if stub.hold:
+                        stub.held.append(prompt_id)
+                    self._send({"prompt_id": prompt_id})
+                elif self.path == "/queue":
+                    for prompt_id in json.loads(body).get("delete", []):
+                        stub.held.remove(prompt_id)
+                        stub.deleted.append(prompt_id)
+                    self._send({})
+                elif self.path == "/interrupt":
+                    prompt_id = json.loads(body)["prompt_id"]
+                    stub.held.remove(prompt_id)
+                    stub.interrupted.append(prompt_id)
+                    self._send({})
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _execute(self, wf: dict[str, Any]) -> list[list[Any]]:
+        steps = sum(n["inputs"].get("steps", 0) for n in wf.values() if n.get("class_type") == "KSampler")
+        loaders = [k for k, n in wf.items() if n.get("class_type") in LOADERS]
+        elapsed = steps * self.step_ms + (0 if self.loaded else self.load_ms)
+        cached = loaders if self.loaded else []
+        self.loaded = True
+        start = 1_700_000_000_000
+        return [
+            ["execution_start", {"timestamp": start}],
+            ["execution_cached", {"nodes": cached, "timestamp": start}],
+            ["execution_success", {"timestamp": start + elapsed}],
+        ]
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
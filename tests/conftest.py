@@ -5,5 +5,17 @@ Adds parent directory to sys.path for module imports
 import sys
 import os
 
+import pytest
+
 # Add parent directory to path for importing project modules
 sys.path.insert(0, os.path.dirname(__file__) + '/..')
+
+
+@pytest.fixture
+def comfy():
+    """A running :class:`comfy_stub.ComfyStub`."""
+    from comfy_stub import ComfyStub
+
+    stub = ComfyStub()
+    yield stub
+    stub.close()
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any
 
+import pytest
+
 from outpaint_config import OutpaintConfig
 from outpaint_generator import default_config_dict
 
@@ -58,10 +60,10 @@ def test_comfyui_check_available_ok(monkeypatch) -> None:
             return _Resp(200, {"devices": [{"vram_total": 16 * 1024 * 1024 * 1024}]})
         raise AssertionError(url)
 
-    monkeypatch.setattr("backends.comfyui_backend.requests.get", fake_get)
     monkeypatch.setattr(ComfyUIOutpaintBackend, "_get_object_info", lambda self: info)
 
     b = ComfyUIOutpaintBackend(base_url="http://127.0.0.1:8188", workflow_path="comfyui_workflows/flux_outpaint.json")
+    monkeypatch.setattr(b.session, "get", fake_get)
     ok, _msg = b.check_available()
     assert ok is True
 
@@ -89,10 +91,163 @@ def test_comfyui_check_available_low_vram(monkeypatch) -> None:
             return _Resp(200, {"devices": [{"vram_total": 4 * 1024 * 1024 * 1024}]})
         raise AssertionError(url)
 
-    monkeypatch.setattr("backends.comfyui_backend.requests.get", fake_get)
     monkeypatch.setattr(ComfyUIOutpaintBackend, "_get_object_info", lambda self: info)
 
     b = ComfyUIOutpaintBackend(base_url="http://127.0.0.1:8188", workflow_path="comfyui_workflows/flux_outpaint.json")
+    monkeypatch.setattr(b.session, "get", fake_get)
     ok, msg = b.check_available()
     assert ok is False
     assert "VRAM" in msg
+
+
+class _StubBackend:
+    def __init__(self, *, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    def outpaint(self, image_path: str, **kwargs: Any) -> list[bytes]:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("ComfyUI not reachable")
+        return [b"ok"]
+
+
+def _outpaint_kwargs() -> dict[str, Any]:
+    return {
+        "zoom_out_percentage": 0,
+        "expand_left": 1,
+        "expand_right": 1,
+        "expand_top": 1,
+        "expand_bottom": 1,
+        "num_images": 1,
+        "prompt": "",
+        "output_format": "png",
+        "enable_safety_checker": True,
+    }
+
+
+def test_backend_factory_routes_comfyui_with_falai_key() -> None:
+    from backends.router import BackendRouter
+
+    d = default_config_dict()
+    d.update({"backend": "comfyui", "falai_api_key": "x"})
+    cfg = OutpaintConfig.model_validate(d)
+    b = get_backend(cfg)
+    assert isinstance(b, BackendRouter)
+    assert [c.name for c in b.candidates] == ["comfyui", "falai"]
+
+
+def test_router_fails_over_and_prefers_healthy_backend() -> None:
+    from backends.router import BackendRouter, RouteCandidate
+
+    comfy = _StubBackend(fail=True)
+    fal = _StubBackend()
+    router = BackendRouter(
+        [
+            RouteCandidate(name="comfyui", backend=comfy),  # type: ignore[arg-type]
+            RouteCandidate(name="falai", backend=fal, cost_per_image=0.035),  # type: ignore[arg-type]
+        ],
+        max_cost_per_image=None,
+    )
+
+    assert router.outpaint("in.png", **_outpaint_kwargs()) == [b"ok"]
+    assert router.last_backend_name == "falai"
+    assert router.stats()["comfyui"]["failure_rate"] == 1.0
+
+    # Second job goes straight to the healthy backend.
+    router.outpaint("in.png", **_outpaint_kwargs())
+    assert comfy.calls == 1
+    assert fal.calls == 2
+
+
+def test_router_keeps_over_budget_backend_for_failover_only() -> None:
+    from backends.router import BackendRouter, RouteCandidate
+
+    comfy = _StubBackend()
+    fal = _StubBackend()
+    router = BackendRouter(
+        [
+            RouteCandidate(name="comfyui", backend=comfy, prior_latency=600.0),  # type: ignore[arg-type]
+            RouteCandidate(name="falai", backend=fal, cost_per_image=0.035, prior_latency=10.0),  # type: ignore[arg-type]
+        ],
+        max_cost_per_image=0.0,
+        allow_paid_failover=True,
+    )
+
+    assert [c.name for c in router.rank()] == ["comfyui", "falai"]
+    router.outpaint("in.png", **_outpaint_kwargs())
+    assert comfy.calls == 1 and fal.calls == 0
+
+
+def test_router_never_fails_over_to_paid_backend_by_default() -> None:
+    from backends.router import BackendRouter, RouteCandidate
+
+    d = default_config_dict()
+    d.update({"backend": "comfyui", "falai_api_key": "x"})
+    assert OutpaintConfig.model_validate(d).routing.allow_paid_failover is False
+
+    comfy = _StubBackend(fail=True)
+    fal = _StubBackend()
+    router = BackendRouter(
+        [
+            RouteCandidate(name="comfyui", backend=comfy),  # type: ignore[arg-type]
+            RouteCandidate(name="falai", backend=fal, cost_per_image=0.035),  # type: ignore[arg-type]
+        ],
+        max_cost_per_image=0.0,
+    )
+    try:
+        assert [c.name for c in router.rank()] == ["comfyui"]
+        with pytest.raises(RuntimeError, match="not reachable"):
+            router.outpaint("in.png", **_outpaint_kwargs())
+        assert fal.calls == 0
+
+        router.allow_paid_failover = True
+        messages: list[tuple[str, str]] = []
+        router.outpaint("in.png", **_outpaint_kwargs(), progress_callback=lambda m, lvl: messages.append((m, lvl)))
+        assert fal.calls == 1
+        assert any("Paid failover to falai" in m and lvl == "warning" for m, lvl in messages)
+    finally:
+        router.close()
+
+
+def test_circuit_breaker_opens_and_recovers_through_probe() -> None:
+    from backends.circuit_breaker import CircuitBreaker
+    from backends.router import BackendRouter, RouteCandidate
+
+    class _Probed(_StubBackend):
+        healthy = False
+
+        def check_available(self) -> tuple[bool, str]:
+            return self.healthy, "probe"
+
+    comfy = _Probed(fail=True)
+    fal = _StubBackend()
+    router = BackendRouter(
+        [
+            RouteCandidate(name="comfyui", backend=comfy, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=3600)),  # type: ignore[arg-type]
+            RouteCandidate(name="falai", backend=fal, cost_per_image=0.035),  # type: ignore[arg-type]
+        ],
+        max_cost_per_image=0.0,
+        allow_paid_failover=True,
+        probe_interval=3600,
+    )
+    try:
+        for _ in range(3):
+            router.outpaint("in.png", **_outpaint_kwargs())
+        # Two failures open the circuit; the third job skips ComfyUI entirely.
+        assert comfy.calls == 2
+        assert router.stats()["comfyui"]["circuit"] == "open"
+
+        router.probe_once()
+        assert router.stats()["comfyui"]["circuit"] == "open"
+
+        comfy.healthy = True
+        comfy.fail = False
+        router.probe_once()
+        assert router.stats()["comfyui"]["circuit"] == "half_open"
+
+        router.outpaint("in.png", **_outpaint_kwargs())
+        assert router.last_backend_name == "comfyui"
+        assert router.stats()["comfyui"]["circuit"] == "closed"
+    finally:
+        router.close()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import copy
+import io
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from PIL import Image
+
+from comfy_stub import ComfyStub
+from backends.comfyui_backend import _load_workflow, stack_load_images
+from backends.comfyui_pool import ComfyUIPoolBackend
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict, group_same_size
+
+WORKFLOW = "comfyui_workflows/flux_outpaint.json"
+
+
+def _sources(tmp_path: Path, sizes: list[tuple[int, int]]) -> list[str]:
+    paths = []
+    for i, size in enumerate(sizes):
+        p = tmp_path / f"in{i}.png"
+        Image.new("RGB", size, (i * 40, 0, 0)).save(p)
+        paths.append(str(p))
+    return paths
+
+
+def _kwargs(num_images: int) -> dict[str, Any]:
+    return {
+        "zoom_out_percentage": 0,
+        "expand_left": 8,
+        "expand_right": 8,
+        "expand_top": 0,
+        "expand_bottom": 0,
+        "num_images": num_images,
+        "prompt": "",
+        "output_format": "png",
+        "enable_safety_checker": False,
+    }
+
+
+def test_stack_load_images_feeds_the_batch_to_every_image_consumer() -> None:
+    wf = copy.deepcopy(_load_workflow(WORKFLOW))
+    stack_load_images(wf, ["b.png", "c.png"], repeat=2)
+
+    loads = [k for k, n in wf.items() if n["class_type"] == "LoadImage"]
+    assert [wf[k]["inputs"]["image"] for k in loads] == ["", "b.png", "c.png"]
+    repeat_id = next(k for k, n in wf.items() if n["class_type"] == "RepeatImageBatch")
+    assert wf[repeat_id]["inputs"]["amount"] == 2
+    # The pad node now reads [a, b, c] repeated, built as ImageBatch(ImageBatch(a, b), c).
+    assert wf["2"]["inputs"]["image"] == [repeat_id, 0]
+    outer = wf[wf[repeat_id]["inputs"]["image"][0]]
+    inner = wf[outer["inputs"]["image1"][0]]
+    assert inner["inputs"]["image1"] == ["1", 0]
+    assert [inner["inputs"]["image2"][0], outer["inputs"]["image2"][0]] == loads[1:]
+
+
+def test_pool_outpaint_batch_returns_outputs_per_input(comfy: ComfyStub, tmp_path: Path) -> None:
+    paths = _sources(tmp_path, [(16, 16)] * 3)
+    pool = ComfyUIPoolBackend([comfy.url], WORKFLOW)
+
+    out = pool.outpaint_batch(paths, **_kwargs(num_images=2))
+
+    # One prompt for all three inputs; outputs come back [a, b, c, a, b, c].
+    assert comfy.uploads == 3 and len(comfy.prompts) == 1
+    assert out == [[b"out0.png", b"out3.png"], [b"out1.png", b"out4.png"], [b"out2.png", b"out5.png"]]
+    assert comfy.prompts[0]["8"]["inputs"]["batch_size"] == 1
+
+    # The single-image path goes through the same dispatch.
+    assert pool.outpaint(paths[0], **_kwargs(num_images=1)) == [b"out0.png"]
+    assert all(s["assigned"] == 0 for s in pool.stats().values())
+
+
+def test_group_same_size_keeps_consecutive_runs(monkeypatch, tmp_path: Path) -> None:
+    paths = _sources(tmp_path, [(16, 16), (16, 16), (16, 16), (20, 16), (16, 16)])
+    # Sizes come from the header probe; nothing is opened with PIL.
+    monkeypatch.setattr("outpaint_generator.Image.open", lambda *a, **k: pytest.fail("decoded an input"))
+    assert list(group_same_size([*paths, str(tmp_path / "missing.png")], 2)) == [
+        paths[:2],
+        [paths[2]],
+        [paths[3]],
+        [paths[4]],
+        [str(tmp_path / "missing.png")],
+    ]
+
+
+class _BatchingBackend:
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+        self.singles: list[str] = []
+
+    @staticmethod
+    def _png() -> bytes:
+        buf = io.BytesIO()
+        Image.new("RGB", (24, 24), (0, 255, 0)).save(buf, format="PNG")
+        return buf.getvalue()
+
+    def outpaint(self, image_path: str, **kwargs: Any) -> list[bytes]:
+        self.singles.append(image_path)
+        return [self._png()]
+
+    def outpaint_batch(self, image_paths: list[str], **kwargs: Any) -> list[list[bytes]]:
+        self.batches.append(list(image_paths))
+        return [[self._png()] for _ in image_paths]
+
+
+def test_iter_generate_batches_same_size_inputs(tmp_path: Path) -> None:
+    paths = _sources(tmp_path, [(16, 16), (16, 16), (16, 16), (20, 16), (16, 16)])
+    d = default_config_dict()
+    d.update({"backend": "comfyui", "use_source_folder": True, "comfyui_batch_size": 3})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d), backend=_BatchingBackend())  # type: ignore[arg-type]
+    backend = gen.backend
+
+    outcomes = list(gen.iter_generate(paths, max_workers=1))
+
+    assert sorted(o.source_path for o in outcomes) == sorted(paths)
+    assert all(o.result is not None and Path(o.result.output_paths[0]).exists() for o in outcomes)
+    assert backend.batches == [paths[:3]]  # type: ignore[attr-defined]
+    assert backend.singles == paths[3:]  # type: ignore[attr-defined]
+
+
+def test_failed_batch_falls_back_to_single_images(tmp_path: Path) -> None:
+    class _Broken(_BatchingBackend):
+        def outpaint_batch(self, image_paths: list[str], **kwargs: Any) -> list[list[bytes]]:
+            raise RuntimeError("ImageBatch node missing")
+
+    paths = _sources(tmp_path, [(16, 16)] * 2)
+    d = default_config_dict()
+    d.update({"backend": "comfyui", "use_source_folder": True, "comfyui_batch_size": 4})
+    backend = _Broken()
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d), backend=backend)  # type: ignore[arg-type]
+
+    results = gen.generate_batch([*paths, str(tmp_path / "missing.png")])
+
+    assert [r.source_path for r in results[:2]] == paths  # type: ignore[union-attr]
+    assert isinstance(results[2], ValueError)
+    assert backend.singles == paths
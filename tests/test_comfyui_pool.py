@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+
+from backends import JobHandle
+from backends.comfyui_pool import ComfyUIPoolBackend
+
+
+def _stub(depth: int, vram_free: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path == "/queue":
+                body = {"queue_running": [[0, "r", {}, {}, []]] * min(depth, 1), "queue_pending": [[i, f"p{i}"] for i in range(max(0, depth - 1))]}
+            elif self.path == "/system_stats":
+                body = {"devices": [{"name": "cuda:0", "vram_total": 24 << 30, "vram_free": vram_free}]}
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def stubs():
+    servers: list[ThreadingHTTPServer] = []
+
+    def make(depth: int, vram_free: int) -> str:
+        s = _stub(depth, vram_free)
+        servers.append(s)
+        return f"http://127.0.0.1:{s.server_address[1]}"
+
+    yield make
+    for s in servers:
+        s.shutdown()
+        s.server_close()
+
+
+def _dead_url() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def _fake_jobs(pool: ComfyUIPoolBackend, release: threading.Event) -> list[str]:
+    ran: list[str] = []
+    lock = threading.Lock()
+    for inst in pool._instances:
+
+        def outpaint(image_path: str, *, _url: str = inst.url, **kwargs: Any) -> list[bytes]:
+            with lock:
+                ran.append(_url)
+            release.wait(5)
+            return [b"x"]
+
+        inst.backend.outpaint = outpaint  # type: ignore[method-assign]
+    return ran
+
+
+def _call(pool: ComfyUIPoolBackend, job: JobHandle | None = None) -> list[bytes]:
+    return pool.outpaint(
+        "in.png",
+        zoom_out_percentage=0,
+        expand_left=8,
+        expand_right=8,
+        expand_top=0,
+        expand_bottom=0,
+        num_images=1,
+        prompt="",
+        output_format="png",
+        enable_safety_checker=False,
+        job=job,
+    )
+
+
+def test_dispatches_to_least_loaded_instance(stubs) -> None:
+    busy, idle_small, idle_big = stubs(3, 20 << 30), stubs(0, 4 << 30), stubs(0, 16 << 30)
+    pool = ComfyUIPoolBackend([busy, idle_small, idle_big], "wf.json")
+    release = threading.Event()
+    ran = _fake_jobs(pool, release)
+
+    threads = [threading.Thread(target=_call, args=(pool,)) for _ in range(3)]
+    for started, t in enumerate(threads, start=1):
+        t.start()
+        while len(ran) < started:  # dispatch one at a time so the order is deterministic
+            time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    # Idle servers first (more free VRAM wins the tie), then spread by our own in-flight count.
+    assert ran[:2] == [idle_big, idle_small]
+    assert ran[2] in (idle_big, idle_small)
+    assert all(s["assigned"] == 0 for s in pool.stats().values())
+
+
+def test_unreachable_instance_is_skipped(stubs) -> None:
+    dead = _dead_url()
+    live = stubs(5, 1 << 30)
+    pool = ComfyUIPoolBackend([dead, live], "wf.json")
+    release = threading.Event()
+    release.set()
+    ran = _fake_jobs(pool, release)
+
+    _call(pool)
+    assert ran == [live]
+    assert pool.queue_depth() == 5
+
+
+def test_pool_depth_is_total_for_router(stubs) -> None:
+    from backends.router import BackendRouter, RouteCandidate
+
+    urls = [stubs(8, 1 << 30) for _ in range(4)]
+    pool = ComfyUIPoolBackend(urls, "wf.json")
+    assert pool.queue_depth() == 32
+
+    # The router spreads the total over the four servers: 8 each, not 8 / 4.
+    cand = RouteCandidate(name="comfyui", backend=pool, parallelism=len(urls), prior_latency=10.0)
+    router = BackendRouter([cand])
+    assert router._score(cand) == pytest.approx(10.0 * (1 + 8))
+
+
+def test_resumed_job_stays_on_its_instance(stubs) -> None:
+    a, b = stubs(0, 8 << 30), stubs(9, 1 << 30)
+    pool = ComfyUIPoolBackend([a, b], "wf.json")
+    release = threading.Event()
+    release.set()
+    ran = _fake_jobs(pool, release)
+
+    _call(pool, JobHandle({"backend": "comfyui", "prompt_id": "p1", "base_url": b}))
+    assert ran == [b]
+
+
+def test_concurrent_picks_probe_each_instance_once(stubs) -> None:
+    url = stubs(2, 8 << 30)
+    pool = ComfyUIPoolBackend([url], "wf.json")
+    inst = pool._instances[0]
+    probes: list[int] = []
+    gate = threading.Event()
+    real_depth = inst.backend.queue_depth
+
+    def slow_depth() -> int | None:
+        probes.append(1)
+        gate.wait(5)
+        return real_depth()
+
+    inst.backend.queue_depth = slow_depth  # type: ignore[method-assign]
+    threads = [threading.Thread(target=pool.queue_depth) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert len(probes) == 1
+    assert pool.stats()[url]["queue_depth"] == 2 and pool.stats()[url]["reachable"]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+from PIL import Image
+
+from backends.comfyui_backend import ComfyUIOutpaintBackend, execution_timing
+from comfy_stub import ComfyStub
+
+WORKFLOW = "comfyui_workflows/flux_outpaint.json"
+
+
+@pytest.fixture(autouse=True)
+def _fast_polling(monkeypatch) -> None:
+    monkeypatch.setattr("backends.comfyui_backend.time.sleep", lambda s: None)
+
+
+def _run(backend: ComfyUIOutpaintBackend, src: str, messages: list[tuple[str, str]] | None = None) -> list[bytes]:
+    return backend.outpaint(
+        src,
+        zoom_out_percentage=0,
+        expand_left=8,
+        expand_right=8,
+        expand_top=0,
+        expand_bottom=0,
+        num_images=1,
+        prompt="",
+        output_format="png",
+        enable_safety_checker=False,
+        progress_callback=(lambda m, lvl: messages.append((m, lvl))) if messages is not None else None,
+    )
+
+
+def _src(tmp_path: Path) -> str:
+    p = tmp_path / "in.png"
+    Image.new("RGB", (16, 16)).save(p)
+    return str(p)
+
+
+def _steps(wf: dict[str, Any]) -> int:
+    return wf["8"]["inputs"]["steps"]
+
+
+def test_execution_timing_reads_history_messages() -> None:
+    prompt = {"1": {"class_type": "UNETLoader"}, "2": {"class_type": "KSampler"}}
+
+    def entry(cached: list[str]) -> dict[str, Any]:
+        messages = [
+            ["execution_start", {"timestamp": 1000}],
+            ["execution_cached", {"nodes": cached, "timestamp": 1000}],
+            ["execution_success", {"timestamp": 3500}],
+        ]
+        return {"status": {"status_str": "success", "messages": messages}}
+
+    assert execution_timing(entry([]), prompt) == (2.5, True)
+    assert execution_timing(entry(["1"]), prompt) == (2.5, False)
+    assert execution_timing({"status": {"messages": []}}, prompt) is None
+
+
+def test_warm_up_runs_first_and_takes_the_model_load(comfy: ComfyStub, tmp_path: Path) -> None:
+    backend = ComfyUIOutpaintBackend(comfy.url, WORKFLOW, warmup_idle=300)
+    messages: list[tuple[str, str]] = []
+
+    _run(backend, _src(tmp_path), messages)
+
+    # A one-step warm-up goes ahead of the real job and absorbs the 5s load.
+    assert [_steps(wf) for wf in comfy.prompts] == [1, 20]
+    assert backend.timing_stats() == {
+        "runs": 2,
+        "cold_starts": 1,
+        "model_load_seconds": pytest.approx(5.1),
+        "sampling_p50_seconds": 2.0,
+    }
+    assert not any("cold start" in m and lvl == "warning" for m, lvl in messages)
+
+    # Right after a job the server is warm: no second warm-up.
+    _run(backend, _src(tmp_path))
+    assert len(comfy.prompts) == 3
+
+
+def test_idle_server_is_warmed_again(comfy: ComfyStub, tmp_path: Path) -> None:
+    backend = ComfyUIOutpaintBackend(comfy.url, WORKFLOW, warmup_idle=300)
+    _run(backend, _src(tmp_path))
+
+    # Idle past the threshold, and the server dropped its models meanwhile.
+    backend._last_run -= 301
+    comfy.loaded = False
+    _run(backend, _src(tmp_path))
+
+    assert [_steps(wf) for wf in comfy.prompts] == [1, 20, 1, 20]
+    assert backend.timing_stats()["cold_starts"] == 2
+
+
+def test_cold_job_without_warm_up_is_reported(comfy: ComfyStub, tmp_path: Path) -> None:
+    backend = ComfyUIOutpaintBackend(comfy.url, WORKFLOW)
+    messages: list[tuple[str, str]] = []
+
+    _run(backend, _src(tmp_path), messages)
+    _run(backend, _src(tmp_path), messages)
+    comfy.loaded = False  # restart
+    _run(backend, _src(tmp_path), messages)
+
+    assert [_steps(wf) for wf in comfy.prompts] == [20, 20, 20]
+    cold = [m for m, lvl in messages if "cold start" in m and lvl == "warning"]
+    # The first cold run has no warm baseline to split against; the restart does.
+    assert cold == ["ComfyUI cold start: models loaded, 7.0s executing", "ComfyUI cold start: ~5.0s loading models, 7.0s executing"]
+    assert backend.timing_stats()["model_load_seconds"] == pytest.approx(5.0)
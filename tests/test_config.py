@@ -18,6 +18,9 @@ def test_config_range_validation() -> None:
     with pytest.raises(ValidationError):
         OutpaintConfig.model_validate({"num_images": 9})
 
+    with pytest.raises(ValidationError):
+        OutpaintConfig.model_validate({"comfyui_batch_size": 0})
+
 
 def test_collect_errors_requires_api_key_for_falai() -> None:
     cfg = OutpaintConfig.model_validate({"backend": "falai", "falai_api_key": ""})
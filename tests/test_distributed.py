@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+
+import requests
+
+from distributed import CoordinatorClient, CoordinatorServer, LeaseQueue, run_worker
+
+
+def test_expired_lease_is_reclaimed() -> None:
+    now = [0.0]
+    q = LeaseQueue(["a.png"], lease_seconds=10, clock=lambda: now[0])
+
+    first = q.lease("w1")
+    assert first is not None and first["path"] == "a.png"
+    assert q.lease("w2") is None
+    assert not q.finished
+
+    now[0] = 11.0  # w1 died without heartbeating
+    second = q.lease("w2")
+    assert second is not None and second["id"] == first["id"]
+    assert q.complete(first["id"], "w1", ok=True) is None  # stale lease is rejected
+    assert q.complete(second["id"], "w2", ok=True) == "a.png"
+    assert q.finished
+    assert q.stats()["reclaimed"] == 1
+
+
+def test_failed_items_retry_until_max_attempts() -> None:
+    q = LeaseQueue(["bad.png"], max_attempts=2)
+    for _ in range(2):
+        item = q.lease("w")
+        assert item is not None
+        q.complete(item["id"], "w", ok=False)
+    assert q.lease("w") is None
+    assert q.finished
+    assert q.stats()["failed"] == 1
+
+
+def test_workers_drain_queue_over_http() -> None:
+    paths = [f"img{i}.png" for i in range(20)]
+    completed: list[str] = []
+    lock = threading.Lock()
+
+    def on_complete(src: str, ok: bool, outputs: list[str], error: str) -> None:
+        assert ok and outputs == [src + ".out"]
+        with lock:
+            completed.append(src)
+
+    server = CoordinatorServer(LeaseQueue(paths, lease_seconds=30), on_complete=on_complete).start()
+    try:
+        def generate(path: str) -> SimpleNamespace:
+            return SimpleNamespace(output_paths=[path + ".out"])
+
+        results: list[dict] = []
+        nodes = [
+            threading.Thread(
+                target=lambda n=n: results.append(
+                    run_worker(CoordinatorClient(server.url, worker=f"node{n}"), generate, threads=2, poll_interval=0.05)
+                )
+            )
+            for n in range(2)
+        ]
+        for t in nodes:
+            t.start()
+        for t in nodes:
+            t.join(timeout=30)
+
+        assert sorted(completed) == sorted(paths)
+        assert sum(r["done"] for r in results) == len(paths)
+        status = requests.get(f"{server.url}/status", timeout=5).json()
+        assert status["finished"] and status["done"] == len(paths)
+    finally:
+        server.shutdown()
+
+
+def test_retried_failure_is_reported_only_once_settled() -> None:
+    reports: list[tuple[str, bool]] = []
+    server = CoordinatorServer(
+        LeaseQueue(["flaky.png", "bad.png"], lease_seconds=30, max_attempts=2),
+        on_complete=lambda src, ok, outputs, error: reports.append((src, ok)),
+    ).start()
+    attempts: dict[str, int] = {}
+
+    def generate(path: str) -> SimpleNamespace:
+        attempts[path] = attempts.get(path, 0) + 1
+        if path == "bad.png" or attempts[path] == 1:
+            raise RuntimeError("backend hiccup")
+        return SimpleNamespace(output_paths=[path + ".out"])
+
+    try:
+        counts = run_worker(CoordinatorClient(server.url, worker="node"), generate, poll_interval=0.05)
+    finally:
+        server.shutdown()
+
+    assert attempts == {"flaky.png": 2, "bad.png": 2}
+    # flaky.png failed once and then succeeded: one success, no failure on record.
+    assert sorted(reports) == [("bad.png", False), ("flaky.png", True)]
+    assert counts["failed"] == 3
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+from outpaint_gui.folder_ingest import IngestJob
+
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def _run_job(push, *, batch_result: bool = True) -> tuple[list[tuple[str, bool, str]], dict]:
+    batches: list[tuple[str, bool, str]] = []
+    done: dict = {}
+    finished = threading.Event()
+
+    def on_batch(entries):
+        batches.extend(entries)
+        return batch_result
+
+    def on_done(scanned, accepted, cancelled):
+        done.update(scanned=scanned, accepted=accepted, cancelled=cancelled)
+        finished.set()
+
+    job = IngestJob(on_batch=on_batch, on_progress=lambda *_: None, on_done=on_done)
+    push(job)
+    job.start()
+    assert finished.wait(10)
+    return batches, done
+
+
+def test_ingest_streams_validated_entries() -> None:
+    batches, done = _run_job(lambda job: job.add_folder(str(FIXTURES)))
+
+    by_name = {Path(p).name: ok for p, ok, _msg in batches}
+    assert by_name["gradient_512.png"] is True
+    assert by_name["corrupt.png"] is False
+    assert done["scanned"] == len(batches)
+    assert done["cancelled"] is False
+
+
+def test_ingest_stops_when_queue_full(monkeypatch) -> None:
+    monkeypatch.setattr(IngestJob, "BATCH_SIZE", 1)
+    batches, done = _run_job(lambda job: job.add_folder(str(FIXTURES)), batch_result=False)
+    assert len(batches) == 1
+    assert done["scanned"] == 1
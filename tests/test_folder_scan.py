@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from folder_scan import scan_image_files
+
+
+def _touch(p: Path) -> None:
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(b"")
+
+
+@pytest.fixture()
+def tree(tmp_path: Path) -> Path:
+    for rel in (
+        "a.png",
+        "notes.txt",
+        "shots/b.JPG",
+        "shots/raw/c.tif",
+        "shots/raw/skip_me.png",
+        "other/d.webp",
+        "other/deep/er/e.png",
+    ):
+        _touch(tmp_path / rel)
+    return tmp_path
+
+
+def _names(paths) -> set[str]:
+    return {os.path.basename(p) for p in paths}
+
+
+def test_scan_matches_supported_extensions(tree: Path) -> None:
+    assert _names(scan_image_files(str(tree))) == {"a.png", "b.JPG", "c.tif", "skip_me.png", "d.webp", "e.png"}
+
+
+def test_scan_globs_depth_and_folder_filter(tree: Path) -> None:
+    assert _names(scan_image_files(str(tree), exclude=["skip_*", "deep"])) == {"a.png", "b.JPG", "c.tif", "d.webp"}
+    assert _names(scan_image_files(str(tree), include=["*.png"])) == {"a.png", "skip_me.png", "e.png"}
+    assert _names(scan_image_files(str(tree), max_depth=1)) == {"a.png", "b.JPG", "d.webp"}
+    assert _names(scan_image_files(str(tree), folder_filter_pattern="RAW", folder_match_mode="exact")) == {"c.tif", "skip_me.png"}
+    assert _names(scan_image_files(str(tree), folder_filter_pattern="ee", folder_match_mode="partial")) == {"e.png"}
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink") or os.name == "nt", reason="symlinks need privileges on Windows")
+def test_scan_survives_symlink_loop(tree: Path) -> None:
+    os.symlink(tree, tree / "shots" / "loop", target_is_directory=True)
+    found = list(scan_image_files(str(tree), follow_symlinks=True))
+    assert len(found) == len(set(found)) == 6
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink") or os.name == "nt", reason="symlinks need privileges on Windows")
+def test_scan_keeps_symlinked_files_without_following_dirs(tree: Path) -> None:
+    os.symlink(tree / "a.png", tree / "shots" / "link.png")
+    os.symlink(tree / "shots", tree / "linked_dir", target_is_directory=True)
+    names = _names(scan_image_files(str(tree)))
+    assert "link.png" in names
+    assert len(list(scan_image_files(str(tree)))) == 7
@@ -25,8 +25,10 @@ class FakeBackend:
         enable_safety_checker: bool,
         progress_callback=None,
         cancel_event=None,
+        prepared_image=None,
+        job=None,
     ) -> list[bytes]:
-        _ = (image_path, zoom_out_percentage, expand_left, expand_right, expand_top, expand_bottom, prompt, output_format, enable_safety_checker, cancel_event)
+        _ = (image_path, zoom_out_percentage, expand_left, expand_right, expand_top, expand_bottom, prompt, output_format, enable_safety_checker, cancel_event, prepared_image, job)
         outs: list[bytes] = []
         for _i in range(num_images):
             img = Image.new("RGB", (32, 24), (10, 20, 30))
@@ -68,3 +70,83 @@ def test_generator_writes_numbered_outputs(tmp_path: Path) -> None:
     r2 = gen.generate(str(src))
     assert all(Path(p).exists() for p in r2.output_paths)
     assert any(Path(p).stem.endswith("_2") for p in r2.output_paths)
+
+
+class ProxyBackend:
+    """Returns a flat blue canvas sized to the (proxy) input plus expansion."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[tuple[int, int], tuple[int, int, int, int]]] = []
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        prepared = kwargs["prepared_image"]
+        expand = (kwargs["expand_left"], kwargs["expand_right"], kwargs["expand_top"], kwargs["expand_bottom"])
+        self.calls.append((prepared.size, expand))
+        w, h = prepared.size
+        img = Image.new("RGB", (w + expand[0] + expand[1], h + expand[2] + expand[3]), (0, 0, 255))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return [buf.getvalue()]
+
+
+def test_proxy_mode_downscales_and_restores_original(tmp_path: Path) -> None:
+    src = tmp_path / "big.png"
+    Image.new("RGB", (1200, 600), (255, 0, 0)).save(src, format="PNG")
+
+    d = default_config_dict()
+    d.update(
+        {
+            "falai_api_key": "x",
+            "expand_mode": "pixels",
+            "expand_left": 200,
+            "expand_right": 200,
+            "expand_top": 100,
+            "expand_bottom": 0,
+            "proxy": {"enabled": True, "max_side": 300, "feather": 8},
+        }
+    )
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    backend = ProxyBackend()
+    gen._backend = backend  # type: ignore[attr-defined]
+
+    result = gen.generate(str(src))
+
+    assert backend.calls == [((300, 150), (50, 50, 25, 0))]
+    with Image.open(result.output_paths[0]) as out:
+        assert out.size == (1600, 700)
+        assert out.getpixel((800, 400)) == (255, 0, 0)  # original, full resolution
+        assert out.getpixel((800, 699)) == (255, 0, 0)  # bottom was not expanded: no feather
+        assert out.getpixel((200, 400))[2] > 200  # left seam fades into the border
+        assert out.getpixel((50, 50)) == (0, 0, 255)  # generated border
+
+
+def test_iter_generate_pulls_paths_lazily(tmp_path: Path) -> None:
+    sources = []
+    for i in range(12):
+        p = tmp_path / f"in{i}.png"
+        Image.new("RGB", (16, 16), (i, 0, 0)).save(p)
+        sources.append(str(p))
+    sources.append(str(tmp_path / "missing.png"))
+
+    d = default_config_dict()
+    d.update({"falai_api_key": "x", "use_source_folder": True})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    gen._backend = FakeBackend()  # type: ignore[attr-defined]
+
+    pulled = 0
+
+    def lazy():
+        nonlocal pulled
+        for s in sources:
+            pulled += 1
+            yield s
+
+    stream = gen.iter_generate(lazy(), max_workers=2, window=3)
+    first = next(stream)
+    assert first.duration >= 0
+    assert pulled <= 4  # the window, plus one refill after the first completion
+
+    outcomes = [first, *stream]
+    assert len(outcomes) == 13
+    assert sum(o.result is not None for o in outcomes) == 12
+    assert [o.source_path for o in outcomes if o.error is not None] == sources[-1:]
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from image_probe import probe_image, sniff_format
+from outpaint_config import validate_input_image
+
+
+@pytest.mark.parametrize(
+    "fmt, ext, save_kwargs",
+    [
+        ("PNG", "png", {}),
+        ("JPEG", "jpg", {}),
+        ("JPEG", "jpg", {"progressive": True, "icc_profile": b"x" * 70_000}),
+        ("WEBP", "webp", {"lossless": True}),
+        ("WEBP", "webp", {"quality": 80}),
+        ("BMP", "bmp", {}),
+        ("TIFF", "tif", {"compression": "tiff_lzw"}),
+    ],
+)
+def test_probe_matches_pil(tmp_path: Path, fmt: str, ext: str, save_kwargs: dict) -> None:
+    p = tmp_path / f"img.{ext}"
+    Image.new("RGB", (1237, 711), (1, 2, 3)).save(p, format=fmt, **save_kwargs)
+
+    header = probe_image(str(p))
+    assert header is not None
+    assert header.size == (1237, 711)
+    assert header.format == sniff_format(p.read_bytes()[:16])
+
+
+def test_probe_cache_invalidates_on_change(tmp_path: Path) -> None:
+    p = tmp_path / "img.png"
+    Image.new("RGB", (10, 10)).save(p)
+    assert probe_image(str(p)).size == (10, 10)  # type: ignore[union-attr]
+
+    Image.new("RGB", (20, 30)).save(p)
+    assert probe_image(str(p)).size == (20, 30)  # type: ignore[union-attr]
+
+
+def test_validate_falls_back_to_pil_for_unknown_header() -> None:
+    ok, msg, size = validate_input_image(str(Path(__file__).parent / "fixtures" / "invalid" / "corrupt.png"))
+    assert ok is False
+    assert "Cannot read image" in msg
+    assert size is None
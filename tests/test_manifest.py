@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+from pathlib import Path
+
+from PIL import Image
+
+from backends import JobHandle
+from backends.falai_backend import FalAIOutpaintBackend
+from manifest import RunManifest, output_params
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict
+
+
+def _png(color: tuple[int, int, int] = (0, 0, 255)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (20, 20), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class RecordingBackend:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+        self.resumed: list[dict] = []
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        job: JobHandle = kwargs["job"]
+        data = job.resume("fake")
+        if data is not None:
+            self.resumed.append(data)
+        else:
+            job.submitted("fake", request_id=f"req-{len(self.calls)}")
+        self.calls.append(Path(image_path).name)
+        return [_png()]
+
+
+def _generator(tmp_path: Path, **overrides) -> tuple[OutpaintGenerator, RecordingBackend, dict]:
+    d = default_config_dict()
+    d.update({"falai_api_key": "x", "output_folder": str(tmp_path / "out"), "use_source_folder": False, **overrides})
+    cfg = OutpaintConfig.model_validate(d)
+    gen = OutpaintGenerator(cfg)
+    backend = RecordingBackend()
+    gen._backend = backend  # type: ignore[attr-defined]
+    return gen, backend, output_params(cfg.model_dump())
+
+
+def _sources(tmp_path: Path, count: int) -> list[str]:
+    paths = []
+    for i in range(count):
+        p = tmp_path / f"src{i}.png"
+        Image.new("RGB", (16, 16), (i * 20, 0, 0)).save(p)
+        paths.append(str(p))
+    return paths
+
+
+def test_rerun_skips_completed_inputs(tmp_path: Path) -> None:
+    sources = _sources(tmp_path, 3)
+    log = tmp_path / "run.jsonl"
+
+    gen, backend, params = _generator(tmp_path)
+    with RunManifest(str(log), params) as m:
+        first = list(gen.iter_generate(sources, max_workers=2, manifest=m))
+    assert len(backend.calls) == 3
+    assert not any(o.from_manifest for o in first)
+
+    # A touched file with unchanged content is still recognised by its hash.
+    os.utime(sources[0], ns=(1, 1))
+    gen, backend, params = _generator(tmp_path)
+    with RunManifest(str(log), params) as m:
+        second = list(gen.iter_generate(sources, max_workers=2, manifest=m))
+    assert backend.calls == []
+    assert all(o.from_manifest for o in second)
+    assert {o.source_path for o in second} == set(sources)
+
+    # Different parameters are a different run.
+    gen, backend, params = _generator(tmp_path, prompt="beach")
+    with RunManifest(str(log), params) as m:
+        list(gen.iter_generate(sources, max_workers=2, manifest=m))
+    assert len(backend.calls) == 3
+
+
+def test_changed_output_location_or_name_is_not_done(tmp_path: Path) -> None:
+    sources = _sources(tmp_path, 2)
+    log = tmp_path / "run.jsonl"
+
+    gen, backend, params = _generator(tmp_path)
+    with RunManifest(str(log), params) as m:
+        list(gen.iter_generate(sources, manifest=m))
+
+    for overrides in ({"output_folder": str(tmp_path / "elsewhere")}, {"output_suffix": "-wide"}, {"use_source_folder": True}):
+        gen, backend, params = _generator(tmp_path, **overrides)
+        with RunManifest(str(log), params) as m:
+            outcomes = list(gen.iter_generate(sources, manifest=m))
+        assert len(backend.calls) == 2, overrides
+        assert not any(o.from_manifest for o in outcomes)
+
+
+def test_in_flight_job_is_resumed(tmp_path: Path) -> None:
+    (src,) = _sources(tmp_path, 1)
+    log = tmp_path / "run.jsonl"
+
+    gen, backend, params = _generator(tmp_path)
+    with RunManifest(str(log), params) as m:
+        m.record_submitted(src, {"backend": "fake", "request_id": "req-crashed"})
+
+    with RunManifest(str(log), params) as m:
+        (outcome,) = gen.iter_generate([src], manifest=m)
+    assert outcome.result is not None
+    assert backend.resumed == [{"backend": "fake", "request_id": "req-crashed"}]
+
+    records = [json.loads(line) for line in log.read_text(encoding="utf-8").splitlines()]
+    assert [r["status"] for r in records] == ["submitted", "done"]
+    assert records[-1]["outputs"] == outcome.result.output_paths
+
+
+def test_falai_resume_polls_without_resubmitting(monkeypatch) -> None:
+    class _Resp:
+        def __init__(self, payload: object = None, content: bytes = b"") -> None:
+            self.status_code = 200
+            self._payload = payload
+            self.content = content
+
+        def raise_for_status(self) -> None:
+            pass
+
+        def json(self) -> object:
+            return self._payload
+
+    def fake_get(url: str, **kwargs) -> _Resp:
+        if url == "https://queue.invalid/status":
+            return _Resp({"status": "COMPLETED", "images": [{"url": "https://cdn.invalid/out.png"}]})
+        return _Resp(content=b"image-bytes")
+
+    def no_post(*args, **kwargs):
+        raise AssertionError("resumed job must not upload or submit")
+
+    monkeypatch.setattr("backends.falai_backend.time.sleep", lambda s: None)
+
+    backend = FalAIOutpaintBackend(api_key="k")
+    monkeypatch.setattr(backend.session, "get", fake_get)
+    monkeypatch.setattr(backend.session, "post", no_post)
+    job = JobHandle({"backend": "falai", "request_id": "r1", "status_url": "https://queue.invalid/status"})
+    out = backend.outpaint(
+        "unused.png",
+        zoom_out_percentage=0,
+        expand_left=0,
+        expand_right=0,
+        expand_top=0,
+        expand_bottom=0,
+        num_images=1,
+        prompt="",
+        output_format="png",
+        enable_safety_checker=False,
+        job=job,
+    )
+    assert out == [b"image-bytes"]
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from memory_budget import ByteBudget, format_memory_stats
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict
+
+
+def test_acquire_blocks_until_release() -> None:
+    budget = ByteBudget(100)
+    budget.acquire(80)
+    acquired = threading.Event()
+
+    def second() -> None:
+        budget.acquire(50)
+        acquired.set()
+
+    t = threading.Thread(target=second)
+    t.start()
+    time.sleep(0.1)
+    assert not acquired.is_set()
+
+    budget.release(80)
+    t.join(timeout=2)
+    assert acquired.is_set()
+    stats = budget.stats()
+    assert stats["in_flight_bytes"] == 50
+    assert stats["peak_in_flight_bytes"] == 80
+    assert stats["waits"] == 1
+
+
+def test_oversized_request_passes_when_idle() -> None:
+    budget = ByteBudget(10)
+    budget.acquire(500)
+    assert budget.used == 500
+    budget.adjust(-600)
+    assert budget.used == 0
+
+
+class ChargingBackend:
+    def __init__(self, budget: ByteBudget) -> None:
+        self.budget = budget
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        outputs = []
+        for _ in range(kwargs["num_images"]):
+            buf = io.BytesIO()
+            Image.new("RGB", (40, 40), (0, 0, 255)).save(buf, format="PNG")
+            data = buf.getvalue()
+            self.budget.acquire(len(data))
+            outputs.append(data)
+        return outputs
+
+
+def test_generator_releases_written_outputs(tmp_path: Path) -> None:
+    src = tmp_path / "in.png"
+    Image.new("RGB", (32, 32), (255, 0, 0)).save(src)
+
+    d = default_config_dict()
+    d.update({"falai_api_key": "x", "num_images": 3, "expand_mode": "pixels", "expand_left": 8})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    budget = ByteBudget(1024 * 1024)
+    gen._backend = ChargingBackend(budget)  # type: ignore[attr-defined]
+    gen._budget = budget  # type: ignore[attr-defined]
+
+    result = gen.generate(str(src))
+
+    assert len(result.output_paths) == 3
+    stats = gen.memory_stats()
+    assert stats["in_flight_bytes"] == 0
+    assert stats["peak_in_flight_bytes"] > 0
+    assert format_memory_stats(stats).startswith("Memory: peak in-flight")
+
+
+def test_failed_tile_releases_siblings_still_running(tmp_path: Path, monkeypatch) -> None:
+    import outpaint_generator
+
+    monkeypatch.setattr(outpaint_generator, "MAX_IMAGE_PIXELS", 100 * 100)
+    src = tmp_path / "big.png"
+    Image.new("RGB", (200, 200), (255, 0, 0)).save(src)
+
+    class FailingTile(ChargingBackend):
+        calls = 0
+
+        def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+            FailingTile.calls += 1
+            if FailingTile.calls == 1:
+                time.sleep(0.1)  # let the sibling tile start first
+                raise ValueError("bad tile")
+            time.sleep(0.3)  # still downloading when the first tile fails
+            return super().outpaint(image_path, **kwargs)
+
+    d = default_config_dict()
+    d.update(
+        {
+            "falai_api_key": "x",
+            "expand_mode": "pixels",
+            "expand_left": 64,
+            "expand_right": 64,
+            "tiling": {"enabled": True, "tile_size": 256, "overlap": 16, "context": 32, "workers": 4},
+        }
+    )
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    budget = ByteBudget(1024 * 1024)
+    gen._backend = FailingTile(budget)  # type: ignore[attr-defined]
+    gen._budget = budget  # type: ignore[attr-defined]
+
+    with pytest.raises(ValueError, match="bad tile"):
+        gen.generate(str(src))
+    assert FailingTile.calls > 1
+    assert budget.used == 0
+
+
+def _png(size: int = 40) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), (0, 0, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _Download:
+    def __init__(self, data: bytes) -> None:
+        self.content = data
+        self.headers = {"Content-Length": str(len(data))}
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_workers_holding_part_of_their_outputs_do_not_deadlock(tmp_path: Path) -> None:
+    from memory_budget import download
+
+    data = _png()
+    both_hold_one = threading.Barrier(2, timeout=5)
+
+    class DownloadingBackend:
+        def __init__(self, budget: ByteBudget) -> None:
+            self.budget = budget
+            self.session = type("Session", (), {"get": staticmethod(lambda url, **kw: _Download(data))})()
+
+        def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+            outputs = [download("https://cdn.invalid/0.png", self.budget, session=self.session)]
+            # Both workers now hold one output each and fetch the next with the budget nearly full.
+            both_hold_one.wait()
+            for k in range(1, kwargs["num_images"]):
+                outputs.append(download(f"https://cdn.invalid/{k}.png", self.budget, session=self.session))
+            return outputs
+
+    sources = []
+    for i in range(2):
+        p = tmp_path / f"in{i}.png"
+        Image.new("RGB", (32, 32), (i, 0, 0)).save(p)
+        sources.append(str(p))
+    d = default_config_dict()
+    d.update({"falai_api_key": "x", "num_images": 2, "expand_mode": "pixels", "expand_left": 8, "use_source_folder": True})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    budget = ByteBudget(len(data) * 5 // 2)
+    gen._backend = DownloadingBackend(budget)  # type: ignore[attr-defined]
+    gen._budget = budget  # type: ignore[attr-defined]
+
+    outcomes: list = []
+    runner = threading.Thread(target=lambda: outcomes.extend(gen.iter_generate(sources, max_workers=2)), daemon=True)
+    runner.start()
+    runner.join(10)
+    stuck = budget.stats() if runner.is_alive() else None
+    if stuck:
+        budget.set_limit(1 << 40)  # unblock them so the test can fail instead of hang
+        runner.join(5)
+
+    assert stuck is None, f"workers stuck with {stuck}"
+    assert all(o.result is not None and len(o.result.output_paths) == 2 for o in outcomes)
+    assert budget.used == 0
+
+
+def test_tiled_canvas_stops_charging_pasted_first_phase_tiles(tmp_path: Path, monkeypatch) -> None:
+    import outpaint_generator
+
+    monkeypatch.setattr(outpaint_generator, "MAX_IMAGE_PIXELS", 100 * 100)
+    src = tmp_path / "big.png"
+    Image.new("RGB", (200, 200), (255, 0, 0)).save(src)
+
+    class RecordingBackend(ChargingBackend):
+        def __init__(self, budget: ByteBudget) -> None:
+            super().__init__(budget)
+            self.used_at_call: list[tuple[int, int]] = []
+
+        def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+            self.used_at_call.append((kwargs["num_images"], self.budget.used))
+            return super().outpaint(image_path, **kwargs)
+
+    d = default_config_dict()
+    d.update(
+        {
+            "falai_api_key": "x",
+            "num_images": 2,
+            "expand_mode": "pixels",
+            **{f"expand_{side}": 300 for side in ("left", "right", "top", "bottom")},
+            "tiling": {"enabled": True, "tile_size": 256, "overlap": 16, "context": 32, "workers": 1},
+        }
+    )
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    budget = ByteBudget(1024 * 1024)
+    backend = RecordingBackend(budget)
+    gen._backend = backend  # type: ignore[attr-defined]
+    gen._budget = budget  # type: ignore[attr-defined]
+
+    gen.generate(str(src))
+
+    first_phase = [used for n, used in backend.used_at_call if n == 2]
+    later = [used for n, used in backend.used_at_call if n == 1]
+    assert len(first_phase) > 1 and later
+    # The last variant's ring phases start with nothing charged: its own first-phase
+    # tiles were released once pasted, and so were the earlier variant's.
+    assert min(later) == 0
+    assert budget.used == 0
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from output_writer import ENCODER_PROFILES, EncodePool, encode_image, write_output
+
+FIXTURES = Path(__file__).parent / "fixtures" / "valid"
+
+
+def _encoded(fmt: str, mode: str = "RGB") -> bytes:
+    buf = io.BytesIO()
+    Image.new(mode, (16, 12), (200, 10, 10, 255)[: len(mode)]).save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_matching_bytes_are_written_verbatim(tmp_path: Path) -> None:
+    data = _encoded("PNG")
+    target = tmp_path / "out.png"
+
+    assert write_output(data, target, "png") is False
+    assert target.read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ["out.png"]
+
+
+def test_mismatched_bytes_are_reencoded(tmp_path: Path) -> None:
+    target = tmp_path / "out.jpeg"
+
+    assert write_output(_encoded("PNG", "RGBA"), target, "jpeg") is True
+    with Image.open(target) as img:
+        assert img.format == "JPEG"
+        assert img.size == (16, 12)
+    assert [p.name for p in tmp_path.iterdir()] == ["out.jpeg"]
+
+
+def test_failed_reencode_leaves_no_partial_file(tmp_path: Path) -> None:
+    target = tmp_path / "out.webp"
+    with pytest.raises(OSError):
+        write_output(b"not an image", target, "webp")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_encode_pool_reencodes_in_worker_process(tmp_path: Path) -> None:
+    pool = EncodePool(1)
+    try:
+        png = tmp_path / "a.png"
+        assert pool.write(_encoded("PNG"), png, "png") is False
+
+        webp = tmp_path / "b.webp"
+        assert pool.write(_encoded("PNG", "RGBA"), webp, "webp") is True
+    finally:
+        pool.shutdown()
+
+    with Image.open(webp) as img:
+        assert img.format == "WEBP"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.png", "b.webp"]
+
+
+@pytest.mark.parametrize("fmt", ["png", "jpeg", "webp"])
+def test_encoder_profiles(fmt: str) -> None:
+    with Image.open(FIXTURES / "gradient_512.png") as img:
+        img.load()
+        sizes = {}
+        for profile in ENCODER_PROFILES:
+            buf = io.BytesIO()
+            encode_image(img, buf, fmt, profile)
+            with Image.open(io.BytesIO(buf.getvalue())) as out:
+                assert out.format == {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}[fmt]
+                assert out.size == img.size
+            sizes[profile] = buf.tell()
+
+    if fmt == "png":
+        assert sizes["archive"] <= sizes["balanced"] <= sizes["fast"]
+
+
+def test_archive_jpeg_falls_back_on_incompressible_content() -> None:
+    with Image.open(FIXTURES / "noise_512.png") as img:
+        buf = io.BytesIO()
+        encode_image(img, buf, "jpeg", "archive")
+    with Image.open(io.BytesIO(buf.getvalue())) as out:
+        assert out.format == "JPEG"
+        assert out.size == (512, 512)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+from PIL import Image
+
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict
+from pipeline import SubmitPipeline
+
+
+class QueueingBackend:
+    """Remote queue stub: submit() only enqueues, outpaint(job=...) waits for the GPU."""
+
+    def __init__(self) -> None:
+        self.submitted: list[str] = []
+        self.gpu = threading.Event()
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.max_queued = 0
+
+    def submit(self, image_path: str, **kwargs) -> None:
+        with self.lock:
+            self.submitted.append(image_path)
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            kwargs["job"].submitted("fake", request_id=str(len(self.submitted)))
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        assert kwargs["job"].data, "collect must poll the queued job, not resubmit"
+        self.gpu.wait(5)
+        with self.lock:
+            self.queued -= 1
+        buf = io.BytesIO()
+        Image.new("RGB", (24, 24), (0, 0, 255)).save(buf, format="PNG")
+        return [buf.getvalue()]
+
+
+def _setup(tmp_path: Path, count: int, **pipeline) -> tuple[OutpaintGenerator, QueueingBackend, list[str]]:
+    sources = []
+    for i in range(count):
+        p = tmp_path / f"in{i}.png"
+        Image.new("RGB", (16, 16), (i, 0, 0)).save(p)
+        sources.append(str(p))
+    d = default_config_dict()
+    d.update({"falai_api_key": "x", "use_source_folder": True, "pipeline": {"enabled": True, **pipeline}})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    backend = QueueingBackend()
+    gen._backend = backend  # type: ignore[attr-defined]
+    return gen, backend, sources
+
+
+def test_pipeline_queues_ahead_of_collection(tmp_path: Path) -> None:
+    gen, backend, sources = _setup(tmp_path, 6)
+    pipe = SubmitPipeline(gen, depth=4, submitters=2, collectors=1)
+    try:
+        futures = [pipe.put(p) for p in sources[:4]]
+        deadline = time.monotonic() + 5
+        while len(backend.submitted) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # All four are queued remotely although only one collector is waiting on results.
+        assert len(backend.submitted) == 4
+        assert not pipe.has_room()
+
+        backend.gpu.set()
+        results = [f.result(timeout=5) for f in futures]
+        assert all(Path(r.output_paths[0]).exists() for r in results)
+        assert pipe.in_flight == 0
+    finally:
+        pipe.shutdown()
+
+
+def test_iter_generate_uses_pipeline(tmp_path: Path) -> None:
+    gen, backend, sources = _setup(tmp_path, 6, depth=3, collectors=1)
+    backend.gpu.set()
+
+    outcomes = list(gen.iter_generate(sources, max_workers=1))
+
+    assert sorted(o.source_path for o in outcomes) == sorted(sources)
+    assert all(o.result is not None for o in outcomes)
+    assert sorted(backend.submitted) == sorted(sources)
+
+
+def test_pipeline_never_queues_more_than_depth(tmp_path: Path) -> None:
+    gen, backend, sources = _setup(tmp_path, 6)
+    pipe = SubmitPipeline(gen, depth=3, submitters=6, collectors=6)
+    try:
+        futures = [pipe.put(p) for p in sources]
+        time.sleep(0.5)
+        assert len(backend.submitted) == 3
+
+        backend.gpu.set()
+        assert all(f.result(timeout=5).output_paths for f in futures)
+        assert backend.max_queued == 3
+    finally:
+        pipe.shutdown()
+
+
+def test_iter_generate_bounds_remote_queue_to_depth(tmp_path: Path) -> None:
+    gen, backend, sources = _setup(tmp_path, 8, depth=3, collectors=1)
+    outcomes: list = []
+    runner = threading.Thread(target=lambda: outcomes.extend(gen.iter_generate(sources, max_workers=1)))
+    runner.start()
+    time.sleep(0.5)
+    assert backend.queued == 3
+    backend.gpu.set()
+    runner.join(10)
+
+    assert len(outcomes) == 8
+    assert backend.max_queued <= 3
+
+
+def test_router_can_pipeline_and_pins_job_to_its_backend(tmp_path: Path) -> None:
+    from backends import JobHandle
+    from backends.router import BackendRouter, RouteCandidate
+
+    class Named(QueueingBackend):
+        def __init__(self, name: str) -> None:
+            super().__init__()
+            self.name = name
+
+        def submit(self, image_path: str, **kwargs) -> None:
+            super().submit(image_path, **kwargs)
+            kwargs["job"].submitted(self.name, request_id="r")
+
+        def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+            assert kwargs["job"].resume(self.name), "collected on the backend that queued it"
+            return super().outpaint(image_path, **kwargs)
+
+    comfy, fal = Named("comfyui"), Named("falai")
+    comfy.gpu.set()
+    router = BackendRouter(
+        [
+            RouteCandidate(name="comfyui", backend=comfy),  # type: ignore[arg-type]
+            RouteCandidate(name="falai", backend=fal, cost_per_image=0.035),  # type: ignore[arg-type]
+        ],
+        max_cost_per_image=0.0,
+    )
+    gen, _backend, sources = _setup(tmp_path, 2)
+    gen._backend = router  # type: ignore[attr-defined]
+    assert gen.can_pipeline()
+
+    job = JobHandle()
+    pending = gen.submit(sources[0], job=job)
+    assert pending.queued and job.data["backend"] == "comfyui"
+    assert gen.collect(pending).output_paths
+    assert comfy.submitted == [sources[0]] and fal.submitted == []
+
+
+def test_shutdown_cancels_jobs_left_in_the_remote_queue(tmp_path: Path) -> None:
+    class Cancellable(QueueingBackend):
+        def __init__(self) -> None:
+            super().__init__()
+            self.cancelled: list[str] = []
+
+        def cancel(self, job) -> bool:
+            self.cancelled.append(job.data["request_id"])
+            return True
+
+    gen, _backend, sources = _setup(tmp_path, 4)
+    backend = Cancellable()
+    gen._backend = backend  # type: ignore[attr-defined]
+    pipe = SubmitPipeline(gen, depth=4, submitters=4, collectors=1)
+    futures = [pipe.put(p) for p in sources]
+    deadline = time.monotonic() + 5
+    while len(backend.submitted) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    pipe.shutdown(wait=False)
+    backend.gpu.set()  # let the one collector that already picked a job finish
+
+    outcomes = []
+    for f in futures:
+        try:
+            outcomes.append(f.result(timeout=5))
+        except CancelledError:
+            outcomes.append(None)
+    # The collector holds one job; the ones it never reached are cancelled remotely.
+    assert outcomes.count(None) >= 3
+    assert len(backend.cancelled) == outcomes.count(None)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from backends.falai_backend import FalAIOutpaintBackend
+from prepared_image import PreparedImage
+
+
+def test_size_from_header_without_decoding(tmp_path: Path) -> None:
+    p = tmp_path / "img.png"
+    Image.new("RGBA", (40, 30)).save(p)
+
+    prepared = PreparedImage.from_path(str(p))
+    assert prepared.size == (40, 30)
+    assert prepared.format == "png"
+    assert prepared._image is None
+    assert prepared.mode == "RGBA"
+    assert prepared._image is None
+
+
+def test_upload_jpeg_flattens_alpha_and_is_cached(tmp_path: Path) -> None:
+    p = tmp_path / "img.png"
+    Image.new("RGBA", (50, 20), (255, 0, 0, 0)).save(p)
+
+    prepared = PreparedImage.from_path(str(p))
+    first = prepared.upload_jpeg()
+    assert prepared.upload_jpeg() is first
+
+    with Image.open(io.BytesIO(first)) as out:
+        assert out.format == "JPEG"
+        assert out.mode == "RGB"
+        assert out.size == (50, 20)
+        r, g, b = out.getpixel((25, 10))
+        assert min(r, g, b) > 240  # transparent pixels land on white
+
+
+def test_large_jpeg_uses_draft_decode(tmp_path: Path) -> None:
+    p = tmp_path / "big.jpg"
+    Image.new("RGB", (2000, 1000), (9, 9, 9)).save(p, quality=80)
+
+    prepared = PreparedImage.from_path(str(p))
+    payload = prepared.upload_jpeg(max_side=400)
+
+    # draft() decodes at 1/4 scale (500x250) before the final thumbnail.
+    assert prepared.reduced(400).size == (500, 250)
+    assert prepared.image().size == (2000, 1000)
+    with Image.open(io.BytesIO(payload)) as out:
+        assert out.size == (400, 200)
+
+
+def test_in_memory_upload_file_is_png() -> None:
+    prepared = PreparedImage.from_image(Image.new("RGB", (8, 8)), name="stage.jpg")
+    assert prepared.in_memory
+    filename, payload = prepared.upload_file()
+    assert filename == "stage.png"
+    assert payload.startswith(b"\x89PNG")
+
+
+def test_falai_upload_reuses_prepared_payload(tmp_path: Path, monkeypatch) -> None:
+    p = tmp_path / "img.png"
+    Image.new("RGB", (16, 16)).save(p)
+    prepared = PreparedImage.from_path(str(p))
+
+    encodes = 0
+    real = PreparedImage.upload_jpeg
+
+    def counting(self, **kwargs):
+        nonlocal encodes
+        if not self._jpeg_cache:
+            encodes += 1
+        return real(self, **kwargs)
+
+    class _Resp:
+        status_code = 200
+
+        def raise_for_status(self) -> None:
+            pass
+
+        def json(self) -> dict:
+            return {"status_code": 200, "image": {"url": "https://example.invalid/x.jpg"}}
+
+    monkeypatch.setattr(PreparedImage, "upload_jpeg", counting)
+
+    backend = FalAIOutpaintBackend(api_key="k")
+    monkeypatch.setattr(backend.session, "post", lambda *a, **k: _Resp())
+    backend._upload_to_freeimage(str(p), None, prepared)
+    backend._upload_to_freeimage(str(p), None, prepared)
+    assert encodes == 1
+
+
+def test_comfyui_upload_names_are_unique_per_content(comfy, tmp_path: Path) -> None:
+    from backends.comfyui_backend import ComfyUIOutpaintBackend
+
+    backend = ComfyUIOutpaintBackend(comfy.url, "comfyui_workflows/flux_outpaint.json")
+    for folder, color in (("a", (255, 0, 0)), ("b", (0, 255, 0)), ("c", (255, 0, 0))):
+        (tmp_path / folder).mkdir()
+        Image.new("RGB", (16, 16), color).save(tmp_path / folder / "photo.png")
+        backend._upload_image(str(tmp_path / folder / "photo.png"), None)
+    red, green = (PreparedImage.from_image(Image.new("RGB", (8, 8), c), name="photo_tile0x0.png") for c in ("red", "green"))
+    backend._upload_image("photo.png", None, red)
+    backend._upload_image("photo.png", None, green)
+
+    a, b, c, tile_red, tile_green = comfy.upload_names
+    # Same name in another folder no longer overwrites; identical bytes share a name.
+    assert a != b and a == c and a.startswith("photo-") and a.endswith(".png")
+    assert tile_red != tile_green and tile_red.startswith("photo_tile0x0-")
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict
+from progressive import split_rings
+
+
+def test_split_rings_sums_to_total() -> None:
+    rings = split_rings((100, 0, 31, 7), 3)
+    assert len(rings) == 3
+    assert tuple(sum(r[i] for r in rings) for i in range(4)) == (100, 0, 31, 7)
+    assert split_rings((2, 0, 0, 0), 4) == [(1, 0, 0, 0), (1, 0, 0, 0)]
+
+
+class StageBackend:
+    """Grows the input by the requested ring; fails once on the configured call."""
+
+    def __init__(self, fail_on_call: int = 0) -> None:
+        self.calls: list[tuple[tuple[int, int], int]] = []
+        self.fail_on_call = fail_on_call
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        prepared = kwargs["prepared_image"]
+        self.calls.append((prepared.size, kwargs["num_images"]))
+        if len(self.calls) == self.fail_on_call:
+            raise RuntimeError("remote limit")
+        w, h = prepared.size
+        size = (w + kwargs["expand_left"] + kwargs["expand_right"], h + kwargs["expand_top"] + kwargs["expand_bottom"])
+        outs = []
+        for _ in range(kwargs["num_images"]):
+            buf = io.BytesIO()
+            Image.new("RGB", size, (0, 128, 0)).save(buf, format="PNG")
+            outs.append(buf.getvalue())
+        return outs
+
+
+def _generator(tmp_path: Path, backend: StageBackend) -> OutpaintGenerator:
+    d = default_config_dict()
+    d.update(
+        {
+            "falai_api_key": "x",
+            "expand_mode": "percentage",
+            "expand_percentage": 60,
+            "num_images": 2,
+            "progressive": {"enabled": True, "stages": 3, "cache_dir": str(tmp_path / "cache")},
+        }
+    )
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    gen._backend = backend  # type: ignore[attr-defined]
+    return gen
+
+
+def test_progressive_chains_stages_and_resumes_from_cache(tmp_path: Path) -> None:
+    src = tmp_path / "in.png"
+    Image.new("RGB", (100, 50), (255, 0, 0)).save(src)
+
+    failing = StageBackend(fail_on_call=3)
+    with pytest.raises(RuntimeError):
+        _generator(tmp_path, failing).generate(str(src))
+    # Stages 1 and 2 ran with a single output each; stage 3 failed.
+    assert failing.calls == [((100, 50), 1), ((140, 70), 1), ((180, 90), 2)]
+
+    retry = StageBackend()
+    result = _generator(tmp_path, retry).generate(str(src))
+    assert retry.calls == [((180, 90), 2)]
+    assert len(result.output_paths) == 2
+    with Image.open(result.output_paths[0]) as out:
+        assert out.size == (220, 110)
+    assert not any((tmp_path / "cache").iterdir())
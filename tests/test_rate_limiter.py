@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import CancelledError
+from email.utils import formatdate
+from typing import Any
+
+import pytest
+import requests
+
+from backends import JobHandle
+from backends.falai_backend import FalAIOutpaintBackend
+from backends.rate_limiter import RateLimiter, retry_after_seconds
+
+
+def _response(status: int, retry_after: str | None = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    if retry_after is not None:
+        resp.headers["Retry-After"] = retry_after
+    return resp
+
+
+def test_bucket_paces_requests_after_the_burst() -> None:
+    limiter = RateLimiter({"status": 20.0}, burst=2)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.wait("status")
+    elapsed = time.monotonic() - started
+
+    # Two go out at once, the other four at 20/s.
+    assert 0.15 <= elapsed < 0.5
+    stats = limiter.stats()["status"]
+    assert stats["waits"] == 4 and stats["wait_seconds"] == pytest.approx(elapsed, abs=0.05)
+    # Other endpoint classes are unaffected.
+    assert limiter.wait("upload") == 0
+
+
+def test_429_slows_and_pauses_every_worker() -> None:
+    limiter = RateLimiter({"submit": 10.0}, burst=10)
+    limiter.observe("submit", _response(429, retry_after="0.3"))
+    assert limiter.stats()["submit"]["rate"] == 5.0
+
+    waited: list[float] = []
+    workers = [threading.Thread(target=lambda: waited.append(limiter.wait("submit"))) for _ in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(5)
+    assert len(waited) == 3 and min(waited) >= 0.25
+
+    for _ in range(20):
+        limiter.observe("submit", _response(200))
+    assert limiter.stats()["submit"] == {"rate": 10.0, "waits": 3, "wait_seconds": pytest.approx(sum(waited), abs=0.05), "throttled": 1}
+
+
+def test_wait_ends_on_cancel() -> None:
+    limiter = RateLimiter({})
+    limiter.observe("status", _response(429, retry_after="30"))
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+
+    started = time.monotonic()
+    with pytest.raises(CancelledError):
+        limiter.wait("status", stop)
+    assert time.monotonic() - started < 2
+
+
+def test_retry_after_forms() -> None:
+    assert retry_after_seconds(_response(429, "7")) == 7.0
+    assert retry_after_seconds(_response(429, formatdate(time.time() + 20, usegmt=True))) == pytest.approx(20, abs=2)
+    assert retry_after_seconds(_response(429, "soon")) is None
+    assert retry_after_seconds(_response(429)) is None
+    assert retry_after_seconds(_response(429, "86400")) == 300.0
+
+
+class _Resp:
+    def __init__(self, status: int = 200, payload: Any = None, content: bytes = b"", headers: dict | None = None) -> None:
+        self.status_code = status
+        self._payload = payload
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return self._payload
+
+
+def test_fal_poll_429_waits_on_the_limiter_not_a_fixed_sleep(monkeypatch) -> None:
+    sleeps: list[float] = []
+    monkeypatch.setattr("backends.falai_backend.time.sleep", sleeps.append)
+    polls = iter(
+        [
+            _Resp(429, headers={"Retry-After": "0.2"}),
+            _Resp(payload={"status": "COMPLETED", "images": [{"url": "https://cdn.invalid/out.png"}]}),
+        ]
+    )
+
+    def get(url: str, **kwargs: Any) -> _Resp:
+        return next(polls) if url == "https://queue.invalid/status" else _Resp(content=b"image-bytes")
+
+    limiter = RateLimiter({"status": 5.0})
+    backend = FalAIOutpaintBackend(api_key="k", limiter=limiter)
+    monkeypatch.setattr(backend.session, "get", get)
+    job = JobHandle({"backend": "falai", "request_id": "r1", "status_url": "https://queue.invalid/status"})
+    messages: list[str] = []
+
+    out = backend.outpaint(
+        "unused.png",
+        zoom_out_percentage=0,
+        expand_left=0,
+        expand_right=0,
+        expand_top=0,
+        expand_bottom=0,
+        num_images=1,
+        prompt="",
+        output_format="png",
+        enable_safety_checker=False,
+        progress_callback=lambda m, lvl: messages.append(m),
+        job=job,
+    )
+
+    assert out == [b"image-bytes"]
+    assert 30 not in sleeps
+    stats = backend.rate_limit_stats()
+    assert stats["status"]["throttled"] == 1 and stats["status"]["wait_seconds"] >= 0.15
+    assert stats["download"]["throttled"] == 0
+    assert "fal.ai rate limit hit; slowing down" in messages
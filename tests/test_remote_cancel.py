@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import CancelledError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from PIL import Image
+
+from backends import JobHandle
+from backends.comfyui_backend import ComfyUIOutpaintBackend
+from backends.falai_backend import FalAIOutpaintBackend
+from comfy_stub import ComfyStub
+
+WORKFLOW = "comfyui_workflows/flux_outpaint.json"
+
+KWARGS: dict[str, Any] = {
+    "zoom_out_percentage": 0,
+    "expand_left": 8,
+    "expand_right": 8,
+    "expand_top": 0,
+    "expand_bottom": 0,
+    "num_images": 1,
+    "prompt": "",
+    "output_format": "png",
+    "enable_safety_checker": False,
+}
+
+
+@pytest.fixture
+def src(tmp_path: Path) -> str:
+    p = tmp_path / "in.png"
+    Image.new("RGB", (16, 16)).save(p)
+    return str(p)
+
+
+def _queue(backend: ComfyUIOutpaintBackend, src: str) -> JobHandle:
+    job = JobHandle()
+    backend.submit(src, job=job, **KWARGS)
+    return job
+
+
+def test_comfyui_cancel_deletes_pending_and_interrupts_running(comfy: ComfyStub, src: str) -> None:
+    comfy.hold = True
+    backend = ComfyUIOutpaintBackend(comfy.url, WORKFLOW)
+    running, pending = _queue(backend, src), _queue(backend, src)
+
+    assert backend.cancel(pending)
+    assert backend.cancel(running)
+    assert comfy.deleted == [pending.data["prompt_id"]]
+    assert comfy.interrupted == [running.data["prompt_id"]]
+    # Nothing left to cancel.
+    assert not backend.cancel(running)
+
+
+def test_comfyui_stop_while_waiting_interrupts_the_prompt(comfy: ComfyStub, src: str) -> None:
+    comfy.hold = True
+    backend = ComfyUIOutpaintBackend(comfy.url, WORKFLOW)
+    stop = threading.Event()
+    threading.Timer(0.3, stop.set).start()
+
+    with pytest.raises(CancelledError):
+        backend.outpaint(src, cancel_event=stop, **KWARGS)
+    assert comfy.interrupted == ["0"] and comfy.held == []
+
+
+class FalStub:
+    """fal.ai queue endpoints for one request that never leaves IN_QUEUE."""
+
+    def __init__(self) -> None:
+        self.cancelled: list[str] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, code: int, body: bytes) -> None:
+                self.send_response(code)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                self._send(200, b'{"status": "IN_QUEUE"}')
+
+            def do_PUT(self) -> None:
+                stub.cancelled.append(self.path)
+                self._send(202, b'{"status": "CANCELLATION_REQUESTED"}')
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.status_url = f"http://127.0.0.1:{self.server.server_address[1]}/requests/r1/status"
+
+
+@pytest.fixture
+def fal() -> Iterator[FalStub]:
+    stub = FalStub()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def test_fal_stop_while_waiting_cancels_the_request(fal: FalStub, src: str) -> None:
+    backend = FalAIOutpaintBackend("key")
+    job = JobHandle({"backend": "falai", "request_id": "r1", "status_url": fal.status_url})
+    stop = threading.Event()
+    threading.Timer(0.3, stop.set).start()
+
+    with pytest.raises(CancelledError):
+        backend.outpaint(src, cancel_event=stop, job=job, **KWARGS)
+    assert fal.cancelled == ["/requests/r1/cancel"]
+
+
+def test_fal_cancel_uses_the_recorded_status_url(fal: FalStub) -> None:
+    backend = FalAIOutpaintBackend("key")
+
+    assert backend.cancel(JobHandle({"backend": "falai", "request_id": "r1", "status_url": fal.status_url}))
+    assert not backend.cancel(JobHandle({"backend": "comfyui", "prompt_id": "1"}))
+    assert fal.cancelled == ["/requests/r1/cancel"]
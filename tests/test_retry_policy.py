@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Any
+
+import pytest
+import requests
+from PIL import Image
+
+from backends.falai_backend import FalAIOutpaintBackend
+from outpaint_config import OutpaintConfig
+from outpaint_generator import OutpaintGenerator, default_config_dict
+from retry_policy import RetryBudget, RetryPolicy, failed_stage, stage
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(f"HTTP {status}", response=resp)
+
+
+def _flaky(failures: list[tuple[str, Exception]]):
+    calls: list[int] = []
+
+    def call() -> str:
+        calls.append(1)
+        if failures:
+            where, err = failures.pop(0)
+            with stage(where):
+                raise err
+        return "ok"
+
+    return call, calls
+
+
+def test_decorrelated_jitter_stays_in_bounds_and_spreads_workers() -> None:
+    a = RetryPolicy(base_delay=1.0, max_delay=10.0, rng=random.Random(1))
+    b = RetryPolicy(base_delay=1.0, max_delay=10.0, rng=random.Random(2))
+
+    delay, seen = 1.0, []
+    for _ in range(20):
+        nxt = a.next_delay(delay)
+        assert 1.0 <= nxt <= min(10.0, delay * 3)
+        delay = nxt
+        seen.append(nxt)
+    assert max(seen) > 3  # it backs off
+    # Two workers failing together don't retry together, not even the first time.
+    assert a.next_delay(1.0) != b.next_delay(1.0)
+
+
+def test_attempts_are_counted_per_stage(monkeypatch) -> None:
+    monkeypatch.setattr("retry_policy.time.sleep", lambda s: None)
+    policy = RetryPolicy(max_attempts=2)
+    retried: list[str] = []
+
+    call, calls = _flaky([("upload", TimeoutError()), ("poll", requests.ConnectionError())])
+    assert policy.run(call, on_retry=lambda e, where, d: retried.append(where)) == "ok"
+    assert retried == ["upload", "poll"] and len(calls) == 3
+
+    call, calls = _flaky([("poll", TimeoutError()), ("poll", TimeoutError())])
+    with pytest.raises(TimeoutError) as info:
+        policy.run(call)
+    assert failed_stage(info.value) == "poll" and len(calls) == 2
+
+
+def test_only_retryable_http_statuses_are_retried(monkeypatch) -> None:
+    monkeypatch.setattr("retry_policy.time.sleep", lambda s: None)
+    policy = RetryPolicy()
+
+    call, calls = _flaky([("submit", _http_error(503))])
+    assert policy.run(call) == "ok" and len(calls) == 2
+
+    call, calls = _flaky([("submit", _http_error(422))])
+    with pytest.raises(requests.HTTPError):
+        policy.run(call)
+    assert len(calls) == 1
+
+
+def test_exhausted_budget_fails_fast(monkeypatch) -> None:
+    sleeps: list[float] = []
+    monkeypatch.setattr("retry_policy.time.sleep", sleeps.append)
+    budget = RetryBudget(capacity=1, refill_per_second=0)
+    policy = RetryPolicy(max_attempts=5, budget=budget)
+
+    call, calls = _flaky([("poll", TimeoutError())] * 3)
+    with pytest.raises(TimeoutError):
+        policy.run(call)
+    # One token: one retry, then the next failure is raised without waiting.
+    assert len(calls) == 2 and len(sleeps) == 1
+    assert budget.stats() == {"tokens": 0, "retries": 1, "denied": 1}
+
+
+class _Resp:
+    def __init__(self, payload: Any = None, content: bytes = b"") -> None:
+        self.status_code = 200
+        self._payload = payload
+        self.content = content
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Any:
+        return self._payload
+
+
+def test_generator_retries_only_the_failed_stage(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr("backends.falai_backend.time.sleep", lambda s: None)
+    monkeypatch.setattr("retry_policy.time.sleep", lambda s: None)
+    src = tmp_path / "in.png"
+    Image.new("RGB", (16, 16)).save(src)
+
+    backend = FalAIOutpaintBackend(api_key="k")
+    calls: dict[str, int] = {"upload": 0, "submit": 0, "status": 0}
+    failures = {"submit": 1, "status": 1}
+
+    def fail_once(kind: str) -> None:
+        calls[kind] += 1
+        if failures.get(kind):
+            failures[kind] -= 1
+            raise requests.ConnectionError(f"{kind} dropped")
+
+    def post(url: str, **kwargs: Any) -> _Resp:
+        if "freeimage" in url:
+            calls["upload"] += 1
+            return _Resp({"status_code": 200, "image": {"url": "https://img.invalid/in.jpg"}})
+        fail_once("submit")
+        return _Resp({"request_id": "r1", "status_url": "https://queue.invalid/status"})
+
+    def get(url: str, **kwargs: Any) -> _Resp:
+        if url == "https://queue.invalid/status":
+            fail_once("status")
+            return _Resp({"status": "COMPLETED", "images": [{"url": "https://cdn.invalid/out.png"}]})
+        return _Resp(content=b"image-bytes")
+
+    monkeypatch.setattr(backend.session, "post", post)
+    monkeypatch.setattr(backend.session, "get", get)
+    d = default_config_dict()
+    d.update({"falai_api_key": "k", "retry": {"base_delay": 0.01, "max_delay": 0.01, "budget": 0}})
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d), backend=backend)
+    messages: list[str] = []
+    gen.set_progress_callback(lambda m, lvl: messages.append(m))
+
+    out = gen._outpaint_with_retry(str(src), expand=(8, 8, 0, 0))
+
+    assert out == [b"image-bytes"]
+    # The failed submit reused the upload; the failed poll resumed the queued request.
+    assert calls == {"upload": 1, "submit": 2, "status": 2}
+    assert [m for m in messages if "retrying" in m] == [
+        "Submit failed (ConnectionError); retrying in 0.0s…",
+        "Poll failed (ConnectionError); retrying in 0.0s…",
+    ]
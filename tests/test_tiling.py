@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import io
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import outpaint_generator
+from outpaint_config import OutpaintConfig, check_output_size, validate_input_image
+from outpaint_generator import OutpaintGenerator, default_config_dict
+from tiling import assemble, phases, plan_tiles
+
+
+@pytest.mark.parametrize(
+    "size, expand",
+    [
+        ((1000, 700), (300, 300, 200, 200)),
+        ((2500, 400), (0, 900, 120, 0)),
+        ((300, 3000), (500, 0, 0, 40)),
+        ((600, 500), (300, 300, 250, 250)),
+    ],
+)
+def test_plan_grows_outward_within_tile_size(size: tuple[int, int], expand: tuple[int, int, int, int]) -> None:
+    tiles = plan_tiles(size, expand, tile_size=128, overlap=8, context=32)
+    width, height = size
+    left, right, top, bottom = expand
+    canvas = Image.new("L", (width + left + right, height + top + bottom), 0)
+    canvas.paste(255, (left, top, left + width, top + height))
+
+    for step in phases(tiles):
+        # Every tile continues pixels that exist before its phase starts.
+        for t in step:
+            x0, y0, x1, y1 = t.box
+            cx0, cy0, cx1, cy1 = t.crop
+            assert x0 <= cx0 < cx1 <= x1 and y0 <= cy0 < cy1 <= y1
+            assert canvas.crop(t.crop).getextrema() == (255, 255)
+            assert max(t.size) <= 128
+        for t in step:
+            canvas.paste(255, t.box)
+
+    assert canvas.getextrema() == (255, 255)
+
+
+def test_plan_large_canvas_keeps_tiles_small() -> None:
+    # A big print expanded far beyond one tile: corners must not become one huge job.
+    tiles = plan_tiles((6000, 5000), (3000, 3000, 2500, 2500), tile_size=1024, overlap=64, context=256)
+    assert all(max(t.size) <= 1024 for t in tiles)
+    assert all(t.expand[0] + t.expand[1] <= 1024 - 256 and t.expand[2] + t.expand[3] <= 1024 - 256 for t in tiles)
+    assert len(phases(tiles)) == 8  # four rings of bands + corners
+
+
+def test_assemble_blends_tiles_and_keeps_original() -> None:
+    original = Image.new("RGB", (400, 300), (255, 0, 0))
+    expand = (100, 100, 50, 50)
+    tiles = plan_tiles(original.size, expand, tile_size=256, overlap=32, context=64)
+
+    outputs = []
+    for i, t in enumerate(tiles):
+        buf = io.BytesIO()
+        Image.new("RGB", t.size, (0, 0, 255) if i % 2 else (0, 255, 0)).save(buf, format="PNG")
+        outputs.append(buf.getvalue())
+
+    canvas = assemble(original, expand, tiles, outputs, overlap=32, feather=16)
+    assert canvas.size == (600, 400)
+    assert canvas.getpixel((300, 200)) == (255, 0, 0)
+    assert canvas.getpixel((0, 0)) != (0, 0, 0)  # every border pixel is covered
+
+
+class TileBackend:
+    def __init__(self) -> None:
+        self.sizes: list[tuple[int, int]] = []
+        self.lock = threading.Lock()
+
+    def outpaint(self, image_path: str, **kwargs) -> list[bytes]:
+        prepared = kwargs["prepared_image"]
+        w, h = prepared.size
+        out_w = w + kwargs["expand_left"] + kwargs["expand_right"]
+        out_h = h + kwargs["expand_top"] + kwargs["expand_bottom"]
+        with self.lock:
+            self.sizes.append((out_w, out_h))
+        buf = io.BytesIO()
+        Image.new("RGB", (out_w, out_h), (0, 0, 255)).save(buf, format="PNG")
+        return [buf.getvalue()]
+
+
+def test_generator_tiles_large_canvas(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(outpaint_generator, "MAX_IMAGE_PIXELS", 500 * 500)
+    src = tmp_path / "print.png"
+    Image.new("RGB", (900, 600), (255, 0, 0)).save(src)
+
+    d = default_config_dict()
+    d.update(
+        {
+            "falai_api_key": "x",
+            "expand_mode": "pixels",
+            "expand_left": 300,
+            "expand_right": 300,
+            "expand_top": 100,
+            "expand_bottom": 100,
+            "tiling": {"enabled": True, "tile_size": 256, "overlap": 32, "context": 64, "workers": 3},
+        }
+    )
+    gen = OutpaintGenerator(OutpaintConfig.model_validate(d))
+    backend = TileBackend()
+    gen._backend = backend  # type: ignore[attr-defined]
+
+    result = gen.generate(str(src))
+
+    assert len(backend.sizes) > 4
+    assert all(max(s) <= 256 + 2 * 32 for s in backend.sizes)
+    with Image.open(result.output_paths[0]) as out:
+        assert out.size == (1500, 800)
+        assert out.getpixel((750, 400)) == (255, 0, 0)
+        assert out.getpixel((10, 10)) == (0, 0, 255)
+
+
+def test_tiling_limits(tmp_path: Path) -> None:
+    src = tmp_path / "big.png"
+    Image.new("L", (5000, 4000)).save(src)
+
+    assert validate_input_image(str(src))[0] is False
+    assert validate_input_image(str(src), max_pixels=64_000_000)[0] is True
+    assert check_output_size(10000, 10000, 0, 100, 100, 0, 0)[0] is False
+    assert check_output_size(10000, 10000, 0, 100, 100, 0, 0, max_pixels=250_000_000)[0] == "warning"
@@ -0,0 +1,183 @@
+"""
+Tiled outpainting: plan border tiles and stitch their results.
+
+The border is grown outward from the original in rings, so every tile is
+sent to the backend as "context crop + expand" where the crop is pixels that
+already exist: the original for the first ring, earlier tiles after that.
+Each ring is one phase of side bands (split along their length) followed by
+one phase of corner tiles, which take their context from the bands just
+painted. No tile is larger than ``tile_size`` on either axis, however large
+the canvas. Tiles of one phase are independent and can run in parallel; a
+phase starts once the previous one is pasted. A tile side that lands on
+already-placed pixels is feathered across the overlap, and the original is
+pasted back over the centre last.
+"""
+
+from __future__ import annotations
+
+import io
+import math
+from dataclasses import dataclass
+
+from PIL import Image
+
+from compositing import Expand, feather_mask
+
+Box = tuple[int, int, int, int]  # x0, y0, x1, y1 (exclusive)
+
+
+@dataclass(frozen=True)
+class Tile:
+    box: Box  # canvas coordinates
+    crop: Box  # canvas region sent as context; filled before the tile's phase starts
+    phase: int = 0
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.box[2] - self.box[0], self.box[3] - self.box[1]
+
+    @property
+    def expand(self) -> Expand:
+        """left, right, top, bottom from ``crop`` to ``box``."""
+        x0, y0, x1, y1 = self.box
+        cx0, cy0, cx1, cy1 = self.crop
+        return cx0 - x0, x1 - cx1, cy0 - y0, y1 - cy1
+
+
+def _segments(start: int, end: int, length: int, overlap: int) -> list[tuple[int, int]]:
+    """Split [start, end) into near-equal chunks of at most ``length`` that overlap by ``overlap``."""
+    span = end - start
+    if span <= length:
+        return [(start, end)]
+    step = max(1, length - overlap)
+    count = math.ceil((span - overlap) / step)
+    chunk = math.ceil((span + (count - 1) * overlap) / count)
+    out: list[tuple[int, int]] = []
+    for i in range(count):
+        a = start + i * (chunk - overlap)
+        b = min(end, a + chunk)
+        out.append((a, b))
+    out[-1] = (out[-1][0], end)
+    return out
+
+
+def plan_tiles(
+    size: tuple[int, int],
+    expand: Expand,
+    *,
+    tile_size: int,
+    overlap: int,
+    context: int,
+) -> list[Tile]:
+    """Tiles covering the border, in phase order (see the module docstring)."""
+    width, height = size
+    left, right, top, bottom = expand
+    canvas_w, canvas_h = width + left + right, height + top + bottom
+    ctx = max(1, min(context, tile_size // 2))
+    tiles: list[Tile] = []
+    phase = 0
+    # Region filled so far; grows by up to ``tile_size - context`` per side each ring.
+    x0, y0, x1, y1 = left, top, left + width, top + height
+
+    while (x0, y0, x1, y1) != (0, 0, canvas_w, canvas_h):
+        cx, cy = min(ctx, x1 - x0), min(ctx, y1 - y0)
+        nx0, nx1 = max(0, x0 - (tile_size - cx)), min(canvas_w, x1 + (tile_size - cx))
+        ny0, ny1 = max(0, y0 - (tile_size - cy)), min(canvas_h, y1 + (tile_size - cy))
+
+        for a, b in _segments(y0, y1, tile_size, overlap):
+            if nx0 < x0:
+                tiles.append(Tile((nx0, a, x0 + cx, b), (x0, a, x0 + cx, b), phase))
+            if nx1 > x1:
+                tiles.append(Tile((x1 - cx, a, nx1, b), (x1 - cx, a, x1, b), phase))
+        for a, b in _segments(x0, x1, tile_size, overlap):
+            if ny0 < y0:
+                tiles.append(Tile((a, ny0, b, y0 + cy), (a, y0, b, y0 + cy), phase))
+            if ny1 > y1:
+                tiles.append(Tile((a, y1 - cy, b, ny1), (a, y1 - cy, b, y1), phase))
+        phase += 1
+
+        # Corners continue the side bands just painted, growing vertically from them.
+        corners = []
+        if nx0 < x0 and ny0 < y0:
+            corners.append(Tile((nx0, ny0, x0 + cx, y0 + cy), (nx0, y0, x0 + cx, y0 + cy), phase))
+        if nx1 > x1 and ny0 < y0:
+            corners.append(Tile((x1 - cx, ny0, nx1, y0 + cy), (x1 - cx, y0, nx1, y0 + cy), phase))
+        if nx0 < x0 and ny1 > y1:
+            corners.append(Tile((nx0, y1 - cy, x0 + cx, ny1), (nx0, y1 - cy, x0 + cx, y1), phase))
+        if nx1 > x1 and ny1 > y1:
+            corners.append(Tile((x1 - cx, y1 - cy, nx1, ny1), (x1 - cx, y1 - cy, nx1, y1), phase))
+        if corners:
+            tiles.extend(corners)
+            phase += 1
+        x0, y0, x1, y1 = nx0, ny0, nx1, ny1
+    return tiles
+
+
+def phases(tiles: list[Tile]) -> list[list[Tile]]:
+    """``tiles`` grouped by phase, in order."""
+    grouped: list[list[Tile]] = []
+    for t in tiles:
+        while len(grouped) <= t.phase:
+            grouped.append([])
+        grouped[t.phase].append(t)
+    return grouped
+
+
+class TileCanvas:
+    """The canvas being grown: the original in place, then tiles pasted phase by phase."""
+
+    def __init__(self, original: Image.Image, expand: Expand):
+        left, right, top, bottom = expand
+        self.expand = expand
+        self.original = original if original.mode == "RGB" else original.convert("RGB")
+        size = (original.width + left + right, original.height + top + bottom)
+        self.image = Image.new("RGB", size)
+        self.image.paste(self.original, (left, top))
+        self._coverage = Image.new("L", size, 0)
+        self._coverage.paste(255, (left, top, left + original.width, top + original.height))
+
+    def context(self, tile: Tile) -> Image.Image:
+        return self.image.crop(tile.crop)
+
+    def paste(self, tile: Tile, data: bytes, *, overlap: int) -> None:
+        with Image.open(io.BytesIO(data)) as generated:
+            piece = generated.convert("RGB")
+        if piece.size != tile.size:
+            piece = piece.resize(tile.size, Image.Resampling.LANCZOS)
+
+        x0, y0, x1, y1 = tile.box
+        band = min(overlap, (x1 - x0) // 2, (y1 - y0) // 2)
+        strips = (
+            (x0, y0, x0 + band, y1),
+            (x1 - band, y0, x1, y1),
+            (x0, y0, x1, y0 + band),
+            (x0, y1 - band, x1, y1),
+        )
+        # Feather only toward pixels that are already placed, so blends stay normalized.
+        sides = tuple(bool(band) and self._coverage.crop(s).getextrema()[0] == 255 for s in strips)
+        self.image.paste(piece, (x0, y0), feather_mask(tile.size, band, sides=sides))  # type: ignore[arg-type]
+        self._coverage.paste(255, tile.box)
+        piece.close()
+
+    def finish(self, feather: int) -> Image.Image:
+        """Restore the original centre and hand over the canvas."""
+        left, _right, top, _bottom = self.expand
+        self.image.paste(self.original, (left, top), feather_mask(self.original.size, feather, sides=self.expand))
+        self._coverage.close()
+        return self.image
+
+
+def assemble(
+    original: Image.Image,
+    expand: Expand,
+    tiles: list[Tile],
+    outputs: list[bytes],
+    *,
+    overlap: int,
+    feather: int,
+) -> Image.Image:
+    """Stitch one output per tile (in plan order) into the full canvas and restore the original centre."""
+    canvas = TileCanvas(original, expand)
+    for t, data in zip(tiles, outputs):
+        canvas.paste(t, data, overlap=overlap)
+    return canvas.finish(feather)